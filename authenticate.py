@@ -1,47 +1,118 @@
 import json
 import os.path
 import  logging
+import threading
+from pathlib import Path
 from typing import Optional, Tuple
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from database import DatabaseManager
+from transport import DriveTransport, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from rate_limiter import RateLimiter, DEFAULT_RATE, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES
 # from main import FileSyncer
 
+# The Google client libraries take a few hundred ms to import, so they are
+# imported where first used rather than before the window can render.
+DISCOVERY_CACHE_DIR = Path.home() / '.filesyncer' / 'cache'
+DRIVE_DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/drive/v3/rest"
+# points every Drive call at another server, e.g. benchmarks/fake_drive.py
+API_ROOT_ENV = 'FILESYNCER_API_ROOT'
+
+_discovery_lock = threading.Lock()
+_discovery_document = None
+
+
+def drive_discovery_document() -> str:
+    """Drive v3 discovery document, loaded once per process.
+
+    Uses the copy bundled with googleapiclient when there is one; otherwise
+    the document is fetched once and kept under ~/.filesyncer/cache/.
+    FILESYNCER_API_ROOT replaces the googleapis.com root URL.
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            from googleapiclient.discovery_cache import get_static_doc
+            document = get_static_doc("drive", "v3")
+            if document is None:
+                document = _cached_discovery_document()
+            api_root = os.environ.get(API_ROOT_ENV)
+            if api_root:
+                document = _with_api_root(document, api_root)
+            _discovery_document = document
+        return _discovery_document
+
+
+def _with_api_root(document: str, api_root: str) -> str:
+    api_root = api_root.rstrip('/') + '/'
+    discovery = json.loads(document)
+    discovery['rootUrl'] = discovery['mtlsRootUrl'] = api_root
+    discovery['baseUrl'] = api_root + discovery['servicePath']
+    return json.dumps(discovery)
+
+
+def _cached_discovery_document() -> str:
+    cache_file = DISCOVERY_CACHE_DIR / 'drive.v3.json'
+    try:
+        return cache_file.read_text()
+    except OSError:
+        pass
+
+    import httplib2
+    resp, content = httplib2.Http(timeout=30).request(DRIVE_DISCOVERY_URL)
+    if resp.status != 200:
+        raise Exception(f"Could not fetch the Drive discovery document: HTTP {resp.status}")
+    document = content.decode('utf-8')
+    DISCOVERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix('.tmp')
+    tmp_file.write_text(document)
+    os.replace(tmp_file, cache_file)
+    return document
+
+
+def build_drive_service(credentials=None, http=None):
+    """Drive v3 service built from the local discovery document, with no network round trip.
+
+    Pass either credentials or an already authorized http client.
+    """
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(drive_discovery_document(), credentials=credentials, http=http)
+
+
 #Google Drive service and cedentials
 class AuthManager:
     def __init__(self, db_manager=DatabaseManager):
         self.db_manager = db_manager
         self.service = None
         self.credentials = None
+        self.transport = None
+        self.rate_limiter = None
         self.current_user_email = None
         self.SCOPES = ["https://www.googleapis.com/auth/drive"]
         self.CREDENTIALS_FILE = "credentials.json"
+        self._local = threading.local()
 
         #logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
     def initialize_session(self) -> bool:
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
         try:
             session = self.db_manager.get_active_user_session()
             if session:
-                print("retrieving session")
+                self.logger.info("Retrieving stored session")
                 credentials_data = json.loads(session['credentials_json'])
                 creds = Credentials.from_authorized_user_info(credentials_data, self.SCOPES)
 
                 if creds and creds.valid:
-                    self.service = build("drive", "v3", credentials=creds)
-                    self.credentials = creds
                     self.current_user_email = session['user_email']
+                    self._start_transport(creds)
                     self.logger.info(f"Restored session for user: {self.current_user_email}")
                     return True
                 elif creds and creds.expired and creds.refresh_token:
                     creds.refresh(Request())
-                    self.service = build("drive", "v3", credentials=creds)
-                    self.credentials = creds
                     self.current_user_email = session['user_email']
+                    self._start_transport(creds)
 
                     #update stored credentials
                     self.db_manager.save_user_session(
@@ -56,6 +127,9 @@ class AuthManager:
 
     def authenticate(self) -> Tuple[bool, str]:
         """Google drive authentication"""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
         try:
             if not os.path.exists(self.CREDENTIALS_FILE):
                 return False, "credentials.json file not found. Add your Google API credentials"
@@ -77,8 +151,7 @@ class AuthManager:
                     creds = flow.run_local_server(port=0)
 
             # Build e service
-            self.service = build("drive", "v3", credentials=creds)
-            self.credentials = creds
+            self._start_transport(creds)
 
             try:
                 about = self.service.about().get(fields="user").execute()
@@ -100,6 +173,33 @@ class AuthManager:
             self.logger.error(error_message)
             return False, error_message
 
+    def login_with_token(self, credentials_json: str, user_email: Optional[str] = None) -> bool:
+        """Sign in non-interactively with pre-provisioned authorized-user credentials.
+
+        credentials_json is what Credentials.to_json() produces (it must
+        carry a refresh token). The account is looked up when user_email
+        is not given, and the session is stored like an interactive login.
+        """
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        try:
+            creds = Credentials.from_authorized_user_info(json.loads(credentials_json), self.SCOPES)
+            if not creds.valid:
+                creds.refresh(Request())
+            self.current_user_email = user_email
+            self._start_transport(creds)
+            if not self.current_user_email:
+                about = self.get_service().about().get(fields="user").execute()
+                self.current_user_email = about['user']['emailAddress']
+            self.db_manager.save_user_session(self.current_user_email, creds.to_json())
+            self.logger.info(f"Signed in with provided token as {self.current_user_email}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Token login failed: {str(e)}")
+            self.service = None
+            self.current_user_email = None
+            return False
+
     def logout(self) -> bool:
         """Logout current user"""
         try:
@@ -107,14 +207,57 @@ class AuthManager:
                 self.db_manager.logout_user(self.current_user_email)
                 self.logger.info(f"Logged out user: {self.current_user_email}")
 
+            if self.transport is not None:
+                self.transport.close()
             self.service = None
             self.credentials = None
+            self.transport = None
             self.current_user_email = None
             return True
         except Exception as e:
             self.logger.error(f"Logout failed: {str(e)}")
             return False
 
+    def _start_transport(self, creds):
+        """Share creds over a pooled transport and build this thread's service"""
+        if self.transport is not None:
+            self.transport.close()
+        if self.rate_limiter is None:
+            # one quota budget for the whole process, kept across logins
+            self.rate_limiter = RateLimiter(
+                rate=float(self.db_manager.get_setting('api_rate_limit', str(DEFAULT_RATE))),
+                max_concurrency=int(self.db_manager.get_setting(
+                    'api_max_concurrency', str(DEFAULT_MAX_CONCURRENCY))))
+        self.credentials = creds
+        self.transport = DriveTransport(
+            creds,
+            pool_size=int(self.db_manager.get_setting('http_pool_size', str(DEFAULT_POOL_SIZE))),
+            connect_timeout=float(self.db_manager.get_setting(
+                'http_connect_timeout', str(DEFAULT_CONNECT_TIMEOUT))),
+            read_timeout=float(self.db_manager.get_setting('http_read_timeout', str(DEFAULT_READ_TIMEOUT))),
+            on_refresh=self._store_refreshed_credentials,
+            rate_limiter=self.rate_limiter,
+            max_retries=int(self.db_manager.get_setting('api_max_retries', str(DEFAULT_MAX_RETRIES))))
+        self.service = self.get_service()
+
+    def _store_refreshed_credentials(self, creds):
+        if self.current_user_email:
+            self.db_manager.save_user_session(self.current_user_email, creds.to_json())
+
+    def get_service(self):
+        """Drive service for the calling thread.
+
+        httplib2 connections are not thread-safe, so every thread gets its
+        own service and client; the clients share one keep-alive pool and
+        one set of credentials through the transport.
+        """
+        if self.transport is None:
+            return self.service
+        if getattr(self._local, 'transport', None) is not self.transport:
+            self._local.service = build_drive_service(http=self.transport.http())
+            self._local.transport = self.transport
+        return self._local.service
+
     def is_authenticated(self) -> bool:
         """Check if user is currently authenticated"""
         return self.service is not None and self.current_user_email is not None
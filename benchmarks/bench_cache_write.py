@@ -0,0 +1,79 @@
+"""Benchmark file_cache writes: per-file connections vs the batched cache_files path.
+
+    python benchmarks/bench_cache_write.py --rows 100000
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import DatabaseManager
+
+
+def make_files(count: int) -> list:
+    return [
+        {
+            'id': f'file-{i:08d}',
+            'name': f'document-{i:08d}.txt',
+            'size': str(1024 + i),
+            'modifiedTime': '2025-01-01T00:00:00.000Z',
+            'mimeType': 'text/plain',
+        }
+        for i in range(count)
+    ]
+
+
+def bench_legacy(db_path: Path, files: list) -> float:
+    """The old path: one connection and one fsync'd commit per file"""
+    db = DatabaseManager(db_path)
+    rows = db._file_cache_rows('bench@example.com', files)
+    db.close()
+    # drop back to the default rollback journal the old code ran with
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    start = time.perf_counter()
+    for row in rows:
+        conn = sqlite3.connect(db_path)
+        conn.execute(DatabaseManager.UPSERT_FILE_SQL, row)
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_batched(db_path: Path, files: list, page_size: int) -> float:
+    db = DatabaseManager(db_path)
+    start = time.perf_counter()
+    for offset in range(0, len(files), page_size):
+        db.cache_files('bench@example.com', files[offset:offset + page_size])
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--legacy-sample', type=int, default=2000,
+                        help='rows to time on the per-file path; the rest is extrapolated')
+    args = parser.parse_args()
+
+    files = make_files(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = files[:args.legacy_sample]
+        legacy = bench_legacy(Path(tmp) / 'legacy.db', sample)
+        legacy_total = legacy / max(len(sample), 1) * args.rows
+        batched = bench_batched(Path(tmp) / 'batched.db', files, args.page_size)
+
+    print(f"rows:             {args.rows}")
+    print(f"per-file commits: {legacy_total:8.2f}s (extrapolated from {len(sample)} rows)")
+    print(f"batched pages:    {batched:8.2f}s ({args.rows / batched:,.0f} rows/s)")
+    print(f"speedup:          {legacy_total / batched:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
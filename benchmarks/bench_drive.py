@@ -0,0 +1,121 @@
+"""End-to-end throughput against a local fake Drive: listing, cache writes, upload, download, batches, startup.
+
+    python benchmarks/bench_drive.py --files 20000 --size 64 --latency 0.02 --fault-rate 0.01
+
+The fake server (benchmarks/fake_drive.py) runs in its own process so it
+does not compete with the client for the GIL. The client side is the real
+AuthManager, DriveTransport, RateLimiter and DriveManager, pointed at the
+fake through FILESYNCER_API_ROOT. Use --json to keep results for comparing
+runs before and after a change.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_startup import LAZY, measure
+
+MB = 1024 * 1024
+
+
+def start_fake(args) -> tuple:
+    command = [sys.executable, str(BENCH_DIR / 'fake_drive.py'), '--port', '0', '--files', str(args.files),
+               '--latency', str(args.latency), '--fault-rate', str(args.fault_rate), '--seed', '1']
+    if args.bandwidth:
+        command += ['--bandwidth', str(args.bandwidth * MB)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().split(' at ')[1].strip()
+    token = process.stdout.readline().split('token: ', 1)[1].strip()
+    return process, url, token
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(args) -> dict:
+    process, url, token = start_fake(args)
+    os.environ['FILESYNCER_API_ROOT'] = url
+    from authenticate import AuthManager
+    from database import DatabaseManager
+    from drive_manager import DriveManager
+
+    results = {"files": args.files, "size_mb": args.size, "latency": args.latency,
+               "bandwidth_mb": args.bandwidth, "fault_rate": args.fault_rate}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            db_manager = DatabaseManager(tmp / 'bench.db')
+            auth_manager = AuthManager(db_manager)
+            _, seconds = timed(lambda: auth_manager.login_with_token(token))
+            results["login_s"] = seconds
+            drive_manager = DriveManager(auth_manager, db_manager)
+            user_email = auth_manager.current_user_email
+
+            files, seconds = timed(lambda: drive_manager.list_files(page_size=1000, use_cache=False))
+            results["list_rows_per_s"] = len(files) / seconds
+
+            _, seconds = timed(lambda: db_manager.cache_files(user_email, files))
+            results["cache_write_rows_per_s"] = len(files) / seconds
+
+            source = tmp / 'payload.bin'
+            source.write_bytes(os.urandom(args.size * MB))
+            file_id, seconds = timed(lambda: drive_manager.upload_file(str(source)))
+            results["upload_mb_per_s"] = args.size / seconds
+
+            (tmp / 'out').mkdir()
+            _, seconds = timed(lambda: drive_manager.download_file(file_id, 'payload.bin', str(tmp / 'out')))
+            results["download_mb_per_s"] = args.size / seconds
+
+            ids = [f['id'] for f in files[:args.batch_ops]]
+            failed, seconds = timed(lambda: drive_manager.trash_files(ids))
+            results["batch_ops_per_s"] = (len(ids) - len(failed)) / seconds if ids else 0.0
+
+            results["throttled"] = auth_manager.rate_limiter.throttle_count
+            auth_manager.transport.close()
+            db_manager.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    results["startup_import_ms"] = measure(LAZY, args.startup_runs)['import'] * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=10000, help="files seeded on the fake server")
+    parser.add_argument('--size', type=int, default=32, help="upload/download size in MB")
+    parser.add_argument('--batch-ops', type=int, default=500, help="files trashed through batch requests")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--bandwidth', type=float, default=None, help="MB/s per connection")
+    parser.add_argument('--fault-rate', type=float, default=0.0, help="fraction of calls answered 429/503")
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"listing       {results['list_rows_per_s']:10.0f} rows/s   ({args.files} files)")
+    print(f"cache write   {results['cache_write_rows_per_s']:10.0f} rows/s")
+    print(f"upload        {results['upload_mb_per_s']:10.1f} MB/s     ({args.size} MB)")
+    print(f"download      {results['download_mb_per_s']:10.1f} MB/s")
+    print(f"batch trash   {results['batch_ops_per_s']:10.0f} ops/s    ({args.batch_ops} files)")
+    print(f"startup       {results['startup_import_ms']:10.1f} ms       import to first window")
+    print(f"throttled     {results['throttled']:10d} responses")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark local md5 hashing: one core with buffered reads vs the HashingService process pool.
+
+    python benchmarks/bench_hashing.py --files 64 --size 64 --workers 1 2 4 8
+
+Files are read once before timing so every run hashes from the page cache
+and the numbers measure CPU scaling; on a cold spinning disk the service
+deliberately runs one task at a time.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hashing import HashingService, md5_batch, md5_file
+
+MB = 1024 * 1024
+
+
+def md5_buffered(path: str) -> str:
+    """The old md5_file: 1 MiB reads on the calling thread"""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MB), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=64)
+    parser.add_argument('--size', type=int, default=64, help="MB per file")
+    parser.add_argument('--small-files', type=int, default=20000, help="4 KB files hashed in batches")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        block = os.urandom(MB)
+        for i in range(args.files):
+            path = os.path.join(tmp, f"large-{i:04d}.bin")
+            with open(path, 'wb') as f:
+                for _ in range(args.size):
+                    f.write(block)
+            paths.append(path)
+        for i in range(args.small_files):
+            path = os.path.join(tmp, f"small-{i:06d}.bin")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(4096))
+            paths.append(path)
+        total_mb = (args.files * args.size * MB + args.small_files * 4096) / MB
+
+        for path in paths:
+            md5_file(path)  # warm the page cache
+
+        start = time.perf_counter()
+        expected = {path: md5_buffered(path) for path in paths}
+        elapsed = time.perf_counter() - start
+        print(f"{'buffered, 1 core':22} {elapsed:7.2f}s  {total_mb / elapsed:8.0f} MB/s")
+
+        for workers in args.workers:
+            service = HashingService(workers)
+            # start the worker processes outside the timing
+            service._get_pool().submit(md5_batch, []).result()
+            start = time.perf_counter()
+            result = service.hash_files(paths)
+            elapsed = time.perf_counter() - start
+            service.close()
+            assert result == expected
+            print(f"{f'service, {workers} workers':22} {elapsed:7.2f}s  {total_mb / elapsed:8.0f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark file search over the cache: FTS5 prefix queries vs a LIKE scan.
+
+    python benchmarks/bench_search.py --rows 500000
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import DatabaseManager
+
+USER = 'bench@example.com'
+WORDS = ("report", "invoice", "holiday", "scan", "budget", "draft", "final", "photo", "meeting", "notes")
+TYPES = ("application/pdf", "image/jpeg", "text/plain", "application/vnd.google-apps.document")
+QUERIES = ("r", "rep", "report 2023", "invoice final", "photo jpeg", "notes-0004", "zzz")
+
+
+def make_files(count: int) -> list:
+    rng = random.Random(1)
+    return [
+        {
+            'id': f'file-{i:08d}',
+            'name': f"{rng.choice(WORDS)}_{rng.choice(WORDS)}-{rng.randrange(2000, 2026)}-{i:06d}.dat",
+            'size': str(1024 + i),
+            'modifiedTime': '2025-01-01T00:00:00.000Z',
+            'mimeType': rng.choice(TYPES),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int = 5) -> tuple:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--limit', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(Path(tmp) / 'bench.db')
+        start = time.perf_counter()
+        db.cache_files(USER, make_files(args.rows))
+        print(f"cached {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        db.refresh_file_search()
+        print(f"indexed them in {time.perf_counter() - start:.1f}s")
+
+        cursor = db._connect().cursor()
+        for query in QUERIES:
+            fts, results = timed(lambda: db.search_files(USER, query, args.limit))
+            like, _ = timed(lambda: db._search_files_like(cursor, USER, query.split(), args.limit, 0), 1)
+            print(f"{query!r:16} {len(results):5d} hits   fts5 {fts * 1000:8.2f} ms   like {like * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark startup: module import time and Drive service construction, before vs after lazy loading.
+
+    python benchmarks/bench_startup.py --runs 5
+
+Each measurement runs in a fresh interpreter so import caches don't carry over.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# what main.py pulled in before anything rendered, then a discovery build
+EAGER = '''
+import time, json
+start = time.perf_counter()
+import PyQt5.QtWidgets
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+imported = time.perf_counter()
+build("drive", "v3", credentials=Credentials(token="x"))
+built = time.perf_counter()
+print(json.dumps({"import": imported - start, "build": built - imported}))
+'''
+
+LAZY = '''
+import time, json
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from google.oauth2.credentials import Credentials
+from authenticate import build_drive_service
+build_drive_service(Credentials(token="x"))
+built = time.perf_counter()
+print(json.dumps({"import": imported - start, "build": built - imported}))
+'''
+
+
+def measure(code: str, runs: int):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(s[key] for s in samples) for key in ('import', 'build')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for label, code in (('eager (before)', EAGER), ('lazy (after)', LAZY)):
+        result = measure(code, args.runs)
+        print(f"{label:15} import to first window {result['import'] * 1000:7.1f} ms   "
+              f"first service build {result['build'] * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
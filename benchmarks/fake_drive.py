@@ -0,0 +1,445 @@
+"""Local stand-in for the Drive v3 API subset File Syncer uses.
+
+    python benchmarks/fake_drive.py --port 8765 --files 10000 --latency 0.05 --fault-rate 0.01
+
+Serves files.list (paging, the q clauses the app sends), files.get, get_media
+with Range, metadata-only create, resumable create/update uploads, update
+(rename, trash, addParents/removeParents), about, changes, batch requests and
+a stub OAuth token endpoint, all from memory. Point the app at it with
+FILESYNCER_API_ROOT=<url> and sign in with the JSON from token_json().
+
+Latency is added per request, bandwidth is limited per connection, and a
+fault rate turns that fraction of API calls into 429 or 503 responses.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+ROOT_ID = "root-folder"
+WRITE_CHUNK = 64 * 1024
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+CONTENT_RANGE_RE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+BLANK_LINE_RE = re.compile(rb"\r?\n\r?\n")
+Q_CLAUSE_RE = re.compile(r"""^(?:(name|mimeType) = '((?:[^'\\]|\\.)*)'|'([^']*)' in parents|trashed = (true|false))$""")
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def _json(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return status, dict({"content-type": "application/json; charset=UTF-8"}, **(headers or {})), \
+        json.dumps(payload).encode()
+
+
+def _error(status: int, message: str, reason: str = "") -> Response:
+    return _json(status, {"error": {"code": status, "message": message,
+                                    "errors": [{"reason": reason or "error", "message": message}]}})
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class FakeDrive:
+    '''In-memory Drive state and fault settings, shared by all connections'''
+
+    def __init__(self, user_email: str = "bench@example.com", latency: float = 0.0,
+                 bandwidth: Optional[float] = None, fault_rate: float = 0.0, seed: Optional[int] = None):
+        self.user_email = user_email
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.content: Dict[str, bytes] = {}
+        self.changes: List[Dict[str, Any]] = []
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "faults": 0, "bytes_in": 0, "bytes_out": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._listing_cache: Dict[str, Tuple[int, List[str]]] = {}
+
+    def seed_files(self, count: int, per_folder: int = 1000):
+        """Add count small files spread over folders of per_folder files"""
+        with self._lock:
+            folder_id = None
+            for i in range(count):
+                if i % per_folder == 0:
+                    folder_id = self._create({"name": f"folder-{i // per_folder:05d}",
+                                              "mimeType": FOLDER_MIME_TYPE}, None)["id"]
+                self._create({"name": f"file-{i:08d}.txt", "mimeType": "text/plain",
+                              "parents": [folder_id]}, f"content of file {i}\n".encode())
+
+    def add_file(self, name: str, content: bytes = b"", parent: Optional[str] = None) -> Dict[str, Any]:
+        """Create a file as another client would; it shows up in the changes feed"""
+        with self._lock:
+            return dict(self._create({"name": name, "mimeType": "text/plain",
+                                      "parents": [parent or ROOT_ID]}, content))
+
+    def edit_file(self, file_id: str, content: Optional[bytes] = None, **fields) -> Dict[str, Any]:
+        """Rename, trash (trashed=True) or rewrite a file as another client would"""
+        with self._lock:
+            return dict(self._update(file_id, fields, {}, content))
+
+    def delete_file(self, file_id: str):
+        """Delete a file for good, reported in the changes feed as removed"""
+        with self._lock:
+            del self.files[file_id]
+            self.content.pop(file_id, None)
+            self.changes.append({"kind": "drive#change", "fileId": file_id, "removed": True})
+            self._listing_cache.clear()
+
+    # -- state changes --------------------------------------------------------
+
+    def _create(self, body: Dict[str, Any], content: Optional[bytes]) -> Dict[str, Any]:
+        file_id = f"f{next(self._ids):09d}"
+        meta = {
+            "id": file_id,
+            "name": body.get("name", "Untitled"),
+            "mimeType": body.get("mimeType") or "application/octet-stream",
+            "parents": body.get("parents") or [ROOT_ID],
+            "modifiedTime": _now(),
+            "version": "1",
+            "trashed": False,
+        }
+        self.files[file_id] = meta
+        self._set_content(meta, content)
+        self._record(meta)
+        return meta
+
+    def _set_content(self, meta: Dict[str, Any], content: Optional[bytes]):
+        if content is None:
+            return
+        self.content[meta["id"]] = content
+        meta["size"] = str(len(content))
+        meta["md5Checksum"] = hashlib.md5(content).hexdigest()
+
+    def _update(self, file_id: str, body: Dict[str, Any], query: Dict[str, str],
+                content: Optional[bytes] = None) -> Dict[str, Any]:
+        meta = self.files[file_id]
+        for key in ("name", "mimeType", "trashed"):
+            if key in body:
+                meta[key] = body[key]
+        remove = set(filter(None, query.get("removeParents", "").split(",")))
+        add = [parent for parent in query.get("addParents", "").split(",") if parent]
+        if remove or add:
+            meta["parents"] = [p for p in meta["parents"] if p not in remove] + add
+        self._set_content(meta, content)
+        meta["modifiedTime"] = _now()
+        meta["version"] = str(int(meta["version"]) + 1)
+        self._record(meta)
+        return meta
+
+    def _record(self, meta: Dict[str, Any]):
+        self.changes.append({"kind": "drive#change", "fileId": meta["id"], "removed": False,
+                             "file": dict(meta)})
+        self._listing_cache.clear()
+
+    # -- request dispatch -----------------------------------------------------
+
+    def handle(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        parts = urlsplit(target)
+        path = parts.path
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        with self._lock:
+            self.stats["requests"] += 1
+
+        if path == "/token":
+            return _json(200, {"access_token": f"fake-{uuid.uuid4().hex}", "expires_in": 3600,
+                               "token_type": "Bearer"})
+        if not headers.get("authorization", "").startswith("Bearer "):
+            return _error(401, "Request is missing a valid bearer token", "authError")
+        if path == "/batch/drive/v3" and method == "POST":
+            return self._batch(headers, body)
+        return self._dispatch(method, path, query, headers, body)
+
+    def _dispatch(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+                  body: bytes) -> Response:
+        if self.fault_rate and self.random.random() < self.fault_rate:
+            with self._lock:
+                self.stats["faults"] += 1
+            if self.random.random() < 0.5:
+                return _error(429, "Rate limit exceeded", "userRateLimitExceeded")
+            return _error(503, "Backend unavailable", "backendError")
+
+        with self._lock:
+            if path.startswith("/upload/drive/v3/files"):
+                return self._upload(method, path, query, headers, body)
+            if path == "/drive/v3/files" and method == "GET":
+                return self._list(query)
+            if path == "/drive/v3/files" and method == "POST":
+                return _json(200, self._create(json.loads(body or b"{}"), None))
+            if path.startswith("/drive/v3/files/"):
+                return self._file(method, path[len("/drive/v3/files/"):], query, headers, body)
+            if path == "/drive/v3/about":
+                return _json(200, {"user": {"emailAddress": self.user_email, "displayName": "Bench"}})
+            if path == "/drive/v3/changes/startPageToken":
+                return _json(200, {"startPageToken": str(len(self.changes))})
+            if path == "/drive/v3/changes":
+                return self._changes(query)
+        return _error(404, f"Unknown endpoint {method} {path}", "notFound")
+
+    def _list(self, query: Dict[str, str]) -> Response:
+        ids = self._matching_ids(query.get("q", ""))
+        if ids is None:
+            return _error(400, f"Unsupported query: {query.get('q')}", "invalid")
+        start = int(query.get("pageToken") or 0)
+        page_size = min(int(query.get("pageSize") or 100), 1000)
+        page = ids[start:start + page_size]
+        result = {"files": [self._public(self.files[file_id]) for file_id in page]}
+        if start + page_size < len(ids):
+            result["nextPageToken"] = str(start + page_size)
+        return _json(200, result)
+
+    def _matching_ids(self, q: str) -> Optional[List[str]]:
+        cached = self._listing_cache.get(q)
+        if cached is not None:
+            return cached[1]
+        checks = []
+        for clause in filter(None, (c.strip() for c in q.split(" and "))):
+            match = Q_CLAUSE_RE.match(clause)
+            if not match:
+                return None
+            field, value, parent, trashed = match.groups()
+            if field:
+                value = re.sub(r"\\(.)", r"\1", value)
+                checks.append(lambda f, field=field, value=value: f[field] == value)
+            elif parent:
+                checks.append(lambda f, parent=parent: parent in f["parents"])
+            else:
+                checks.append(lambda f, trashed=trashed == "true": f["trashed"] == trashed)
+        ids = [file_id for file_id, meta in self.files.items() if all(check(meta) for check in checks)]
+        self._listing_cache[q] = (len(self.changes), ids)
+        return ids
+
+    def _file(self, method: str, file_id: str, query: Dict[str, str], headers: Dict[str, str],
+              body: bytes) -> Response:
+        if file_id == "root" and method == "GET":
+            return _json(200, {"id": ROOT_ID, "name": "My Drive", "mimeType": FOLDER_MIME_TYPE})
+        if file_id not in self.files:
+            return _error(404, f"File not found: {file_id}", "notFound")
+        if method == "PATCH":
+            return _json(200, self._public(self._update(file_id, json.loads(body or b"{}"), query)))
+        if method != "GET":
+            return _error(405, f"{method} not supported", "invalid")
+        if query.get("alt") != "media":
+            return _json(200, self._public(self.files[file_id]))
+
+        content = self.content.get(file_id, b"")
+        match = RANGE_RE.match(headers.get("range", ""))
+        if not match:
+            return 200, {"content-type": "application/octet-stream"}, content
+        first = int(match.group(1))
+        last = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+        if first >= len(content):
+            return 416, {"content-range": f"bytes */{len(content)}"}, b""
+        return 206, {"content-type": "application/octet-stream",
+                     "content-range": f"bytes {first}-{last}/{len(content)}"}, content[first:last + 1]
+
+    def _upload(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+                body: bytes) -> Response:
+        upload_id = query.get("upload_id")
+        if upload_id is None:
+            if query.get("uploadType") != "resumable":
+                return _error(400, "Only resumable uploads are supported", "invalid")
+            file_id = path[len("/upload/drive/v3/files/"):] if path.startswith("/upload/drive/v3/files/") else None
+            if file_id and file_id not in self.files:
+                return _error(404, f"File not found: {file_id}", "notFound")
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {"file_id": file_id, "metadata": json.loads(body or b"{}"),
+                                       "query": query, "data": bytearray()}
+            return 200, {"location": f"http://{headers.get('host')}{path}?uploadType=resumable&upload_id={upload_id}",
+                         "content-length": "0"}, b""
+
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return _error(404, "Unknown upload session", "notFound")
+        match = CONTENT_RANGE_RE.match(headers.get("content-range", "bytes */0"))
+        if not match:
+            return _error(400, "Bad Content-Range", "invalid")
+        first, _, total = match.groups()
+        if first is not None:
+            if int(first) != len(upload["data"]):
+                return 308, self._range_header(upload), b""
+            upload["data"].extend(body)
+        if total == "*" or len(upload["data"]) < int(total):
+            return 308, self._range_header(upload), b""
+
+        del self.uploads[upload_id]
+        content = bytes(upload["data"])
+        if upload["file_id"]:
+            meta = self._update(upload["file_id"], upload["metadata"], upload["query"], content)
+        else:
+            meta = self._create(upload["metadata"], content)
+            self._set_content(meta, content)
+        return _json(200, self._public(meta))
+
+    def _range_header(self, upload: Dict[str, Any]) -> Dict[str, str]:
+        received = len(upload["data"])
+        return {"range": f"bytes=0-{received - 1}", "content-length": "0"} if received else \
+            {"content-length": "0"}
+
+    def _changes(self, query: Dict[str, str]) -> Response:
+        start = int(query.get("pageToken") or 0)
+        if start > len(self.changes):
+            return _error(404, "Invalid page token", "notFound")
+        page_size = min(int(query.get("pageSize") or 100), 1000)
+        page = self.changes[start:start + page_size]
+        result = {"changes": page}
+        if start + page_size < len(self.changes):
+            result["nextPageToken"] = str(start + page_size)
+        else:
+            result["newStartPageToken"] = str(len(self.changes))
+        return _json(200, result)
+
+    def _batch(self, headers: Dict[str, str], body: bytes) -> Response:
+        boundary = re.search(r'boundary="?([^";]+)', headers.get("content-type", ""))
+        if not boundary:
+            return _error(400, "Missing multipart boundary", "invalid")
+        delimiter = b"--" + boundary.group(1).encode()
+        out = []
+        for part in body.split(delimiter)[1:]:
+            if part.startswith(b"--"):
+                break
+            part_headers, inner = BLANK_LINE_RE.split(part.lstrip(b"\r\n"), 1)
+            content_id = re.search(rb"content-id: <([^>]+)>", part_headers, re.I)
+            head, inner_body = (BLANK_LINE_RE.split(inner, 1) + [b""])[:2]
+            lines = re.split(r"\r?\n", head.decode())
+            inner_method, inner_target, _ = lines[0].split(" ", 2)
+            inner_headers = {k.strip().lower(): v.strip()
+                             for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+            parts = urlsplit(inner_target)
+            query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+            status, _, payload = self._dispatch(inner_method, parts.path, query, inner_headers,
+                                                inner_body.rstrip(b"\r\n"))
+            out.append(b"--BATCH\r\nContent-Type: application/http\r\n" +
+                       (b"Content-ID: <response-" + content_id.group(1) + b">\r\n" if content_id else b"") +
+                       f"\r\nHTTP/1.1 {status} X\r\nContent-Type: application/json\r\n\r\n".encode() +
+                       payload + b"\r\n")
+        return 200, {"content-type": "multipart/mixed; boundary=BATCH"}, b"".join(out) + b"--BATCH--\r\n"
+
+    def _public(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(meta)
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without this, delayed ACKs add 40 ms per call
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _serve(self):
+        drive: FakeDrive = self.server.drive
+        length = int(self.headers.get("content-length") or 0)
+        body = self._throttled_read(length, drive.bandwidth) if length else b""
+        if drive.latency:
+            time.sleep(drive.latency)
+        headers = {key.lower(): value for key, value in self.headers.items()}
+        status, response_headers, payload = drive.handle(self.command, self.path, headers, body)
+
+        self.send_response(status)
+        for key, value in response_headers.items():
+            if key != "content-length":
+                self.send_header(key, value)
+        self.send_header("content-length", str(len(payload)))
+        self.end_headers()
+        self._throttled_write(payload, drive.bandwidth)
+        with drive._lock:
+            drive.stats["bytes_in"] += length
+            drive.stats["bytes_out"] += len(payload)
+
+    def _throttled_read(self, length: int, bandwidth: Optional[float]) -> bytes:
+        chunks = []
+        remaining = length
+        while remaining:
+            chunk = self.rfile.read(min(WRITE_CHUNK, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+        return b"".join(chunks)
+
+    def _throttled_write(self, payload: bytes, bandwidth: Optional[float]):
+        if not bandwidth:
+            self.wfile.write(payload)
+            return
+        for start in range(0, len(payload), WRITE_CHUNK):
+            chunk = payload[start:start + WRITE_CHUNK]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    ''' Threaded HTTP server around a FakeDrive; port 0 picks a free port '''
+    daemon_threads = True
+
+    def __init__(self, drive: Optional[FakeDrive] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), FakeDriveHandler)
+        self.drive = drive or FakeDrive()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    def token_json(self) -> str:
+        """Authorized-user credentials accepted by this server.
+
+        google-auth always refreshes against Google's token endpoint, so the
+        token is issued up front with an expiry far enough out to never refresh.
+        """
+        expiry = datetime.now(timezone.utc) + timedelta(days=365)
+        return json.dumps({"token": f"fake-{uuid.uuid4().hex}", "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                           "client_id": "fake-client", "client_secret": "fake-secret",
+                           "refresh_token": "fake-refresh"})
+
+    def start(self) -> 'FakeDriveServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--files', type=int, default=0, help="seed this many small files")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--bandwidth', type=float, default=None, help="bytes/s per connection")
+    parser.add_argument('--fault-rate', type=float, default=0.0, help="fraction of calls answered 429/503")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    drive = FakeDrive(latency=args.latency, bandwidth=args.bandwidth, fault_rate=args.fault_rate,
+                      seed=args.seed)
+    drive.seed_files(args.files)
+    server = FakeDriveServer(drive, port=args.port)
+    print(f"Fake Drive at {server.url}", flush=True)
+    print(f"token: {server.token_json()}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from metrics import CACHE_LOOKUPS, get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Linux FICLONE ioctl: share extents copy-on-write (btrfs, xfs, bcachefs)
+FICLONE = 0x40049409
+EVICT_BATCH = 100
+
+
+def reflink(source: str, target: str) -> bool:
+    """Clone source to target without copying data, where the filesystem allows"""
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+class BlobCache:
+    '''Content-addressed store of downloaded files under ~/.filesyncer/cache/blobs.
+
+    Blobs are keyed by Drive's md5Checksum, so any file with the same
+    content, in any folder and under any name, is served from the same
+    blob. Placing a blob at a target tries a reflink first, then a
+    hardlink when allowed, then a plain copy. Usage is tracked in the
+    blob_cache table and the least recently used blobs are evicted once
+    the total passes max_bytes. A max_bytes of 0 turns the cache off.
+
+    Hardlinks are off by default: an in-place edit of the downloaded file
+    would also change the blob. Blobs whose mtime no longer matches the
+    one recorded are dropped instead of served, which catches most such
+    edits when hardlinks are on.
+    '''
+
+    def __init__(self, db_manager, cache_dir: Optional[Path] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, hardlinks: bool = False):
+        self.db_manager = db_manager
+        self.cache_dir = Path(cache_dir) if cache_dir else db_manager.db_path.parent / 'cache' / 'blobs'
+        self.max_bytes = max_bytes
+        self.hardlinks = hardlinks
+        self._evict_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def blob_path(self, md5_checksum: str) -> Path:
+        return self.cache_dir / md5_checksum[:2] / md5_checksum
+
+    def materialize(self, md5_checksum: Optional[str], size: Optional[int], target_path: str) -> bool:
+        """Place the cached content for md5_checksum at target_path; False on a miss"""
+        if not self.enabled or not md5_checksum:
+            return False
+        entry = self.db_manager.get_blob(md5_checksum)
+        blob = self.blob_path(md5_checksum)
+        hit = False
+        if entry is not None:
+            try:
+                st = blob.stat()
+                hit = st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns'] \
+                    and (size is None or st.st_size == size)
+            except OSError:
+                pass
+            if not hit:
+                self.logger.info(f"Dropping stale blob {md5_checksum}")
+                self._remove([md5_checksum])
+        get_metrics().inc(CACHE_LOOKUPS, lookup="blob", result="hit" if hit else "miss")
+        if not hit:
+            return False
+
+        directory, name = os.path.split(target_path)
+        temp_path = os.path.join(directory, f".{name}.blob")
+        try:
+            self._place(str(blob), temp_path)
+            os.replace(temp_path, target_path)
+        except OSError as e:
+            self.logger.error(f"Could not copy blob {md5_checksum} to {target_path}: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.db_manager.touch_blob(md5_checksum, time.time())
+        return True
+
+    def store(self, md5_checksum: Optional[str], path: str):
+        """Keep a verified download's content; never raises"""
+        if not self.enabled or not md5_checksum:
+            return
+        try:
+            size = os.path.getsize(path)
+            if size > self.max_bytes or self.db_manager.get_blob(md5_checksum) is not None:
+                return
+            blob = self.blob_path(md5_checksum)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = f"{blob}.{threading.get_ident()}.tmp"
+            self._place(path, temp_path)
+            os.replace(temp_path, blob)
+            self.db_manager.save_blob(md5_checksum, size, blob.stat().st_mtime_ns, time.time())
+        except OSError as e:
+            self.logger.error(f"Could not cache blob for {path}: {str(e)}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used blobs until the cache fits in max_bytes"""
+        with self._evict_lock:
+            total = self.db_manager.get_blob_cache_size()
+            while total > self.max_bytes:
+                victims = []
+                for md5_checksum, size in self.db_manager.get_lru_blobs(EVICT_BATCH):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(md5_checksum)
+                    total -= size
+                if not victims:
+                    break
+                self._remove(victims)
+                self.logger.info(f"Evicted {len(victims)} blobs from the download cache")
+
+    def clear(self):
+        self.db_manager.remove_blobs(md5 for md5, _ in self.db_manager.get_lru_blobs(-1))
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _remove(self, md5_checksums):
+        for md5_checksum in md5_checksums:
+            try:
+                os.remove(self.blob_path(md5_checksum))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.error(f"Could not remove blob {md5_checksum}: {str(e)}")
+        self.db_manager.remove_blobs(md5_checksums)
+
+    def _place(self, source: str, target: str):
+        if reflink(source, target):
+            return
+        if self.hardlinks:
+            try:
+                if os.path.exists(target):
+                    os.remove(target)
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source, target)
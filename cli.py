@@ -0,0 +1,292 @@
+"""Headless command line interface and sync daemon. Never imports PyQt5.
+
+    filesyncer status
+    filesyncer ls [--folder ID] [--offline]
+    filesyncer get FILE_ID [DEST_DIR]
+    filesyncer put PATH [--parent ID]
+    filesyncer sync LOCAL_DIR FOLDER_ID [--dry-run]
+    filesyncer watch {add,remove,list} [PATH] [--parent ID]
+    filesyncer daemon [--poll-interval SECONDS]
+
+Every command prints one JSON document on stdout and exits 0 on success
+or 1 on failure; logs go to stderr. Credentials come from the session
+stored by an earlier login, or from --token-file / FILESYNCER_TOKEN_FILE
+holding authorized-user JSON (what Credentials.to_json() writes).
+--metrics PATH records API, SQLite, transfer and cache timings and writes
+them to PATH when the command ends (every poll for the daemon).
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from authenticate import AuthManager
+from database import DatabaseManager
+from drive_manager import DriveManager
+from metrics import get_metrics, set_metrics_enabled
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+DEFAULT_POLL_INTERVAL = 60.0
+
+
+class StreamedError(Exception):
+    ''' A command failed after it began writing its output, and closed the document itself '''
+
+
+class HeadlessApp:
+    ''' Wires the managers together for one CLI invocation '''
+
+    def __init__(self, db_path: Optional[str] = None, token_file: Optional[str] = None,
+                 user_email: Optional[str] = None):
+        self.db_manager = DatabaseManager(Path(db_path) if db_path else None)
+        self.auth_manager = AuthManager(self.db_manager)
+        self.drive_manager = DriveManager(self.auth_manager, self.db_manager)
+        self.token_file = token_file
+        self.user_email = user_email
+        self.logger = logging.getLogger(__name__)
+
+    def login(self) -> str:
+        """Authenticate with the provided token or the stored session"""
+        if self.token_file:
+            with open(self.token_file) as f:
+                ok = self.auth_manager.login_with_token(f.read(), self.user_email)
+        else:
+            ok = self.auth_manager.initialize_session()
+        if not ok:
+            raise Exception("Not signed in: log in with the desktop app once or pass --token-file")
+        return self.auth_manager.current_user_email
+
+    def stored_user(self) -> str:
+        """The signed-in account, without touching the network"""
+        if self.user_email:
+            return self.user_email
+        session = self.db_manager.get_active_user_session()
+        if not session:
+            raise Exception("No stored session")
+        return session['user_email']
+
+    def status(self, args) -> Dict[str, Any]:
+        session = self.db_manager.get_active_user_session()
+        user_email = self.user_email or (session['user_email'] if session else None)
+        result = {
+            "ok": True,
+            "user": user_email,
+            "session": session is not None,
+            "schema_version": self.db_manager.get_schema_version(),
+        }
+        if user_email:
+            result.update({
+                "cached_files": self.db_manager.count_cached_files(user_email),
+                "changes_token": self.drive_manager.get_changes_token(user_email) is not None,
+                "monitored": self.db_manager.get_monitored_paths(user_email),
+                "partial_downloads": len(self.db_manager.get_partial_downloads(user_email)),
+            })
+        return result
+
+    def ls(self, args) -> None:
+        if args.offline:
+            user_email = self.stored_user()
+        else:
+            user_email = self.login()
+            self.drive_manager.sync_changes()
+
+        if args.folder:
+            folder_id = args.folder
+            if folder_id.startswith('/'):
+                folder_id = self.drive_manager.resolve_path(folder_id, user_email)
+                if folder_id is None:
+                    raise Exception(f"No cached folder at {args.folder}")
+            child_ids = self.drive_manager.get_folder_tree(user_email).children(folder_id)
+            files = self.db_manager.get_cached_files_by_id(user_email, child_ids)
+            pages = [[files[file_id] for file_id in child_ids if file_id in files]]
+        else:
+            pages = self.drive_manager.iter_cached_pages(user_email)
+
+        # streamed page by page so large drives don't sit in memory; "ok"
+        # comes last so a failure mid-listing still ends one valid document
+        out = sys.stdout
+        out.write('{"files": [')
+        count = 0
+        try:
+            for page in pages:
+                for file_info in page:
+                    out.write((',' if count else '') + '\n  ' + json.dumps(file_info))
+                    count += 1
+        except Exception as e:
+            out.write(f'\n], "count": {count}, "ok": false, "error": {json.dumps(str(e))}}}\n')
+            raise StreamedError(str(e)) from e
+        out.write(f'\n], "count": {count}, "ok": true}}\n')
+
+    def get(self, args) -> Dict[str, Any]:
+        self.login()
+        path = self.drive_manager.download_file(args.file_id, args.file_id, args.dest)
+        return {"ok": True, "file_id": args.file_id, "path": path}
+
+    def put(self, args) -> Dict[str, Any]:
+        self.login()
+        if os.path.isdir(args.path):
+            stats = self.drive_manager.upload_folder(args.path, parent_id=args.parent)
+            return {"ok": True, "path": os.path.abspath(args.path), **stats}
+        file_id = self.drive_manager.upload_file(args.path, parent_id=args.parent)
+        return {"ok": True, "path": os.path.abspath(args.path), "file_id": file_id}
+
+    def sync(self, args) -> Dict[str, Any]:
+        self.login()
+        plan = self.drive_manager.plan_sync(args.local_dir, args.folder_id)
+        result = {
+            "ok": True,
+            "local_root": plan.local_root,
+            "folder_id": plan.remote_folder_id,
+            "dry_run": args.dry_run,
+            "planned": plan.counts(),
+        }
+        if args.dry_run:
+            result["actions"] = [
+                {"action": action.kind, "path": action.rel_path, "from": action.source_path,
+                 "reason": action.reason or None}
+                for action in plan.work()
+            ]
+        else:
+            result["applied"] = self.drive_manager.apply_sync_plan(plan)
+        return result
+
+    def watch(self, args) -> Dict[str, Any]:
+        from watcher import WatchService
+
+        if args.action == "list":
+            return {"ok": True, "monitored": self.db_manager.get_monitored_paths(self.stored_user())}
+        if not args.path:
+            raise Exception(f"watch {args.action} needs a PATH")
+        self.login()
+        # registering only; the daemon does the watching and uploading
+        watch_service = WatchService(self.drive_manager, self.db_manager, submit=None)
+        if args.action == "add":
+            remote_folder_id = watch_service.register_folder(args.path, args.parent)
+            return {"ok": True, "local_path": os.path.abspath(args.path),
+                    "remote_folder_id": remote_folder_id}
+        watch_service.remove_folder(args.path)
+        return {"ok": True, "local_path": os.path.abspath(args.path), "removed": True}
+
+    def export_metrics(self, args):
+        if not args.metrics:
+            return
+        try:
+            get_metrics().export(args.metrics)
+        except OSError as e:
+            self.logger.error(f"Could not export metrics: {str(e)}")
+
+    def daemon(self, args) -> Dict[str, Any]:
+        """Watch monitored folders, upload changes and follow remote changes until signalled"""
+        from transfer_manager import TransferManager
+        from watcher import WatchService
+
+        self.login()
+        transfer_manager = TransferManager(
+            self.drive_manager, max_workers=int(self.db_manager.get_setting('transfer_workers', '4')))
+        watch_service = WatchService(self.drive_manager, self.db_manager, transfer_manager.submit_upload)
+
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        stats = {"polls": 0, "changed": 0, "removed": 0, "errors": 0}
+        transfer_manager.submit_partial_downloads()
+        watch_service.start()
+        self.logger.info(f"Daemon running for {self.auth_manager.current_user_email}")
+        while not stop.is_set():
+            try:
+                changes = self.drive_manager.sync_changes()
+                stats["changed"] += changes["changed"]
+                stats["removed"] += changes["removed"]
+            except Exception as e:
+                stats["errors"] += 1
+                self.logger.error(f"Polling changes failed: {str(e)}")
+            stats["polls"] += 1
+            # keep memory flat over weeks of uptime
+            transfer_manager.forget_finished()
+            self.export_metrics(args)
+            stop.wait(args.poll_interval)
+
+        self.logger.info("Shutting down")
+        watch_service.stop()
+        transfer_manager.shutdown()
+        return {"ok": True, **stats}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="filesyncer", description="Google Drive sync without the GUI")
+    parser.add_argument('--db', default=os.environ.get('FILESYNCER_DB'),
+                        help="database path (default ~/.filesyncer/filesyncer.db)")
+    parser.add_argument('--token-file', default=os.environ.get('FILESYNCER_TOKEN_FILE'),
+                        help="authorized-user credentials JSON to sign in with")
+    parser.add_argument('--user', default=os.environ.get('FILESYNCER_USER'),
+                        help="account email; looked up from Drive when omitted")
+    parser.add_argument('--metrics', default=os.environ.get('FILESYNCER_METRICS'),
+                        help="collect timings and write them here (.json, else Prometheus text)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log progress to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('status', help="show session, cache and watch state")
+
+    ls = commands.add_parser('ls', help="list files")
+    ls.add_argument('--folder', help="only files directly inside this folder id, or /path in My Drive")
+    ls.add_argument('--offline', action='store_true', help="list the cache without contacting Drive")
+
+    get = commands.add_parser('get', help="download a file")
+    get.add_argument('file_id')
+    get.add_argument('dest', nargs='?', default='.')
+
+    put = commands.add_parser('put', help="upload a file or folder")
+    put.add_argument('path')
+    put.add_argument('--parent', help="destination folder id")
+
+    sync = commands.add_parser('sync', help="two-way sync a local folder with a Drive folder")
+    sync.add_argument('local_dir')
+    sync.add_argument('folder_id')
+    sync.add_argument('--dry-run', action='store_true', help="only report the planned actions")
+
+    watch = commands.add_parser('watch', help="manage folders the daemon watches")
+    watch.add_argument('action', choices=('add', 'remove', 'list'))
+    watch.add_argument('path', nargs='?')
+    watch.add_argument('--parent', help="Drive folder to mirror into (add only)")
+
+    daemon = commands.add_parser('daemon', help="run until SIGTERM: watch, upload and poll changes")
+    daemon.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between changes feed polls")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    verbose = args.verbose or args.command == 'daemon'
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING, stream=sys.stderr,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    set_metrics_enabled(bool(args.metrics))
+    app = None
+    failed = False
+    try:
+        app = HeadlessApp(args.db, args.token_file, args.user)
+        result = getattr(app, args.command)(args)
+    except StreamedError:
+        result, failed = None, True
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    if app is not None:
+        app.export_metrics(args)
+    if result is not None:
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+    if failed or (result is not None and not result.get("ok")):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
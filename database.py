@@ -1,14 +1,36 @@
 import sqlite3
 import os
+import re
 import json
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
 import logging
 from pathlib import Path
+from metrics import SQLITE_OP_SECONDS, timed_methods
 
+@timed_methods(SQLITE_OP_SECONDS, 'op')
 class DatabaseManager:
     """Handles all database operations for the app"""
 
+    UPSERT_FILE_SQL = '''
+        INSERT INTO file_cache
+        (user_email, file_id, file_name, file_size, modified_time, mime_type,
+         parent_id, md5_checksum, version, cached_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_email, file_id) DO UPDATE SET
+            file_name = excluded.file_name,
+            file_size = excluded.file_size,
+            modified_time = excluded.modified_time,
+            mime_type = excluded.mime_type,
+            parent_id = excluded.parent_id,
+            md5_checksum = excluded.md5_checksum,
+            version = excluded.version,
+            cached_at = excluded.cached_at
+    '''
+    # entries stamped with this are stale whatever the TTL
+    INVALIDATED_AT = '1970-01-01 00:00:00'
+
     def __init__(self, db_path: Optional[Path] = None):
         if db_path is None:
             self.db_path = Path.home() / '.filesyncer' / 'filesyncer.db'
@@ -16,12 +38,39 @@ class DatabaseManager:
             self.db_path = db_path
 
         self.db_path.parent.mkdir(parents=True,exist_ok=True)
+        self._local = threading.local()
         self.init_database()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's long-lived connection, opening it on first use.
+
+        sqlite3 connections can't be shared across threads, so each thread
+        keeps its own. Using the connection as a context manager commits or
+        rolls back the transaction without closing it.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL only fsyncs at checkpoints, still crash safe
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-16000')
+            conn.execute('PRAGMA foreign_keys=OFF')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
 
     def init_database(self):
         # initialize the db with required tables
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # User sessions table
@@ -45,19 +94,6 @@ class DatabaseManager:
                 )
             ''')
 
-            # Monitored paths
-            # cursor.execute('''
-            #    # CREATE TABLE IF NOT EXISTS monitored_paths (
-            #     1                      id INTEGER PRIMARY KEY AUTOINCREMENT,
-            #     2                      user_email TEXT,
-            #     3                      local_path TEXT,
-            #     4                      remote_path TEXT,
-            #     5                      is_active BOOLEAN DEFAULT TRUE,
-            #     6                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            # ●   7                      FOREIGN KEY (user_email) REFERENCES user_sessions (user_email)
-            #     8                  )
-            #     9              ''')
-            # ●  10
             # File Cache table --> track filestates 
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS file_cache (
@@ -75,9 +111,260 @@ class DatabaseManager:
 
             conn.commit()
 
+        self.run_migrations()
+
+    def get_schema_version(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            self._ensure_schema_version_table(cursor)
+            return self._schema_version(cursor)
+
+    def _ensure_schema_version_table(self, cursor: sqlite3.Cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL
+            )
+        ''')
+        # applying a version twice must fail, not add a second row
+        cursor.execute('''
+            DELETE FROM schema_version WHERE rowid NOT IN
+            (SELECT MIN(rowid) FROM schema_version GROUP BY version)
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_schema_version
+            ON schema_version (version)
+        ''')
+
+    def _schema_version(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+        result = cursor.fetchone()
+        return result[0] or 1
+
+    def run_migrations(self):
+        """Upgrade the schema in place, one version per transaction.
+
+        The version is re-read inside each step's write transaction, so
+        when two processes start at once only one of them applies a step.
+        """
+        conn = self._connect()
+        with conn:
+            self._ensure_schema_version_table(conn.cursor())
+        for version, migrate in self.migrations():
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.cursor()
+                if version <= self._schema_version(cursor):
+                    conn.rollback()
+                    continue
+                migrate(cursor)
+                cursor.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logging.getLogger(__name__).info(f"Migrated database to schema version {version}")
+
+    def migrations(self) -> list:
+        # (version, migration) pairs, applied in order. Version 1 is the
+        # original schema created by init_database.
+        return [
+            (2, self._migrate_file_cache_keys),
+            (3, self._migrate_partial_downloads),
+            (4, self._migrate_monitored_paths),
+            (5, self._migrate_local_index),
+            (6, self._migrate_sync_state),
+            (7, self._migrate_file_cache_version),
+            (8, self._migrate_blob_cache),
+            (9, self._migrate_file_search),
+        ]
+
+    def _migrate_file_cache_keys(self, cursor: sqlite3.Cursor):
+        # file_name was UNIQUE, so same-named files clobbered each other;
+        # key on (user_email, file_id) and store parent and md5
+        cursor.execute('''
+            CREATE TABLE file_cache_v2 (
+                user_email TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                file_name TEXT,
+                file_size INTEGER,
+                modified_time TEXT,
+                mime_type TEXT,
+                parent_id TEXT,
+                md5_checksum TEXT,
+                cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_email, file_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO file_cache_v2
+            (user_email, file_id, file_name, file_size, modified_time, mime_type, cached_at)
+            SELECT user_email, file_id, file_name, file_size, modified_time, mime_type, cached_at
+            FROM file_cache
+            WHERE user_email IS NOT NULL AND file_id IS NOT NULL
+        ''')
+        cursor.execute('DROP TABLE file_cache')
+        cursor.execute('ALTER TABLE file_cache_v2 RENAME TO file_cache')
+        # listing: WHERE user_email = ? ORDER BY cached_at DESC
+        cursor.execute('''
+            CREATE INDEX idx_file_cache_listing
+            ON file_cache (user_email, cached_at DESC)
+        ''')
+        # lookups by name and by folder
+        cursor.execute('''
+            CREATE INDEX idx_file_cache_name
+            ON file_cache (user_email, file_name)
+        ''')
+        cursor.execute('''
+            CREATE INDEX idx_file_cache_parent
+            ON file_cache (user_email, parent_id, file_name)
+        ''')
+
+    def _migrate_partial_downloads(self, cursor: sqlite3.Cursor):
+        # in-progress downloads, so they can resume after a drop or restart
+        cursor.execute('''
+            CREATE TABLE partial_downloads (
+                user_email TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                target_path TEXT NOT NULL,
+                temp_path TEXT NOT NULL,
+                expected_size INTEGER,
+                md5_checksum TEXT,
+                bytes_written INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_email, file_id, target_path)
+            )
+        ''')
+
+    def _migrate_monitored_paths(self, cursor: sqlite3.Cursor):
+        # local folders kept in sync by the watcher
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS monitored_paths (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_email TEXT,
+                local_path TEXT,
+                remote_folder_id TEXT,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_email, local_path),
+                FOREIGN KEY (user_email) REFERENCES user_sessions (user_email)
+            )
+        ''')
+
+    def _migrate_local_index(self, cursor: sqlite3.Cursor):
+        # stat signature and content hash of local files, so rescans only
+        # rehash what changed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS local_index (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                md5_checksum TEXT,
+                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_sync_state(self, cursor: sqlite3.Cursor):
+        # what each synced path looked like on both sides after the last sync
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                user_email TEXT NOT NULL,
+                local_root TEXT NOT NULL,
+                rel_path TEXT NOT NULL,
+                file_id TEXT,
+                local_md5 TEXT,
+                remote_md5 TEXT,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_email, local_root, rel_path)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_file_cache_version(self, cursor: sqlite3.Cursor):
+        # Drive's per-file version number, used to tell whether a refetched
+        # entry actually changed
+        cursor.execute('ALTER TABLE file_cache ADD COLUMN version INTEGER')
+
+    def _migrate_blob_cache(self, cursor: sqlite3.Cursor):
+        # downloaded content kept under cache/blobs, keyed by md5; last_used
+        # orders LRU eviction and mtime_ns catches blobs edited through a hardlink
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blob_cache (
+                md5_checksum TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER,
+                last_used REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX idx_blob_cache_lru ON blob_cache (last_used)')
+
+    def _migrate_file_search(self, cursor: sqlite3.Cursor):
+        # full-text index over names and mime types. file_search_docs holds
+        # the indexed text with a rowid for FTS5 to point at; the triggers
+        # only queue changed files, and _flush_file_search indexes the queue
+        # in a few set-based statements. Writing the FTS5 table from the
+        # triggers directly costs a segment flush per row.
+        try:
+            cursor.execute('''
+                CREATE TABLE file_search_docs (
+                    rowid INTEGER PRIMARY KEY,
+                    user_email TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_name TEXT,
+                    mime_type TEXT,
+                    UNIQUE (user_email, file_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE VIRTUAL TABLE file_search USING fts5(
+                    file_name, mime_type,
+                    content='file_search_docs', content_rowid='rowid',
+                    prefix='1 2 3', tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            # sqlite built without FTS5; search_files falls back to LIKE
+            logging.getLogger(__name__).warning(f"Full-text search unavailable: {str(e)}")
+            cursor.execute('DROP TABLE IF EXISTS file_search_docs')
+            return
+        cursor.execute('''
+            CREATE TABLE file_search_pending (
+                user_email TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                PRIMARY KEY (user_email, file_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            INSERT INTO file_search_docs (user_email, file_id, file_name, mime_type)
+            SELECT user_email, file_id, file_name, mime_type FROM file_cache
+        ''')
+        cursor.execute("INSERT INTO file_search (file_search) VALUES ('rebuild')")
+        # ON CONFLICT DO NOTHING rather than INSERT OR IGNORE: the ON CONFLICT
+        # of UPSERT_FILE_SQL overrides OR IGNORE inside the trigger, so a file
+        # written twice before a flush would fail with a UNIQUE error
+        cursor.execute('''
+            CREATE TRIGGER file_search_insert AFTER INSERT ON file_cache BEGIN
+                INSERT INTO file_search_pending VALUES (new.user_email, new.file_id)
+                ON CONFLICT DO NOTHING;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER file_search_update AFTER UPDATE OF file_name, mime_type ON file_cache
+            WHEN old.file_name IS NOT new.file_name OR old.mime_type IS NOT new.mime_type BEGIN
+                INSERT INTO file_search_pending VALUES (new.user_email, new.file_id)
+                ON CONFLICT DO NOTHING;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER file_search_delete AFTER DELETE ON file_cache BEGIN
+                INSERT INTO file_search_pending VALUES (old.user_email, old.file_id)
+                ON CONFLICT DO NOTHING;
+            END
+        ''')
+
     def save_user_session(self, user_email: str, credentials_json: str):
         """Save or update user session"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO user_sessions (user_email, credentials_json, is_active, last_login)
@@ -87,7 +374,7 @@ class DatabaseManager:
     
     def get_active_user_session(self) -> Optional[Dict[str, Any]]:
         '''gET Active user session'''
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT user_email, credentials_json, last_login
@@ -106,7 +393,7 @@ class DatabaseManager:
             return None
 
     def logout_user(self, user_email: str):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE user_sessions
@@ -116,7 +403,7 @@ class DatabaseManager:
             conn.commit()
 
     def save_setting(self, key: str, value:str):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO app_settings (key, value, updated_at)
@@ -125,54 +412,483 @@ class DatabaseManager:
             conn.commit()
 
     def get_setting(self, key: str, default:str = None) -> Optional[str]:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT value FROM app_settings WHERE key = ?', (key,))
             result = cursor.fetchone()
             return  result[0] if result else default
 
     def cache_file_info(self, user_email: str, file_info: Dict[str, Any]):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO file_cache
-                (user_email, file_id, file_name, file_size, modified_time, mime_type)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_email,
-                  file_info.get('id'),
-                  file_info.get('name'),
-                  file_info.get('size'),
-                  file_info.get('modifiedTime'),
-                  file_info.get('mimeType')
-                  ))
-            conn.commit()
+        self.cache_files(user_email, [file_info])
+
+    def cache_files(self, user_email: str, files: Iterable[Dict[str, Any]]) -> int:
+        """Write a batch of file metadata in a single transaction"""
+        rows = self._file_cache_rows(user_email, files)
+        with self._connect() as conn:
+            conn.executemany(self.UPSERT_FILE_SQL, rows)
+        return len(rows)
+
+    def _file_cache_rows(self, user_email: str, files: Iterable[Dict[str, Any]]) -> list:
+        return [(user_email,
+                 f.get('id'),
+                 f.get('name'),
+                 f.get('size'),
+                 f.get('modifiedTime'),
+                 f.get('mimeType'),
+                 (f.get('parents') or [None])[0],
+                 f.get('md5Checksum'),
+                 int(f['version']) if f.get('version') is not None else None)
+                for f in files]
+
+    def _file_info_from_row(self, row) -> Dict[str, Any]:
+        return {
+            'id': row[0],
+            'name': row[1],
+            'size': row[2],
+            'modifiedTime': row[3],
+            'mimeType': row[4],
+            'parents': [row[5]] if row[5] else [],
+            'md5Checksum': row[6],
+            'cachedAt': row[7],
+            'version': row[8]
+        }
 
     def get_cached_files(self, user_email: str) -> list:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT file_id, file_name, file_size, modified_time, mime_type, cached_at
+                SELECT file_id, file_name, file_size, modified_time, mime_type,
+                       parent_id, md5_checksum, cached_at, version
                 FROM file_cache
                 WHERE user_email = ?
                 ORDER BY cached_at DESC
             ''', (user_email,))
-            results = cursor.fetchall()
+            return [self._file_info_from_row(row) for row in cursor.fetchall()]
+
+    def search_files(self, user_email: str, query: str, limit: int = 100, offset: int = 0) -> list:
+        """Cached files whose name or mime type has words starting with every word in query.
+
+        Served from the file_search FTS5 index and never touches Drive.
+        Read only, so it is cheap to call from the GUI thread: files changed
+        since the last refresh_file_search are matched with LIKE instead.
+        Results come in index order rather than ranked: ranking has to
+        score every match, which is slow for a short prefix on a big cache.
+        """
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if not self._has_file_search(cursor):
+                return self._search_files_like(cursor, user_email, terms, limit, offset)
+            match = ' '.join(f'"{term}"*' for term in terms)
+            conditions, params = self._like_conditions(terms)
+            # queued files come first, and their stale index entries are skipped.
+            # CROSS JOIN pins the FTS table as the outer loop; left to itself
+            # the planner probes the index once per cached file
+            cursor.execute(f'''
+                SELECT c.file_id, c.file_name, c.file_size, c.modified_time, c.mime_type,
+                       c.parent_id, c.md5_checksum, c.cached_at, c.version
+                FROM file_search_pending p
+                CROSS JOIN file_cache c ON c.user_email = p.user_email AND c.file_id = p.file_id
+                WHERE p.user_email = ? AND {conditions}
+                UNION ALL
+                SELECT c.file_id, c.file_name, c.file_size, c.modified_time, c.mime_type,
+                       c.parent_id, c.md5_checksum, c.cached_at, c.version
+                FROM file_search s
+                CROSS JOIN file_search_docs d ON d.rowid = s.rowid
+                CROSS JOIN file_cache c ON c.user_email = d.user_email AND c.file_id = d.file_id
+                WHERE file_search MATCH ? AND d.user_email = ?
+                  AND NOT EXISTS (SELECT 1 FROM file_search_pending q
+                                  WHERE q.user_email = d.user_email AND q.file_id = d.file_id)
+                LIMIT ? OFFSET ?
+            ''', [user_email] + params + [match, user_email, limit, offset])
+            return [self._file_info_from_row(row) for row in cursor.fetchall()]
+
+    def refresh_file_search(self) -> int:
+        """Index cache changes queued since the last refresh; returns how many"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if not self._has_file_search(cursor):
+                return 0
+            count = self._flush_file_search(cursor)
+            conn.commit()
+            return count
+
+    def _has_file_search(self, cursor: sqlite3.Cursor) -> bool:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'file_search'")
+        return cursor.fetchone() is not None
+
+    def _flush_file_search(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute('SELECT COUNT(*) FROM file_search_pending')
+        count = cursor.fetchone()[0]
+        if not count:
+            return 0
+        queued = '''
+            FROM file_search_pending p
+            JOIN file_search_docs d ON d.user_email = p.user_email AND d.file_id = p.file_id
+        '''
+        # external content: the old text has to be handed back to delete it
+        cursor.execute(f'''
+            INSERT INTO file_search (file_search, rowid, file_name, mime_type)
+            SELECT 'delete', d.rowid, d.file_name, d.mime_type {queued}
+        ''')
+        cursor.execute(f'DELETE FROM file_search_docs WHERE rowid IN (SELECT d.rowid {queued})')
+        cursor.execute('''
+            INSERT INTO file_search_docs (user_email, file_id, file_name, mime_type)
+            SELECT c.user_email, c.file_id, c.file_name, c.mime_type
+            FROM file_search_pending p
+            JOIN file_cache c ON c.user_email = p.user_email AND c.file_id = p.file_id
+        ''')
+        cursor.execute(f'''
+            INSERT INTO file_search (rowid, file_name, mime_type)
+            SELECT d.rowid, d.file_name, d.mime_type {queued}
+        ''')
+        cursor.execute('DELETE FROM file_search_pending')
+        return count
+
+    def _like_conditions(self, terms: list) -> Tuple[str, list]:
+        conditions = ' AND '.join("(file_name LIKE ? ESCAPE '\\' OR mime_type LIKE ? ESCAPE '\\')"
+                                  for _ in terms)
+        params = []
+        for term in terms:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params += [pattern, pattern]
+        return conditions, params
+
+    def _search_files_like(self, cursor: sqlite3.Cursor, user_email: str, terms: list,
+                           limit: int, offset: int) -> list:
+        conditions, params = self._like_conditions(terms)
+        cursor.execute(f'''
+            SELECT file_id, file_name, file_size, modified_time, mime_type,
+                   parent_id, md5_checksum, cached_at, version
+            FROM file_cache
+            WHERE user_email = ? AND {conditions}
+            ORDER BY file_name
+            LIMIT ? OFFSET ?
+        ''', [user_email] + params + [limit, offset])
+        return [self._file_info_from_row(row) for row in cursor.fetchall()]
+
+    def count_cached_files(self, user_email: str) -> int:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM file_cache WHERE user_email = ?', (user_email,))
+            return cursor.fetchone()[0]
+
+    def iter_cached_files(self, user_email: str, batch_size: int = 1000) -> Iterator[list]:
+        """Yield the cached listing in pages without loading it all at once"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT file_id, file_name, file_size, modified_time, mime_type,
+                   parent_id, md5_checksum, cached_at, version
+            FROM file_cache
+            WHERE user_email = ?
+            ORDER BY cached_at DESC
+        ''', (user_email,))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [self._file_info_from_row(row) for row in rows]
+        finally:
+            cursor.close()
+
+    def get_tree_entries(self, user_email: str) -> list:
+        """(file_id, file_name, parent_id, mime_type, modified_time) of every cached file"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT file_id, file_name, parent_id, mime_type, modified_time
+                FROM file_cache
+                WHERE user_email = ?
+            ''', (user_email,))
+            return cursor.fetchall()
+
+    def get_cached_file(self, user_email: str, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT file_id, file_name, file_size, modified_time, mime_type,
+                       parent_id, md5_checksum, cached_at, version
+                FROM file_cache
+                WHERE user_email = ? AND file_id = ?
+            ''', (user_email, file_id))
+            result = cursor.fetchone()
+            return self._file_info_from_row(result) if result else None
+
+    def apply_file_changes(self, user_email: str, upserts: Iterable[Dict[str, Any]],
+                           removed_ids: Iterable[str]):
+        """Apply a batch of remote changes to the cache in one transaction"""
+        stale_ids = [(user_email, file_id) for file_id in removed_ids]
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                DELETE FROM file_cache WHERE user_email = ? AND file_id = ?
+            ''', stale_ids)
+            cursor.executemany(self.UPSERT_FILE_SQL, self._file_cache_rows(user_email, upserts))
+            conn.commit()
+
+    def get_cached_files_by_id(self, user_email: str, file_ids: Iterable[str],
+                               max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Cached entries for file_ids, optionally only those written in the last max_age seconds"""
+        file_ids = list(file_ids)
+        age_clause = "AND cached_at >= datetime('now', ?)" if max_age is not None else ""
+        age_params = [f"-{int(max_age)} seconds"] if max_age is not None else []
+        found = {}
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(file_ids), 500):
+                chunk = file_ids[start:start + 500]
+                cursor.execute(f'''
+                    SELECT file_id, file_name, file_size, modified_time, mime_type,
+                           parent_id, md5_checksum, cached_at, version
+                    FROM file_cache
+                    WHERE user_email = ? AND file_id IN ({", ".join("?" * len(chunk))})
+                    {age_clause}
+                ''', [user_email] + chunk + age_params)
+                for row in cursor.fetchall():
+                    found[row[0]] = self._file_info_from_row(row)
+        return found
+
+    def touch_cached_files(self, user_email: str, file_ids: Iterable[str]):
+        """Mark entries as just validated without rewriting them"""
+        with self._connect() as conn:
+            conn.executemany('''
+                UPDATE file_cache SET cached_at = CURRENT_TIMESTAMP
+                WHERE user_email = ? AND file_id = ?
+            ''', [(user_email, file_id) for file_id in file_ids])
+
+    def invalidate_cached_files(self, user_email: str, file_ids: Iterable[str]):
+        """Force the next lookup of these entries to revalidate against Drive"""
+        with self._connect() as conn:
+            conn.executemany('''
+                UPDATE file_cache SET cached_at = ?
+                WHERE user_email = ? AND file_id = ?
+            ''', [(self.INVALIDATED_AT, user_email, file_id) for file_id in file_ids])
+
+    def clear_file_cache(self, user_email: str):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM file_cache WHERE user_email = ?', (user_email,))
+            conn.commit()
+
+    def save_partial_download(self, user_email: str, file_id: str, target_path: str,
+                              temp_path: str, expected_size: Optional[int],
+                              md5_checksum: Optional[str]):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO partial_downloads
+                (user_email, file_id, target_path, temp_path, expected_size,
+                 md5_checksum, bytes_written, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, CURRENT_TIMESTAMP)
+            ''', (user_email, file_id, target_path, temp_path, expected_size, md5_checksum))
+            conn.commit()
+
+    def update_partial_download(self, user_email: str, file_id: str, target_path: str,
+                                bytes_written: int):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE partial_downloads
+                SET bytes_written = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE user_email = ? AND file_id = ? AND target_path = ?
+            ''', (bytes_written, user_email, file_id, target_path))
+            conn.commit()
+
+    def get_partial_download(self, user_email: str, file_id: str,
+                             target_path: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT file_id, target_path, temp_path, expected_size, md5_checksum, bytes_written
+                FROM partial_downloads
+                WHERE user_email = ? AND file_id = ? AND target_path = ?
+            ''', (user_email, file_id, target_path))
+            result = cursor.fetchone()
+            return self._partial_from_row(result) if result else None
+
+    def get_partial_downloads(self, user_email: str) -> list:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT file_id, target_path, temp_path, expected_size, md5_checksum, bytes_written
+                FROM partial_downloads
+                WHERE user_email = ?
+                ORDER BY updated_at
+            ''', (user_email,))
+            return [self._partial_from_row(row) for row in cursor.fetchall()]
+
+    def delete_partial_download(self, user_email: str, file_id: str, target_path: str):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM partial_downloads
+                WHERE user_email = ? AND file_id = ? AND target_path = ?
+            ''', (user_email, file_id, target_path))
+            conn.commit()
+
+    def _partial_from_row(self, row) -> Dict[str, Any]:
+        return {
+            'file_id': row[0],
+            'target_path': row[1],
+            'temp_path': row[2],
+            'expected_size': row[3],
+            'md5_checksum': row[4],
+            'bytes_written': row[5]
+        }
+
+    def get_blob(self, md5_checksum: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT md5_checksum, size, mtime_ns, last_used
+                FROM blob_cache WHERE md5_checksum = ?
+            ''', (md5_checksum,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'md5_checksum': row[0], 'size': row[1], 'mtime_ns': row[2], 'last_used': row[3]}
+
+    def save_blob(self, md5_checksum: str, size: int, mtime_ns: int, last_used: float):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO blob_cache (md5_checksum, size, mtime_ns, last_used)
+                VALUES (?, ?, ?, ?)
+            ''', (md5_checksum, size, mtime_ns, last_used))
+            conn.commit()
+
+    def touch_blob(self, md5_checksum: str, last_used: float):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE blob_cache SET last_used = ? WHERE md5_checksum = ?',
+                           (last_used, md5_checksum))
+            conn.commit()
+
+    def remove_blobs(self, md5_checksums: Iterable[str]):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('DELETE FROM blob_cache WHERE md5_checksum = ?',
+                               ((md5,) for md5 in md5_checksums))
+            conn.commit()
+
+    def get_blob_cache_size(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(SUM(size), 0) FROM blob_cache')
+            return cursor.fetchone()[0]
+
+    def get_lru_blobs(self, limit: int) -> list:
+        """(md5_checksum, size) of the least recently used blobs"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT md5_checksum, size FROM blob_cache
+                ORDER BY last_used LIMIT ?
+            ''', (limit,))
+            return cursor.fetchall()
+
+    def add_monitored_path(self, user_email: str, local_path: str, remote_folder_id: str):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO monitored_paths (user_email, local_path, remote_folder_id, is_active)
+                VALUES (?, ?, ?, TRUE)
+                ON CONFLICT (user_email, local_path) DO UPDATE SET
+                    remote_folder_id = excluded.remote_folder_id,
+                    is_active = TRUE
+            ''', (user_email, local_path, remote_folder_id))
+            conn.commit()
+
+    def remove_monitored_path(self, user_email: str, local_path: str):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE monitored_paths
+                SET is_active = FALSE
+                WHERE user_email = ? AND local_path = ?
+            ''', (user_email, local_path))
+            conn.commit()
+
+    def get_monitored_paths(self, user_email: str) -> list:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT local_path, remote_folder_id
+                FROM monitored_paths
+                WHERE user_email = ? AND is_active = TRUE
+                ORDER BY local_path
+            ''', (user_email,))
             return [
-                {
-                    'id': row[0],
-                    'name': row[1],
-                    'size': row[2],
-                    'modifiedTime': row[3],
-                    'mimeType': row[4],
-                    'cachedAt': row[5]
-                }
-                for row in results
+                {'local_path': row[0], 'remote_folder_id': row[1]}
+                for row in cursor.fetchall()
             ]
 
+    def get_local_index(self, root: str) -> Dict[str, tuple]:
+        """Map each indexed path under root to (size, mtime_ns, inode, md5)"""
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # primary-key range scan over everything below root
+            cursor.execute('''
+                SELECT path, size, mtime_ns, inode, md5_checksum
+                FROM local_index
+                WHERE path >= ? AND path < ?
+            ''', (prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+            return {row[0]: row[1:] for row in cursor.fetchall()}
 
+    def get_local_index_entry(self, path: str) -> Optional[tuple]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT size, mtime_ns, inode, md5_checksum
+                FROM local_index
+                WHERE path = ?
+            ''', (path,))
+            return cursor.fetchone()
 
+    def update_local_index(self, entries: Iterable[tuple]):
+        """Upsert (path, size, mtime_ns, inode, md5) rows in one transaction"""
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO local_index
+                (path, size, mtime_ns, inode, md5_checksum, indexed_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', entries)
 
+    def remove_local_index(self, paths: Iterable[str]):
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM local_index WHERE path = ?',
+                             [(path,) for path in paths])
 
+    def get_sync_baseline(self, user_email: str, local_root: str) -> Dict[str, Dict[str, Any]]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT rel_path, file_id, local_md5, remote_md5
+                FROM sync_state
+                WHERE user_email = ? AND local_root = ?
+            ''', (user_email, local_root))
+            return {
+                row[0]: {'file_id': row[1], 'local_md5': row[2], 'remote_md5': row[3]}
+                for row in cursor.fetchall()
+            }
 
+    def save_sync_baseline(self, user_email: str, local_root: str, entries: Iterable[tuple]):
+        """Upsert (rel_path, file_id, local_md5, remote_md5) rows"""
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO sync_state
+                (user_email, local_root, rel_path, file_id, local_md5, remote_md5, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', [(user_email, local_root) + tuple(entry) for entry in entries])
 
-
+    def remove_sync_baseline(self, user_email: str, local_root: str, rel_paths: Iterable[str]):
+        with self._connect() as conn:
+            conn.executemany('''
+                DELETE FROM sync_state
+                WHERE user_email = ? AND local_root = ? AND rel_path = ?
+            ''', [(user_email, local_root, rel_path) for rel_path in rel_paths])
@@ -1,94 +1,467 @@
-import io
 import os
+import re
+import time
+import queue
+import hashlib
+import threading
 import mimetypes
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Callable, Tuple
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 from database import DatabaseManager
+from rate_limiter import backoff_delay, is_retryable
+from local_index import LocalIndex, is_ignored
+from hashing import HashingService
+from blob_cache import BlobCache, DEFAULT_MAX_BYTES
+from folder_tree import FolderTree
+from metrics import CACHE_LOOKUPS, TRANSFER_BYTES, TRANSFER_SECONDS, get_metrics
+from sync_planner import (SyncPlanner, UPLOAD, DOWNLOAD, DELETE_LOCAL, DELETE_REMOTE, RENAME_LOCAL,
+                          RENAME_REMOTE, RECORD, FORGET, BOOKKEEPING)
 import logging
 
+# files.list refuses page sizes above this
+MAX_PAGE_SIZE = 1000
+FILE_FIELDS = "id, name, size, modifiedTime, mimeType, parents, md5Checksum, version"
+LIST_FIELDS = f"nextPageToken, files({FILE_FIELDS})"
+CHANGES_FIELDS = ("nextPageToken, newStartPageToken, "
+                  f"changes(fileId, removed, file({FILE_FIELDS}, trashed))")
+# bytes fetched per ranged GET while downloading; bounds download memory
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_RETRIES = 5
+# resumable upload chunk; must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+# cached metadata younger than this is trusted without asking Drive
+CACHE_TTL = 300
+# Drive rejects batch requests with more than 100 calls
+BATCH_LIMIT = 100
+# status codes Drive uses when a saved changes page token is no longer usable
+INVALID_TOKEN_STATUSES = (400, 404, 410)
+
 class DriveManager:
     ''' handles google drives operations like download, upload'''
 
     def __init__(self, auth_manager, db_manager: DatabaseManager):
         self.auth_manager = auth_manager
         self.db_manager = db_manager
+        self.local_index = LocalIndex(
+            db_manager, HashingService(int(db_manager.get_setting('hash_workers', '0')) or None))
+        self.blob_cache = BlobCache(
+            db_manager,
+            max_bytes=int(db_manager.get_setting('blob_cache_bytes', str(DEFAULT_MAX_BYTES))),
+            hardlinks=db_manager.get_setting('blob_cache_hardlinks', '0') == '1')
+        self.folder_tree = FolderTree()
+        self._folder_tree_lock = threading.Lock()
+        self._root_folder_id = None
+        self._root_user = None
         self.logger = logging.getLogger(__name__)
 
 
     def list_files(self, page_size: int=50, use_cache:bool=True) -> List[Dict[str, Any]]:
+        files = []
+        for page in self.iter_file_pages(page_size=page_size, use_cache=use_cache):
+            files.extend(page)
+        return files
+
+    def iter_file_pages(self, page_size: int=MAX_PAGE_SIZE, use_cache: bool=True,
+                        max_in_flight: int=2) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the drive listing one page at a time as pages arrive.
+
+        Pages are fetched by a background thread that follows nextPageToken;
+        at most max_in_flight fetched pages wait for the consumer before the
+        fetcher blocks, so memory is bounded by page_size, not drive size.
+        """
         if not self.auth_manager.is_authenticated():
             raise Exception("You are npt authenticated with Google drive")
 
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        user_email = self.auth_manager.current_user_email
+
+        if use_cache and user_email:
+            cached_pages = self.iter_cached_pages(user_email, page_size)
+            first_page = next(cached_pages, None)
+            if first_page:
+                total = len(first_page)
+                yield first_page
+                get_metrics().inc(CACHE_LOOKUPS, lookup="list_files", result="hit")
+                for page in cached_pages:
+                    total += len(page)
+                    yield page
+                self.logger.info(f"Retrieved {total} files from cache")
+                return
+            get_metrics().inc(CACHE_LOOKUPS, lookup="list_files", result="miss")
+
+        pages = queue.Queue(maxsize=max(1, max_in_flight))
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch():
+            try:
+                page_token = None
+                while not stop.is_set():
+                    result = (
+                        self.auth_manager.get_service().files()
+                        .list(pageSize=page_size, pageToken=page_token,
+                              q="trashed = false", fields=LIST_FIELDS)
+                        .execute()
+                    )
+                    files = result.get("files", [])
+                    if user_email:
+                        self._cache_files(user_email, files)
+                    if files and not put(files):
+                        return
+                    page_token = result.get("nextPageToken")
+                    if not page_token:
+                        break
+                put(done)
+            except Exception as error:
+                put(error)
+
+        fetcher = threading.Thread(target=fetch, name="drive-list-pages", daemon=True)
+        fetcher.start()
+
+        total = 0
         try:
-            if use_cache and self.auth_manager.current_user_email:
-
-                cached_files = self.db_manager.get_cached_files(self.auth_manager.current_user_email)
-                print("retrieved cached files")
-                if cached_files:
-                    self.logger.info(f"Retrieved {len(cached_files)} files from cache")
-                    return cached_files
-
-            # fetch from google drive
-            result = (
-                self.auth_manager.service.files()
-                .list(
-                    pageSize=page_size,
-                    fields="nextPageToken, files(id, name, size, modifiedTime, mimeType)"
-                )
-                .execute()
-            )
-            files = result.get("files", [])
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    error_message = f"Failed to list files: {str(item)}"
+                    self.logger.error(error_message)
+                    raise Exception(error_message)
+                total += len(item)
+                yield item
+        finally:
+            stop.set()
+            fetcher.join(timeout=1)
+
+        self.logger.info(f"Retrieved {total} files from Google Drive")
+
+    def iter_cached_pages(self, user_email: str, page_size: int = MAX_PAGE_SIZE
+                          ) -> Iterator[List[Dict[str, Any]]]:
+        """Page through the cached listing; needs no network or live session"""
+        return self.db_manager.iter_cached_files(user_email, page_size)
+
+    def get_folder_tree(self, user_email: Optional[str] = None) -> FolderTree:
+        """The folder tree of user_email (default: the signed-in user), loaded from the cache on first use"""
+        user_email = user_email or self.auth_manager.current_user_email
+        with self._folder_tree_lock:
+            if user_email and self.folder_tree.user_email != user_email:
+                self.folder_tree.load(self.db_manager, user_email)
+        return self.folder_tree
+
+    def _cache_files(self, user_email: str, files: List[Dict[str, Any]]):
+        self.db_manager.cache_files(user_email, files)
+        self.folder_tree.apply_changes(user_email, files)
+
+    def _apply_file_changes(self, user_email: str, upserts: List[Dict[str, Any]], removed_ids: List[str]):
+        self.db_manager.apply_file_changes(user_email, upserts, removed_ids)
+        self.folder_tree.apply_changes(user_email, upserts, removed_ids)
+
+    def _changes_token_key(self, user_email: str) -> str:
+        return f"changes_page_token:{user_email}"
+
+    def get_changes_token(self, user_email: str) -> Optional[str]:
+        """The saved changes feed position, None before the first full listing"""
+        return self.db_manager.get_setting(self._changes_token_key(user_email))
+
+    def sync_changes(self, on_changes: Optional[Callable[[List[Dict[str, Any]], List[str]], None]] = None
+                     ) -> Dict[str, int]:
+        """Bring file_cache up to date from the Drive changes feed.
+
+        Only the adds, modifications, trashes and deletes since the saved
+        page token are applied; on_changes, if given, receives each applied
+        (upserts, removed_ids) batch. A full relist happens on first run or
+        when Drive rejects the saved token, reported as full_resync.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
 
-            if self.auth_manager.current_user_email:
-                for file_info in files:
-                    self.db_manager.cache_file_info(self.auth_manager.current_user_email, file_info)
+        user_email = self.auth_manager.current_user_email
+        if not user_email:
+            raise Exception("No active user to sync changes for")
 
-            self.logger.info(f"Retrieved {len(files)} files from Google Drive")
-            return files
+        token_key = self._changes_token_key(user_email)
+        page_token = self.db_manager.get_setting(token_key)
+        if not page_token:
+            return self._resync_full(user_email)
+
+        stats = {"changed": 0, "removed": 0, "full_resync": 0}
+        try:
+            while page_token:
+                result = (
+                    self.auth_manager.get_service().changes()
+                    .list(pageToken=page_token, pageSize=MAX_PAGE_SIZE, spaces="drive",
+                          includeRemoved=True, fields=CHANGES_FIELDS)
+                    .execute()
+                )
+                upserts, removed_ids = [], []
+                for change in result.get("changes", []):
+                    file_info = change.get("file") or {}
+                    if change.get("removed") or file_info.get("trashed"):
+                        removed_ids.append(change.get("fileId"))
+                    else:
+                        file_info.pop("trashed", None)
+                        upserts.append(file_info)
+                self._apply_file_changes(user_email, upserts, removed_ids)
+                if on_changes and (upserts or removed_ids):
+                    on_changes(upserts, removed_ids)
+                stats["changed"] += len(upserts)
+                stats["removed"] += len(removed_ids)
+
+                if "newStartPageToken" in result:
+                    self.db_manager.save_setting(token_key, result["newStartPageToken"])
+                    break
+                # checkpoint so a crash mid-feed resumes where it stopped
+                page_token = result.get("nextPageToken")
+                self.db_manager.save_setting(token_key, page_token)
 
         except HttpError as error:
-            error_message = f"Failed to list files: {str(error)}"
+            if error.resp.status in INVALID_TOKEN_STATUSES:
+                self.logger.info(f"Changes token rejected ({error.resp.status}), relisting")
+                return self._resync_full(user_email)
+            error_message = f"Failed to sync changes: {str(error)}"
             self.logger.error(error_message)
             raise Exception(error_message)
 
-    def download_file(self, file_id:str, filename:str, download_path:str=".") -> str:
-        if not self.auth_manager.is_authenticated():
-            raise Exception("Not authenticated with Google drive")
+        # index the changes here, off the GUI thread, rather than at search time
+        self.db_manager.refresh_file_search()
+        self.logger.info(f"Applied {stats['changed']} changes and {stats['removed']} removals")
+        return stats
 
-        #get file metadata
+    def _resync_full(self, user_email: str) -> Dict[str, int]:
         try:
-            file_metadata = self.auth_manager.service.files().get(fileId=file_id).execute()
-            filename = file_metadata['name']
-            print(filename)
-            full_path = os.path.join(download_path, filename)
-            request = self.auth_manager.service.files().get_media(fileId=file_id)
-
-            file_io = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_io, request)
-
-            done=False
-            while not done:
-                status, done = downloader.next_chunk()
-                if status:
-                    self.logger.info(f"Download  progress: {int(status.progress() * 100)}%")
-
-            #write the bytes to file
-            file_io.seek(0)
-            with open(full_path, 'wb') as f:
-                f.write(file_io.read())
-
-            self.logger.info(f"Successfully downloaded: {filename}")
-            return full_path
-
+            # take the token before listing so nothing changed mid-listing is missed
+            start = self.auth_manager.get_service().changes().getStartPageToken().execute()
         except HttpError as error:
-            error_message = f"Failed to download files: {str(error)}"
+            error_message = f"Failed to get changes token: {str(error)}"
             self.logger.error(error_message)
             raise Exception(error_message)
 
-    def upload_file(self, file_path:str, remote_name:str = None) -> str:
+        self.db_manager.clear_file_cache(user_email)
+        self.folder_tree.clear(user_email)
+        total = 0
+        for page in self.iter_file_pages(use_cache=False):
+            total += len(page)
+        self.db_manager.save_setting(self._changes_token_key(user_email), start["startPageToken"])
+        self.db_manager.refresh_file_search()
+        return {"changed": total, "removed": 0, "full_resync": 1}
+
+    def download_file(self, file_id:str, filename:str, download_path:str=".",
+                      file_metadata: Optional[Dict[str, Any]] = None,
+                      chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                      max_retries: int = DOWNLOAD_RETRIES,
+                      progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
+        """Stream a file to disk, resuming any earlier partial download.
+
+        Chunks are fetched with Range requests into a .part file next to the
+        target and the offset is recorded in partial_downloads after each
+        one, so a dropped connection or an app restart only fetches the
+        missing tail. The finished file is checked against md5Checksum and
+        atomically renamed into place. Content already in the blob cache is
+        copied locally instead of fetched. Pass file_metadata (e.g. a cache
+        entry) to skip the metadata request. progress_callback gets
+        (bytes_done, total_bytes) after every chunk.
+        """
         if not self.auth_manager.is_authenticated():
             raise Exception("Not authenticated with Google drive")
+        import httplib2
+
+        if file_metadata is None:
+            file_metadata = self.get_files_metadata([file_id]).get(file_id)
+            if file_metadata is None:
+                error_message = f"Failed to download files: {filename} no longer exists on Drive"
+                self.logger.error(error_message)
+                raise Exception(error_message)
+
+        filename = file_metadata.get('name') or filename
+        full_path = os.path.abspath(os.path.join(download_path, filename))
+        size = file_metadata.get('size')
+        size = int(size) if size not in (None, "") else None
+        if self.blob_cache.materialize(file_metadata.get('md5Checksum'), size, full_path):
+            self.discard_partial_download(file_id, full_path)
+            if progress_callback and size is not None:
+                progress_callback(size, size)
+            self.logger.info(f"Copied {filename} from the local download cache")
+            return full_path
+
+        partial = self._open_partial_download(file_id, full_path, file_metadata)
+        resumed_at = partial['bytes_written']
+        started = time.perf_counter()
+
+        attempt = 0
+        while True:
+            try:
+                digest = self._download_ranges(file_id, partial, chunk_size, progress_callback)
+                break
+            except HttpError as error:
+                if not is_retryable(error.resp.status, error.content) or attempt >= max_retries:
+                    error_message = f"Failed to download files: {str(error)}"
+                    self.logger.error(error_message)
+                    raise Exception(error_message)
+            except (OSError, httplib2.HttpLib2Error) as error:
+                if attempt >= max_retries:
+                    error_message = f"Failed to download files: {str(error)}"
+                    self.logger.error(error_message)
+                    raise Exception(error_message)
+            attempt += 1
+            self.logger.info(f"Download interrupted at {partial['bytes_written']} bytes, "
+                             f"retry {attempt}/{max_retries}")
+            time.sleep(backoff_delay(attempt))
+
+        expected_md5 = partial['md5_checksum']
+        if expected_md5 and digest != expected_md5:
+            self._discard_partial_download(partial)
+            # the metadata we downloaded against was out of date
+            self.db_manager.invalidate_cached_files(partial['user_email'], [file_id])
+            raise Exception(f"Checksum mismatch for {filename}: expected {expected_md5}, got {digest}")
+
+        os.replace(partial['temp_path'], full_path)
+        self._fsync_dir(os.path.dirname(full_path))
+        self.db_manager.delete_partial_download(partial['user_email'], file_id, full_path)
+        self._record_transfer("download", partial['bytes_written'] - resumed_at, started)
+        self.blob_cache.store(expected_md5, full_path)
+
+        self.logger.info(f"Successfully downloaded: {filename}")
+        return full_path
+
+    def _record_transfer(self, direction: str, size: int, started: float):
+        metrics = get_metrics()
+        metrics.inc(TRANSFER_BYTES, size, direction=direction)
+        metrics.observe(TRANSFER_SECONDS, time.perf_counter() - started, direction=direction)
+
+    def _open_partial_download(self, file_id: str, full_path: str,
+                               file_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        user_email = self.auth_manager.current_user_email or ""
+        size = file_metadata.get('size')
+        expected_size = int(size) if size not in (None, "") else None
+        md5_checksum = file_metadata.get('md5Checksum')
+
+        partial = self.db_manager.get_partial_download(user_email, file_id, full_path)
+        if partial is not None:
+            partial['user_email'] = user_email
+            # the remote file changed since the partial was started
+            stale = (partial['expected_size'] != expected_size
+                     or partial['md5_checksum'] != md5_checksum
+                     or not os.path.exists(partial['temp_path']))
+            if not stale:
+                self.logger.info(f"Resuming {full_path} at {partial['bytes_written']} bytes")
+                return partial
+            self._discard_partial_download(partial)
+
+        directory, name = os.path.split(full_path)
+        temp_path = os.path.join(directory, f".{name}.{file_id}.part")
+        open(temp_path, 'wb').close()
+        self.db_manager.save_partial_download(
+            user_email, file_id, full_path, temp_path, expected_size, md5_checksum)
+        return {
+            'user_email': user_email,
+            'file_id': file_id,
+            'target_path': full_path,
+            'temp_path': temp_path,
+            'expected_size': expected_size,
+            'md5_checksum': md5_checksum,
+            'bytes_written': 0,
+        }
+
+    def discard_partial_download(self, file_id: str, target_path: str):
+        """Drop a partial download so it is not resumed"""
+        user_email = self.auth_manager.current_user_email or ""
+        partial = self.db_manager.get_partial_download(user_email, file_id, target_path)
+        if partial is not None:
+            partial['user_email'] = user_email
+            self._discard_partial_download(partial)
+
+    def _discard_partial_download(self, partial: Dict[str, Any]):
+        if os.path.exists(partial['temp_path']):
+            os.remove(partial['temp_path'])
+        self.db_manager.delete_partial_download(
+            partial['user_email'], partial['file_id'], partial['target_path'])
+
+    def _download_ranges(self, file_id: str, partial: Dict[str, Any], chunk_size: int,
+                         progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
+        """Fetch the missing tail of a partial download and return its md5"""
+        offset = partial['bytes_written']
+        total = partial['expected_size']
+        md5 = hashlib.md5()
+
+        with open(partial['temp_path'], 'r+b') as f:
+            # anything past the last recorded offset was never fsynced
+            f.truncate(offset)
+            remaining = offset
+            while remaining:
+                block = f.read(min(chunk_size, remaining))
+                md5.update(block)
+                remaining -= len(block)
+
+            request = self.auth_manager.get_service().files().get_media(fileId=file_id)
+            while total is None or offset < total:
+                headers = dict(request.headers)
+                headers['range'] = f"bytes={offset}-{offset + chunk_size - 1}"
+                resp, content = request.http.request(request.uri, 'GET', headers=headers)
+                if resp.status == 416:
+                    break
+                if resp.status not in (200, 206):
+                    raise HttpError(resp, content, uri=request.uri)
+                if resp.status == 200 and offset:
+                    # server ignored the range and sent the whole body
+                    f.seek(0)
+                    f.truncate()
+                    md5 = hashlib.md5()
+                    offset = 0
+
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+                md5.update(content)
+                offset += len(content)
+                partial['bytes_written'] = offset
+                self.db_manager.update_partial_download(
+                    partial['user_email'], file_id, partial['target_path'], offset)
+
+                match = CONTENT_RANGE_RE.match(resp.get('content-range', ''))
+                if match and match.group(3) != '*':
+                    total = int(match.group(3))
+                if progress_callback:
+                    progress_callback(offset, total or 0)
+                if resp.status == 200 or not content:
+                    break
+
+        return md5.hexdigest()
+
+    def _fsync_dir(self, path: str):
+        # make the rename itself durable
+        try:
+            dir_fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def upload_file(self, file_path:str, remote_name:str = None,
+                    progress_callback: Optional[Callable[[int, int], None]] = None,
+                    parent_id: Optional[str] = None, file_id: Optional[str] = None) -> str:
+        """Upload a file, or replace the content of file_id in place.
+
+        The metadata Drive returns is written straight to the cache.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
+        from googleapiclient.http import MediaFileUpload
 
         try:
             if not os.path.exists(file_path):
@@ -102,20 +475,33 @@ class DriveManager:
                 mime_type = 'application/octet-stream'
 
             file_metadata = {"name": file_name}
-            media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
-
-            #upload
-            file = (
-                self.auth_manager.service.files()
-                .create(body=file_metadata, media_body=media, fields="id")
-                .execute()
-            )
+            media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True,
+                                    chunksize=UPLOAD_CHUNK_SIZE)
+
+            #upload in chunks so progress can be reported
+            started = time.perf_counter()
+            files = self.auth_manager.get_service().files()
+            if file_id:
+                request = files.update(fileId=file_id, body=file_metadata, media_body=media,
+                                       fields=FILE_FIELDS)
+            else:
+                if parent_id:
+                    file_metadata["parents"] = [parent_id]
+                request = files.create(body=file_metadata, media_body=media, fields=FILE_FIELDS)
+            file = None
+            while file is None:
+                status, file = request.next_chunk()
+                if status and progress_callback:
+                    progress_callback(status.resumable_progress, status.total_size)
+            size = os.path.getsize(file_path)
+            if progress_callback:
+                progress_callback(size, size)
+            self._record_transfer("upload", size, started)
             file_id = file.get("id")
             self.logger.info(f"Successfully uploaded: {file_name} (ID: {file_id})")
 
-            #refesh the cache
             if self.auth_manager.current_user_email:
-                self.list_files(use_cache=False)
+                self._cache_files(self.auth_manager.current_user_email, [file])
 
             return file_id
 
@@ -124,9 +510,435 @@ class DriveManager:
             self.logger.error(error_message)
             raise Exception(error_message)
 
+    def plan_folder_upload(self, local_dir: str, parent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Mirror local_dir's folders on Drive and list the files that need uploading.
+
+        Each returned entry carries path, parent_id and, for files that
+        already exist remotely with different content, the file_id to
+        update in place. Files whose size and md5 match the cached remote
+        copy are left out.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
+        if not os.path.isdir(local_dir):
+            raise Exception(f"Folder not found: {local_dir}")
+
+        # make sure the cache reflects the drive before comparing against it
+        self.sync_changes()
+
+        local_dir = os.path.abspath(local_dir)
+        root_parent = parent_id or self.get_root_folder_id()
+        folder_ids = {local_dir: self.ensure_folder(os.path.basename(local_dir), root_parent)}
+        candidates = []
+
+        for dirpath, dirnames, filenames in os.walk(local_dir):
+            dirnames.sort()
+            folder_id = folder_ids[dirpath]
+            for dirname in dirnames:
+                folder_ids[os.path.join(dirpath, dirname)] = self.ensure_folder(dirname, folder_id)
+
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if not is_ignored(path):
+                    candidates.append((path, folder_id))
+
+        plan = self._plan_uploads(candidates)
+        self.logger.info(f"{len(plan)} files to upload from {local_dir}")
+        return plan
+
+    def plan_paths_upload(self, local_root: str, remote_folder_id: str,
+                          paths: Iterable[str]) -> List[Dict[str, Any]]:
+        """Like plan_folder_upload, but only for the given paths under local_root.
+
+        Used for watcher batches; intermediate folders are created as
+        needed and resolved from the cache after the first lookup.
+        """
+        local_root = os.path.abspath(local_root)
+        candidates = []
+        for path in sorted(set(paths)):
+            relative = os.path.relpath(os.path.abspath(path), local_root)
+            if relative.startswith(os.pardir) or not os.path.isfile(path):
+                continue
+            folder_id = self.ensure_folder_path(remote_folder_id, os.path.dirname(relative))
+            candidates.append((path, folder_id))
+        return self._plan_uploads(candidates)
+
+    def _plan_uploads(self, candidates: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Upload entries for (path, folder_id) pairs, leaving out files Drive already has.
+
+        Only files whose size matches the remote copy need their md5, and
+        those are hashed together in parallel.
+        """
+        user_email = self.auth_manager.current_user_email
+        tree = self.get_folder_tree() if user_email else None
+        found = []
+        for path, folder_id in candidates:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            filename = os.path.basename(path)
+            existing_id = tree.child(folder_id, filename, folder=False) if tree else None
+            found.append((path, filename, folder_id, size, existing_id))
+        existing_ids = [existing_id for *_, existing_id in found if existing_id]
+        cached = self.db_manager.get_cached_files_by_id(user_email, existing_ids) if existing_ids else {}
+        entries = [(path, filename, folder_id, size, cached.get(existing_id))
+                   for path, filename, folder_id, size, existing_id in found]
+
+        to_compare = [path for path, _, _, size, existing in entries
+                      if existing and existing.get('md5Checksum') and existing.get('size') is not None
+                      and int(existing['size']) == size]
+        hashes = self.local_index.md5_many(to_compare) if to_compare else {}
+
+        plan = []
+        for path, filename, folder_id, size, existing in entries:
+            md5 = hashes.get(os.path.abspath(path))
+            if md5 is not None and md5 == existing.get('md5Checksum'):
+                continue
+            plan.append({
+                'path': path,
+                'name': filename,
+                'parent_id': folder_id,
+                'file_id': existing['id'] if existing else None,
+                'size': size,
+            })
+        return plan
+
+    def upload_folder(self, local_dir: str, parent_id: Optional[str] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """Upload new and changed files under local_dir, one at a time"""
+        plan = self.plan_folder_upload(local_dir, parent_id)
+        total = sum(entry['size'] for entry in plan)
+        stats = {"created": 0, "updated": 0}
+        done = 0
+
+        for entry in plan:
+            def on_progress(bytes_done: int, _total: int, base=done):
+                if progress_callback:
+                    progress_callback(base + bytes_done, total)
+
+            self.upload_file(entry['path'], progress_callback=on_progress,
+                             parent_id=entry['parent_id'], file_id=entry['file_id'])
+            stats["updated" if entry['file_id'] else "created"] += 1
+            done += entry['size']
+        return stats
+
+    def get_root_folder_id(self, user_email: Optional[str] = None) -> str:
+        """Id of My Drive; asked of Drive once per user, then kept in the settings"""
+        user_email = user_email or self.auth_manager.current_user_email
+        if self._root_folder_id is None or self._root_user != user_email:
+            setting_key = f"root_folder_id:{user_email}"
+            root_id = self.db_manager.get_setting(setting_key) if user_email else None
+            if root_id is None:
+                if not self.auth_manager.is_authenticated():
+                    raise Exception("Not authenticated with Google drive")
+                try:
+                    root_id = self.auth_manager.get_service().files().get(fileId="root", fields="id").execute()["id"]
+                except HttpError as error:
+                    error_message = f"Failed to look up root folder: {str(error)}"
+                    self.logger.error(error_message)
+                    raise Exception(error_message)
+                if user_email:
+                    self.db_manager.save_setting(setting_key, root_id)
+            self._root_folder_id, self._root_user = root_id, user_email
+        return self._root_folder_id
+
+    def resolve_path(self, path: str, user_email: Optional[str] = None) -> Optional[str]:
+        """Id of the cached entry at a /-separated path in My Drive, without asking Drive about each segment"""
+        return self.get_folder_tree(user_email).resolve(self.get_root_folder_id(user_email), path)
+
+    def ensure_folder(self, name: str, parent_id: str) -> str:
+        """Return the id of folder name under parent_id, creating it if needed"""
+        user_email = self.auth_manager.current_user_email
+        cached_id = self.get_folder_tree().child(parent_id, name, folder=True) if user_email else None
+        if cached_id:
+            return cached_id
+
+        try:
+            files = self.auth_manager.get_service().files()
+            escaped = name.replace("\\", "\\\\").replace("'", "\\'")
+            result = files.list(
+                q=(f"name = '{escaped}' and '{parent_id}' in parents "
+                   f"and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"),
+                fields=f"files({FILE_FIELDS})", pageSize=1,
+            ).execute()
+            found = result.get("files", [])
+            folder = found[0] if found else files.create(
+                body={"name": name, "mimeType": FOLDER_MIME_TYPE, "parents": [parent_id]},
+                fields=FILE_FIELDS,
+            ).execute()
+        except HttpError as error:
+            error_message = f"Failed to create folder {name}: {str(error)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+        if user_email:
+            self._cache_files(user_email, [folder])
+        return folder["id"]
+
+    def ensure_folder_path(self, root_folder_id: str, relative_dir: str) -> str:
+        """Resolve (creating as needed) a nested folder below root_folder_id.
+
+        Cached folders resolve in memory through the folder tree; Drive is
+        only asked about segments the cache doesn't have.
+        """
+        relative_dir = relative_dir.replace(os.sep, "/")
+        if self.auth_manager.current_user_email:
+            cached_id = self.get_folder_tree().resolve(root_folder_id, relative_dir, folder=True)
+            if cached_id:
+                return cached_id
+        folder_id = root_folder_id
+        for segment in relative_dir.split("/"):
+            if segment and segment != ".":
+                folder_id = self.ensure_folder(segment, folder_id)
+        return folder_id
+
+    def execute_batch(self, calls: List[Tuple[str, Any]], max_retries: int = DOWNLOAD_RETRIES
+                      ) -> Dict[str, Tuple[Optional[Dict[str, Any]], Optional[Exception]]]:
+        """Run (key, request) pairs as Drive batch requests, BATCH_LIMIT calls per round trip.
+
+        Returns key -> (response, error) so one failed call doesn't fail the
+        others. Calls that hit a retryable status are resent in a later batch.
+        """
+        results = {}
+        pending = list(calls)
+        attempt = 0
+        while pending:
+            retry = []
+            for start in range(0, len(pending), BATCH_LIMIT):
+                chunk = pending[start:start + BATCH_LIMIT]
+
+                def callback(request_id, response, exception, chunk=chunk):
+                    key, request = chunk[int(request_id)]
+                    if (isinstance(exception, HttpError) and attempt < max_retries
+                            and is_retryable(exception.resp.status, exception.content)):
+                        retry.append((key, request))
+                    else:
+                        results[key] = (response, exception)
+
+                batch = self.auth_manager.get_service().new_batch_http_request()
+                for index, (_, request) in enumerate(chunk):
+                    batch.add(request, callback=callback, request_id=str(index))
+                try:
+                    batch.execute()
+                except HttpError as error:
+                    if is_retryable(error.resp.status, error.content) and attempt < max_retries:
+                        retry.extend(chunk)
+                    else:
+                        for key, _ in chunk:
+                            results[key] = (None, error)
+
+            pending = retry
+            if pending:
+                # throttled calls inside a batch never reach the transport's retry loop
+                if self.auth_manager.rate_limiter is not None:
+                    self.auth_manager.rate_limiter.on_throttle()
+                attempt += 1
+                self.logger.info(f"Retrying {len(pending)} batched calls, attempt {attempt}/{max_retries}")
+                time.sleep(backoff_delay(attempt))
+        return results
+
+    def trash_file(self, file_id: str):
+        """Move a file to the Drive trash and drop it from the cache"""
+        failed = self.trash_files([file_id])
+        if failed:
+            error_message = f"Failed to trash file: {failed[file_id]}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def trash_files(self, file_ids: Iterable[str]) -> Dict[str, str]:
+        """Trash files with batched requests; returns error messages by file id"""
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
+
+        service = self.auth_manager.get_service()
+        results = self.execute_batch([
+            (file_id, service.files().update(fileId=file_id, body={"trashed": True}, fields="id"))
+            for file_id in file_ids
+        ])
+        trashed = [file_id for file_id, (_, error) in results.items() if error is None]
+        failed = {file_id: str(error) for file_id, (_, error) in results.items() if error is not None}
+        if self.auth_manager.current_user_email:
+            self._apply_file_changes(self.auth_manager.current_user_email, [], trashed)
+            self.db_manager.invalidate_cached_files(self.auth_manager.current_user_email, failed)
+        self.logger.info(f"Trashed {len(trashed)} of {len(results)} files")
+        return failed
+
+    def move_file(self, file_id: str, new_name: str, new_parent_id: Optional[str] = None,
+                  old_parent_id: Optional[str] = None) -> Dict[str, Any]:
+        """Rename a file and optionally move it to another folder"""
+        moved, failed = self.move_files([(file_id, new_name, new_parent_id, old_parent_id)])
+        if failed:
+            error_message = f"Failed to move file: {failed[file_id]}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+        return moved[0]
+
+    def move_files(self, moves: Iterable[Tuple[str, Optional[str], Optional[str], Optional[str]]]
+                   ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """Rename and/or move files with batched requests.
 
+        moves holds (file_id, new_name, new_parent_id, old_parent_id); a None
+        name keeps the current one. Returns the updated metadata and error
+        messages by file id.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
 
+        service = self.auth_manager.get_service()
+        calls = []
+        for file_id, new_name, new_parent_id, old_parent_id in moves:
+            kwargs = {}
+            if new_parent_id and new_parent_id != old_parent_id:
+                kwargs["addParents"] = new_parent_id
+                if old_parent_id:
+                    kwargs["removeParents"] = old_parent_id
+            body = {"name": new_name} if new_name else {}
+            calls.append((file_id, service.files().update(
+                fileId=file_id, body=body, fields=FILE_FIELDS, **kwargs)))
+
+        results = self.execute_batch(calls)
+        moved = [file for file, error in results.values() if error is None]
+        failed = {file_id: str(error) for file_id, (_, error) in results.items() if error is not None}
+        if self.auth_manager.current_user_email:
+            self._cache_files(self.auth_manager.current_user_email, moved)
+            # a failed update may still have been applied; don't trust those entries
+            self.db_manager.invalidate_cached_files(self.auth_manager.current_user_email, failed)
+        return moved, failed
+
+    def get_files_metadata(self, file_ids: Iterable[str], max_age: float = CACHE_TTL
+                           ) -> Dict[str, Dict[str, Any]]:
+        """Metadata for file_ids, from the cache where it is younger than max_age.
+
+        Anything older, invalidated or missing is revalidated against Drive
+        in batches. Files that no longer exist are left out of the result.
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        user_email = self.auth_manager.current_user_email
+        fresh = self.db_manager.get_cached_files_by_id(user_email, file_ids, max_age) if user_email else {}
+        stale = [file_id for file_id in file_ids if file_id not in fresh]
+        metrics = get_metrics()
+        metrics.inc(CACHE_LOOKUPS, len(fresh), lookup="metadata", result="hit")
+        metrics.inc(CACHE_LOOKUPS, len(stale), lookup="metadata", result="miss")
+        if stale:
+            fresh.update(self.refresh_cache_entries(stale))
+        return fresh
+
+    def refresh_cache_entries(self, file_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Re-read metadata for the given files in batches and update the cache.
+
+        Entries whose Drive version is unchanged are only marked as
+        validated; files that are gone or trashed are dropped. Returns the
+        fresh metadata by file id.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
 
+        file_ids = list(file_ids)
+        user_email = self.auth_manager.current_user_email
+        service = self.auth_manager.get_service()
+        results = self.execute_batch([
+            (file_id, service.files().get(fileId=file_id, fields=f"{FILE_FIELDS}, trashed"))
+            for file_id in file_ids
+        ])
+        cached = self.db_manager.get_cached_files_by_id(user_email, file_ids) if user_email else {}
+
+        fresh = {}
+        changed = []
+        unchanged = []
+        removed_ids = []
+        for file_id, (file_info, error) in results.items():
+            if error is None and not file_info.pop("trashed", False):
+                fresh[file_id] = file_info
+                previous = cached.get(file_id)
+                if previous and previous['version'] is not None and \
+                        str(previous['version']) == str(file_info.get('version')):
+                    unchanged.append(file_id)
+                else:
+                    changed.append(file_info)
+            elif error is None or (isinstance(error, HttpError) and error.resp.status == 404):
+                removed_ids.append(file_id)
+            else:
+                self.logger.error(f"Failed to refresh {file_id}: {str(error)}")
+        if user_email:
+            self._apply_file_changes(user_email, changed, removed_ids)
+            self.db_manager.touch_cached_files(user_email, unchanged)
+        return fresh
+
+    def plan_sync(self, local_root: str, remote_folder_id: str):
+        """Dry run: the SyncPlan that would reconcile local_root with its Drive folder"""
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
+        self.sync_changes()
+        planner = SyncPlanner(self.db_manager, self.local_index, self.get_folder_tree())
+        return planner.plan(self.auth_manager.current_user_email, local_root, remote_folder_id)
 
+    def apply_sync_plan(self, plan, progress_callback: Optional[Callable[[int, int], None]] = None
+                        ) -> Dict[str, int]:
+        """Carry out a SyncPlan from sync_planner and record the new baseline.
 
+        Conflicts are left untouched and reported in the returned counts.
+        """
+        if not self.auth_manager.is_authenticated():
+            raise Exception("Not authenticated with Google drive")
 
+        user_email = self.auth_manager.current_user_email
+        root = plan.local_root
+        counts: Dict[str, int] = {}
+        work = plan.work()
+        baseline, forget = [], []
+
+        for action in plan.actions:
+            local_path = os.path.join(root, *action.rel_path.split("/"))
+            rel_dir = os.path.dirname(action.rel_path)
+            kind = action.kind
+            try:
+                if kind == RECORD:
+                    baseline.append((action.rel_path, action.file_id, action.local_md5,
+                                     action.remote.get('md5Checksum')))
+                elif kind in (FORGET, DELETE_LOCAL, DELETE_REMOTE):
+                    if kind == DELETE_LOCAL and os.path.exists(local_path):
+                        os.remove(local_path)
+                    elif kind == DELETE_REMOTE:
+                        self.trash_file(action.file_id)
+                    forget.append(action.rel_path)
+                elif kind == UPLOAD:
+                    parent_id = self.ensure_folder_path(plan.remote_folder_id, rel_dir)
+                    file_id = self.upload_file(local_path, parent_id=parent_id,
+                                               file_id=action.file_id)
+                    remote = self.db_manager.get_cached_file(user_email, file_id) or {}
+                    baseline.append((action.rel_path, file_id, action.local_md5,
+                                     remote.get('md5Checksum')))
+                elif kind == DOWNLOAD:
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    self.download_file(action.file_id, action.remote['name'],
+                                       os.path.dirname(local_path), file_metadata=action.remote)
+                    md5 = action.remote.get('md5Checksum')
+                    baseline.append((action.rel_path, action.file_id, md5, md5))
+                elif kind == RENAME_REMOTE:
+                    parent_id = self.ensure_folder_path(plan.remote_folder_id, rel_dir)
+                    old_parent = (action.remote.get('parents') or [None])[0]
+                    self.move_file(action.file_id, os.path.basename(local_path), parent_id, old_parent)
+                    forget.append(action.source_path)
+                    baseline.append((action.rel_path, action.file_id, action.local_md5,
+                                     action.remote.get('md5Checksum')))
+                elif kind == RENAME_LOCAL:
+                    source = os.path.join(root, *action.source_path.split("/"))
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    os.replace(source, local_path)
+                    forget.append(action.source_path)
+                    baseline.append((action.rel_path, action.file_id, action.local_md5,
+                                     action.remote.get('md5Checksum')))
+                else:
+                    self.logger.info(f"Skipping conflict on {action.rel_path}: {action.reason}")
+            except Exception as e:
+                self.logger.error(f"Sync {kind} of {action.rel_path} failed: {str(e)}")
+                kind = "failed"
+            if action.kind not in BOOKKEEPING:
+                counts[kind] = counts.get(kind, 0) + 1
+                if progress_callback:
+                    progress_callback(sum(counts.values()), len(work))
+
+        self.db_manager.remove_sync_baseline(user_email, root, forget)
+        self.db_manager.save_sync_baseline(user_email, root, baseline)
+        return counts
@@ -0,0 +1,364 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from PyQt5.QtCore import QAbstractItemModel, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+
+from folder_tree import NAME as ENTRY_NAME
+
+NAME, SIZE, MODIFIED, TYPE = range(4)
+HEADERS = ("Name", "Size", "Modified", "Type")
+
+# row tuple layout; rows stay tuples so 100k+ entries stay small in memory
+ID, ROW_NAME, ROW_SIZE, ROW_MODIFIED, ROW_MIME, ROW_PARENT, ROW_MD5 = range(7)
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+
+def format_size(size: Optional[int]) -> str:
+    if not size:
+        return ""
+    size_mb = size / (1024 * 1024)
+    return f"{size_mb:.2f} MB" if size_mb > 1 else f"{size / 1000:.1f} KB"
+
+
+def format_modified(modified: Optional[str]) -> str:
+    # RFC 3339 from Drive, e.g. 2025-01-31T09:15:02.000Z
+    return modified[:16].replace("T", " ") if modified else ""
+
+
+class FileTableModel(QAbstractTableModel):
+    '''Table model over the drive listing.
+
+    Rows are kept as compact tuples and only formatted when the view asks
+    for them, which it only does for visible rows. Pages are appended with
+    beginInsertRows so the view updates incrementally.
+    '''
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[tuple] = []
+        self._row_by_id: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == NAME:
+                return row[ROW_NAME]
+            if column == SIZE:
+                return format_size(row[ROW_SIZE])
+            if column == MODIFIED:
+                return format_modified(row[ROW_MODIFIED])
+            if column == TYPE:
+                return row[ROW_MIME] or ""
+        elif role == Qt.TextAlignmentRole and column == SIZE:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        elif role == Qt.UserRole:
+            return row[ID]
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._row_by_id = {}
+        self.endResetModel()
+
+    def append_files(self, files: Iterable[Dict[str, Any]]):
+        """Add a page of files, updating rows that are already present"""
+        new_rows = []
+        for file_info in files:
+            row = self._to_row(file_info)
+            existing = self._row_by_id.get(row[ID])
+            if existing is not None:
+                self._rows[existing] = row
+                self.dataChanged.emit(self.index(existing, 0),
+                                      self.index(existing, len(HEADERS) - 1))
+            else:
+                new_rows.append(row)
+        if not new_rows:
+            return
+
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+        for offset, row in enumerate(new_rows):
+            self._row_by_id[row[ID]] = first + offset
+        self._rows.extend(new_rows)
+        self.endInsertRows()
+
+    def remove_ids(self, file_ids: Iterable[str]):
+        """Drop rows by file id, one beginRemoveRows per contiguous run, last run first"""
+        rows = sorted((self._row_by_id[file_id] for file_id in set(file_ids)
+                       if file_id in self._row_by_id), reverse=True)
+        if not rows:
+            return
+        # removing from the bottom up keeps the remaining row numbers valid,
+        # and lets the view keep its selection on the rows that survive
+        last = first = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == first - 1:
+                first = row
+                continue
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+            last = first = row
+        self._row_by_id = {values[ID]: i for i, values in enumerate(self._rows)}
+
+    def file_info(self, row: int) -> Dict[str, Any]:
+        values = self._rows[row]
+        return {
+            'id': values[ID],
+            'name': values[ROW_NAME],
+            'size': values[ROW_SIZE],
+            'modifiedTime': values[ROW_MODIFIED],
+            'mimeType': values[ROW_MIME],
+            'parents': [values[ROW_PARENT]] if values[ROW_PARENT] else [],
+            'md5Checksum': values[ROW_MD5],
+        }
+
+    def folders(self) -> List[tuple]:
+        """(id, name) of every folder row, for picking a move target"""
+        return [(row[ID], row[ROW_NAME]) for row in self._rows if row[ROW_MIME] == FOLDER_MIME_TYPE]
+
+    def row_name(self, row: int) -> str:
+        return self._rows[row][ROW_NAME] or ""
+
+    def row_id(self, row: int) -> str:
+        return self._rows[row][ID]
+
+    def has_id(self, file_id: str) -> bool:
+        return file_id in self._row_by_id
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Sort on raw values with one list.sort, not per-row data() calls"""
+        keys = {
+            NAME: lambda r: (r[ROW_NAME] or "").lower(),
+            SIZE: lambda r: r[ROW_SIZE] or 0,
+            MODIFIED: lambda r: r[ROW_MODIFIED] or "",
+            TYPE: lambda r: r[ROW_MIME] or "",
+        }
+        if column not in keys:
+            return
+        self.layoutAboutToBeChanged.emit()
+        # the view's selection and current index follow their files, not row numbers
+        persistent = self.persistentIndexList()
+        persistent_ids = [self._rows[index.row()][ID] for index in persistent]
+        self._rows.sort(key=keys[column], reverse=order == Qt.DescendingOrder)
+        self._row_by_id = {row[ID]: i for i, row in enumerate(self._rows)}
+        self.changePersistentIndexList(
+            persistent, [self.index(self._row_by_id[file_id], index.column())
+                         for file_id, index in zip(persistent_ids, persistent)])
+        self.layoutChanged.emit()
+
+    def _to_row(self, file_info: Dict[str, Any]) -> tuple:
+        size = file_info.get('size')
+        return (
+            file_info.get('id'),
+            file_info.get('name', 'Unknown'),
+            int(size) if size not in (None, "") else None,
+            file_info.get('modifiedTime'),
+            file_info.get('mimeType'),
+            (file_info.get('parents') or [None])[0],
+            file_info.get('md5Checksum'),
+        )
+
+
+class FileFilterProxyModel(QSortFilterProxyModel):
+    '''Filter over a FileTableModel, by a set of matching file ids or by name.
+
+    The id set comes from a search of the cache index; the name filter
+    is the fallback when no search is possible. Sorting is forwarded to
+    the source model, which sorts its row list directly; the proxy itself
+    only filters.
+    '''
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._needle = ""
+        self._matching_ids: Optional[Set[str]] = None
+
+    def setFilterFixedString(self, text: str):
+        self._needle = text.lower()
+        self._matching_ids = None
+        # a full remap is much cheaper than invalidateFilter's incremental
+        # row insertions when most rows come back
+        self.invalidate()
+
+    def set_matching_ids(self, file_ids: Optional[Iterable[str]]):
+        """Show only these files; None shows every file"""
+        self._needle = ""
+        self._matching_ids = set(file_ids) if file_ids is not None else None
+        self.invalidate()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        # match against the raw row instead of going through data()
+        if self._matching_ids is not None:
+            return self.sourceModel().row_id(source_row) in self._matching_ids
+        if not self._needle:
+            return True
+        name = self.sourceModel().row_name(source_row)
+        return self._needle in name.lower()
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def file_info(self, index: QModelIndex) -> Dict[str, Any]:
+        return self.sourceModel().file_info(self.mapToSource(index).row())
+
+
+class _FolderNode:
+    __slots__ = ('file_id', 'parent', 'children', 'has_subfolders')
+
+    def __init__(self, file_id: Optional[str], parent: Optional['_FolderNode']):
+        self.file_id = file_id
+        self.parent = parent
+        # None until the view first expands the folder
+        self.children: Optional[List['_FolderNode']] = None
+        # the view asks on every paint; a folder may hold many files to look through
+        self.has_subfolders: Optional[bool] = None
+
+
+class FolderTreeModel(QAbstractItemModel):
+    '''Folders of a FolderTree for a QTreeView, loaded one level at a time.
+
+    A folder's subfolders are only read from the tree when the view first
+    expands it, through canFetchMore/fetchMore, so showing a drive with
+    deep or wide hierarchies costs one level per expansion. The first row
+    is "All files", which stands for no folder. refresh() brings the
+    expanded folders up to date after the tree has changed.
+    '''
+
+    ALL_FILES = "All files"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tree = None
+        self._root = _FolderNode(None, None)
+
+    def set_tree(self, tree):
+        """Show tree (a FolderTree, or None for nothing), collapsing everything"""
+        self.beginResetModel()
+        self._tree = tree
+        self._root = _FolderNode(None, None)
+        if tree is not None:
+            self._root.children = [_FolderNode(file_id, self._root) for file_id in self._folder_ids(self._root)]
+        self.endResetModel()
+
+    def _node(self, index: QModelIndex) -> _FolderNode:
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row: int, column: int, parent=QModelIndex()) -> QModelIndex:
+        children = self._node(parent).children
+        if column != 0 or children is None or not 0 <= row < len(children):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QModelIndex()
+        return self.createIndex(parent.parent.children.index(parent), 0, parent)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        children = self._node(parent).children
+        return len(children) if children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()) -> bool:
+        node = self._node(parent)
+        if node is self._root:
+            return self._tree is not None
+        if node.children is not None:
+            return bool(node.children)
+        if node.has_subfolders is None:
+            node.has_subfolders = node.file_id is not None and self._tree.has_subfolders(node.file_id)
+        return node.has_subfolders
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return self._tree is not None and self._node(parent).children is None
+
+    def fetchMore(self, parent: QModelIndex):
+        node = self._node(parent)
+        if node.children is not None or self._tree is None:
+            return
+        ids = self._folder_ids(node)
+        node.children = []
+        if not ids:
+            return
+        self.beginInsertRows(parent, 0, len(ids) - 1)
+        node.children = [_FolderNode(file_id, node) for file_id in ids]
+        self.endInsertRows()
+
+    def _folder_ids(self, node: _FolderNode) -> List[Optional[str]]:
+        if node is self._root:
+            ids = self._tree.top_folders()
+        elif node.file_id is None:
+            return []
+        else:
+            ids = self._tree.children(node.file_id, folders_only=True)
+        ids.sort(key=lambda file_id: self._name(file_id).lower())
+        return [None] + ids if node is self._root else ids
+
+    def _name(self, file_id: Optional[str]) -> str:
+        if file_id is None:
+            return self.ALL_FILES
+        entry = self._tree.entry(file_id)
+        return entry[ENTRY_NAME] if entry else ""
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole) -> Any:
+        if not index.isValid() or self._tree is None:
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return self._name(node.file_id)
+        if role == Qt.UserRole:
+            return node.file_id
+        return None
+
+    def refresh(self):
+        """Diff every expanded folder against the tree: drop gone folders, add new ones"""
+        if self._tree is None:
+            return
+        stack = [(self._root, QModelIndex())]
+        while stack:
+            node, index = stack.pop()
+            if node.children is None:
+                continue
+            current = self._folder_ids(node)
+            wanted = set(current)
+            for row in range(len(node.children) - 1, -1, -1):
+                if node.children[row].file_id not in wanted:
+                    self.beginRemoveRows(index, row, row)
+                    del node.children[row]
+                    self.endRemoveRows()
+            present = {child.file_id for child in node.children}
+            added = [file_id for file_id in current if file_id not in present]
+            if added:
+                first = len(node.children)
+                self.beginInsertRows(index, first, first + len(added) - 1)
+                node.children.extend(_FolderNode(file_id, node) for file_id in added)
+                self.endInsertRows()
+            if node.children:
+                # renames show up without moving rows under the user
+                self.dataChanged.emit(self.index(0, 0, index), self.index(len(node.children) - 1, 0, index))
+            for row, child in enumerate(node.children):
+                child.has_subfolders = None
+                if child.children is not None:
+                    stack.append((child, self.index(row, 0, index)))
@@ -0,0 +1,233 @@
+import logging
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+# Drive allows cycles in theory; stop walking up well before one can hang us
+MAX_DEPTH = 1000
+
+# entry tuple layout, kept small since there is one per cached file
+NAME, PARENT, MIME, MODIFIED = range(4)
+
+
+class FolderTree:
+    '''In-memory index of the cached Drive hierarchy for one user.
+
+    Every cached entry is kept as (name, parent_id, mime_type, modified)
+    and every folder maps child names to ids, so resolving a path costs
+    one dict lookup per segment and finding a file's path one step per
+    level, with no SQLite or Drive queries. The tree is loaded from
+    file_cache once and then kept current by apply_changes() as the cache
+    changes. All methods are thread safe.
+    '''
+
+    def __init__(self):
+        self.user_email: Optional[str] = None
+        self._entries: Dict[str, tuple] = {}
+        # name -> id, or a list of ids for same-named siblings
+        self._children: Dict[str, Dict[str, Union[str, List[str]]]] = {}
+        # folders whose parent isn't cached, kept current so the folder view's top level is cheap
+        self._top: Set[str] = set()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def load(self, db_manager, user_email: str) -> int:
+        """Rebuild the tree from user_email's cached listing"""
+        # read under the lock so a cache write racing the load can't be lost
+        with self._lock:
+            rows = db_manager.get_tree_entries(user_email)
+            self.user_email = user_email
+            self._entries = {}
+            self._children = {}
+            self._top = set()
+            self._add_rows(rows)
+            count = len(self._entries)
+        self.logger.info(f"Loaded folder tree with {count} entries")
+        return count
+
+    def clear(self, user_email: Optional[str] = None):
+        """Empty the tree, or only if it holds user_email's listing when given"""
+        with self._lock:
+            if user_email is not None and self.user_email != user_email:
+                return
+            self._entries = {}
+            self._children = {}
+            self._top = set()
+
+    def update(self, files: Iterable[Dict[str, Any]]):
+        """Add or move entries from Drive file metadata"""
+        with self._lock:
+            self._update(files)
+
+    def remove(self, file_ids: Iterable[str]):
+        """Forget entries; their children stay until removed themselves, as in Drive's feed"""
+        with self._lock:
+            self._remove(file_ids)
+
+    def apply_changes(self, user_email: str, upserts: Iterable[Dict[str, Any]],
+                      removed_ids: Iterable[str] = ()) -> bool:
+        """remove() then update(), only if the tree holds user_email's listing.
+
+        The check and the changes happen under one lock, so a batch racing
+        load() is neither dropped nor applied to another account's tree.
+        """
+        with self._lock:
+            if self.user_email != user_email:
+                return False
+            self._remove(removed_ids)
+            self._update(upserts)
+            return True
+
+    def _update(self, files: Iterable[Dict[str, Any]]):
+        rows = [(f['id'], f.get('name'), (f.get('parents') or [None])[0], f.get('mimeType'),
+                 f.get('modifiedTime')) for f in files if f.get('id')]
+        for file_id, *_ in rows:
+            self._unlink(file_id)
+        self._add_rows(rows)
+
+    def _remove(self, file_ids: Iterable[str]):
+        for file_id in file_ids:
+            self._unlink(file_id)
+
+    def _add_rows(self, rows: Iterable[tuple]):
+        entries, children, top = self._entries, self._children, self._top
+        intern = sys.intern
+        for file_id, name, parent_id, mime_type, modified in rows:
+            name = name or ""
+            # few distinct parents and mime types, each shared by many entries
+            parent_id = intern(parent_id) if parent_id else None
+            mime_type = intern(mime_type) if mime_type else ""
+            entries[file_id] = (name, parent_id, mime_type, modified or "")
+            if mime_type == FOLDER_MIME_TYPE and parent_id not in entries:
+                top.add(file_id)
+            if file_id in children:
+                # its subfolders were top level until now
+                top.difference_update(self._ids_in(file_id))
+            siblings = children.setdefault(parent_id, {})
+            existing = siblings.get(name)
+            if existing is None:
+                siblings[name] = file_id
+            elif isinstance(existing, str):
+                siblings[name] = [existing, file_id]
+            else:
+                existing.append(file_id)
+
+    def _unlink(self, file_id: str):
+        entry = self._entries.pop(file_id, None)
+        if entry is None:
+            return
+        self._top.discard(file_id)
+        siblings = self._children.get(entry[PARENT])
+        if siblings is not None:
+            ids = siblings.get(entry[NAME])
+            if ids == file_id:
+                del siblings[entry[NAME]]
+            elif isinstance(ids, list) and file_id in ids:
+                ids.remove(file_id)
+                if len(ids) == 1:
+                    siblings[entry[NAME]] = ids[0]
+            if not siblings:
+                del self._children[entry[PARENT]]
+        # its subfolders are top level now
+        self._top.update(child_id for child_id in self._ids_in(file_id)
+                         if self._entries[child_id][MIME] == FOLDER_MIME_TYPE)
+
+    def _ids_in(self, parent_id: str) -> List[str]:
+        ids = []
+        for value in self._children.get(parent_id, {}).values():
+            if isinstance(value, str):
+                ids.append(value)
+            else:
+                ids.extend(value)
+        return ids
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._entries
+
+    def entry(self, file_id: str) -> Optional[tuple]:
+        return self._entries.get(file_id)
+
+    def child(self, parent_id: str, name: str, folder: Optional[bool] = None) -> Optional[str]:
+        """Id of name inside parent_id, newest first; folder limits it to folders or non-folders"""
+        with self._lock:
+            return self._child(parent_id, name, folder)
+
+    def _child(self, parent_id: str, name: str, folder: Optional[bool]) -> Optional[str]:
+        ids = self._children.get(parent_id, {}).get(name, ())
+        best, best_modified = None, None
+        for file_id in (ids,) if isinstance(ids, str) else ids:
+            entry = self._entries[file_id]
+            if folder is not None and (entry[MIME] == FOLDER_MIME_TYPE) != folder:
+                continue
+            if best is None or entry[MODIFIED] > best_modified:
+                best, best_modified = file_id, entry[MODIFIED]
+        return best
+
+    def children(self, parent_id: str, folders_only: bool = False) -> List[str]:
+        """Ids directly inside parent_id"""
+        with self._lock:
+            ids = self._ids_in(parent_id)
+            if folders_only:
+                ids = [file_id for file_id in ids if self._entries[file_id][MIME] == FOLDER_MIME_TYPE]
+            return ids
+
+    def has_subfolders(self, parent_id: str) -> bool:
+        with self._lock:
+            return any(self._entries[file_id][MIME] == FOLDER_MIME_TYPE for file_id in self._ids_in(parent_id))
+
+    def top_folders(self) -> List[str]:
+        """Folders whose parent isn't cached: those in My Drive's root, and shared folders"""
+        with self._lock:
+            return list(self._top)
+
+    def resolve(self, root_id: str, path: str, folder: Optional[bool] = None) -> Optional[str]:
+        """Id of the entry at a /-separated path below root_id, or None if not cached"""
+        segments = [segment for segment in path.split("/") if segment and segment != "."]
+        with self._lock:
+            node = root_id
+            for i, segment in enumerate(segments):
+                last = i == len(segments) - 1
+                node = self._child(node, segment, folder if last else True)
+                if node is None:
+                    return None
+            return node
+
+    def path_of(self, file_id: str, root_id: Optional[str] = None) -> Optional[str]:
+        """/-separated path of file_id below root_id (or its top-level folder); None if outside"""
+        parts = []
+        with self._lock:
+            node = file_id
+            for _ in range(MAX_DEPTH):
+                if node == root_id:
+                    return "/".join(reversed(parts))
+                entry = self._entries.get(node)
+                if entry is None:
+                    return "/".join(reversed(parts)) if root_id is None and parts else None
+                parts.append(entry[NAME])
+                node = entry[PARENT]
+        self.logger.error(f"Parent chain of {file_id} is deeper than {MAX_DEPTH}, giving up")
+        return None
+
+    def walk(self, folder_id: str) -> Iterator[Tuple[str, str, tuple]]:
+        """(relative path, id, entry) for everything below folder_id, depth first.
+
+        Within a folder the newest entries come first, so the first of
+        several same-named siblings is the newest.
+        """
+        stack = [(folder_id, "")]
+        seen = {folder_id}
+        while stack:
+            parent_id, prefix = stack.pop()
+            with self._lock:
+                entries = [(file_id, self._entries[file_id]) for file_id in self._ids_in(parent_id)]
+            entries.sort(key=lambda item: item[1][MODIFIED], reverse=True)
+            for file_id, entry in entries:
+                rel_path = prefix + entry[NAME]
+                if entry[MIME] == FOLDER_MIME_TYPE and file_id not in seen:
+                    seen.add(file_id)
+                    stack.append((file_id, rel_path + "/"))
+                yield rel_path, file_id, entry
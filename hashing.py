@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# files at least this big are memory-mapped and get a task of their own
+MMAP_THRESHOLD = 4 * 1024 * 1024
+# small files are sent to workers in batches of up to this many bytes or files
+BATCH_BYTES = 32 * 1024 * 1024
+BATCH_FILES = 512
+# below this much work, starting worker processes costs more than it saves
+INLINE_BYTES = 16 * 1024 * 1024
+
+
+def md5_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """MD5 of a local file, comparable to Drive's md5Checksum"""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            # hashlib reads the mapping without copying and drops the GIL while it does
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                md5.update(mapped)
+            return md5.hexdigest()
+        for block in iter(lambda: f.read(chunk_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def md5_batch(paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """md5 of each path; None for files that could not be read. Runs in worker processes."""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, md5_file(path)))
+        except (OSError, ValueError):
+            results.append((path, None))
+    return results
+
+
+_rotational_by_device: Dict[int, bool] = {}
+
+
+def is_rotational(device: int) -> bool:
+    """True when the block device behind st_dev is a spinning disk (Linux only)"""
+    if device not in _rotational_by_device:
+        rotational = False
+        try:
+            block = os.path.realpath(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+            # partitions keep queue/ on the parent disk
+            for candidate in (block, os.path.dirname(block)):
+                try:
+                    with open(os.path.join(candidate, 'queue', 'rotational')) as f:
+                        rotational = f.read().strip() == '1'
+                    break
+                except OSError:
+                    continue
+        except (OSError, ValueError):
+            pass
+        _rotational_by_device[device] = rotational
+    return _rotational_by_device[device]
+
+
+class HashingService:
+    '''Hashes many local files in parallel across a process pool.
+
+    Large files are memory-mapped and hashed one per task; small files
+    are grouped into batches so a task is never dominated by IPC. Work is
+    queued per block device: SSDs and network filesystems get every
+    worker, while a spinning disk gets one task at a time in inode order,
+    so its reads stay close to sequential instead of seeking between
+    workers. Small jobs are hashed inline without starting the pool.
+    '''
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def hash_files(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """md5 of every path; None for files that vanished or could not be read"""
+        results: Dict[str, Optional[str]] = {}
+        by_device: Dict[int, List[Tuple[int, int, str]]] = {}
+        total = 0
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                results[path] = None
+                continue
+            by_device.setdefault(st.st_dev, []).append((st.st_ino, st.st_size, path))
+            total += st.st_size
+
+        if self.workers == 1 or total < INLINE_BYTES:
+            for files in by_device.values():
+                results.update(md5_batch([path for _, _, path in sorted(files)]))
+            return results
+
+        queues = []
+        for device, files in by_device.items():
+            rotational = is_rotational(device)
+            files.sort(key=lambda entry: entry[0] if rotational else entry[2])
+            queues.append({'tasks': self._tasks(files), 'limit': 1 if rotational else self.workers,
+                           'running': 0})
+        try:
+            self._run(queues, results)
+        except BrokenProcessPool as e:
+            self.logger.error(f"Hashing workers failed, hashing in process: {str(e)}")
+            self.close()
+            for files in by_device.values():
+                results.update(md5_batch([path for _, _, path in files if path not in results]))
+        return results
+
+    def _tasks(self, files: List[Tuple[int, int, str]]) -> List[List[str]]:
+        tasks, batch, batch_bytes = [], [], 0
+        for _, size, path in files:
+            if size >= MMAP_THRESHOLD:
+                tasks.append([path])
+                continue
+            batch.append(path)
+            batch_bytes += size
+            if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+                tasks.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            tasks.append(batch)
+        tasks.reverse()  # popped from the end
+        return tasks
+
+    def _run(self, queues: List[dict], results: Dict[str, Optional[str]]):
+        pool = self._get_pool()
+        running = {}
+        while True:
+            # fill free workers, round-robin across devices within each one's limit
+            submitted = True
+            while submitted and len(running) < self.workers:
+                submitted = False
+                for queue in queues:
+                    if queue['tasks'] and queue['running'] < queue['limit'] and len(running) < self.workers:
+                        running[pool.submit(md5_batch, queue['tasks'].pop())] = queue
+                        queue['running'] += 1
+                        submitted = True
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)['running'] -= 1
+                results.update(future.result())
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, not fork: the GUI and daemon are multithreaded
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,149 @@
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from hashing import HashingService, md5_file
+
+# files modified this recently may still change within the same mtime
+# tick, so their hash is not trusted on the next scan
+RACY_WINDOW_NS = 2_000_000_000
+WRITE_BATCH = 1000
+# our own partial downloads and blob cache copies, editor swap files and
+# the like: never synced, uploaded or watched
+IGNORED_SUFFIXES = (".part", ".blob", ".swp", ".swx", ".tmp", "~")
+
+
+def is_ignored(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.endswith(IGNORED_SUFFIXES) or name.startswith(".#")
+
+
+class ScanResult:
+    ''' Outcome of one LocalIndex.scan '''
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: Dict[str, Tuple[int, int, int, Optional[str]]] = {}
+        self.changed: List[str] = []
+        self.removed: List[str] = []
+        self.hashed_bytes = 0
+
+    def md5(self, path: str) -> Optional[str]:
+        entry = self.files.get(path)
+        return entry[3] if entry else None
+
+
+class LocalIndex:
+    '''Stat cache of local files backed by the local_index table.
+
+    A file is only re-read and hashed when its (size, mtime_ns, inode)
+    signature differs from the stored one, so rescanning an unchanged tree
+    costs one stat per file and no content reads. Files that do need
+    hashing are hashed together by the HashingService.
+    '''
+
+    def __init__(self, db_manager, hasher: Optional[HashingService] = None):
+        self.db_manager = db_manager
+        self.hasher = hasher or HashingService()
+        self.logger = logging.getLogger(__name__)
+
+    def scan(self, root: str, hash_files: bool = True) -> ScanResult:
+        """Walk root, rehash files whose stat signature changed, and persist"""
+        root = os.path.abspath(root)
+        known = self.db_manager.get_local_index(root)
+        result = ScanResult(root)
+        to_hash = {}
+        started = time.time_ns()
+
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False) or is_ignored(entry.path):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+                        previous = known.pop(entry.path, None)
+                        if previous is not None and previous[:3] == signature and previous[3]:
+                            result.files[entry.path] = previous
+                            continue
+                        to_hash[entry.path] = signature
+            except OSError:
+                continue
+
+        hashes = self.hasher.hash_files(to_hash) if hash_files else {}
+        pending = []
+        for path, signature in to_hash.items():
+            md5 = None
+            if hash_files:
+                md5 = hashes.get(path)
+                if md5 is None:
+                    # vanished or unreadable since the walk
+                    continue
+                result.hashed_bytes += signature[0]
+            result.changed.append(path)
+            result.files[path] = signature + (md5,)
+            stored_md5 = md5 if started - signature[1] > RACY_WINDOW_NS else None
+            pending.append((path,) + signature + (stored_md5,))
+            if len(pending) >= WRITE_BATCH:
+                self.db_manager.update_local_index(pending)
+                pending = []
+
+        if pending:
+            self.db_manager.update_local_index(pending)
+        # whatever is left in known no longer exists on disk
+        result.removed = list(known)
+        if result.removed:
+            self.db_manager.remove_local_index(result.removed)
+
+        self.logger.info(f"Scanned {len(result.files)} files under {root}: "
+                         f"{len(result.changed)} changed, {len(result.removed)} removed")
+        return result
+
+    def md5_many(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """md5 of each path, from the index where the stat is unchanged, hashing the rest in parallel"""
+        results: Dict[str, Optional[str]] = {}
+        to_hash = {}
+        for path in map(os.path.abspath, paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                results[path] = None
+                continue
+            signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+            previous = self.db_manager.get_local_index_entry(path)
+            if previous is not None and tuple(previous[:3]) == signature and previous[3]:
+                results[path] = previous[3]
+            else:
+                to_hash[path] = signature
+
+        now = time.time_ns()
+        entries = []
+        for path, md5 in self.hasher.hash_files(to_hash).items():
+            results[path] = md5
+            if md5 is not None:
+                signature = to_hash[path]
+                stored_md5 = md5 if now - signature[1] > RACY_WINDOW_NS else None
+                entries.append((path,) + signature + (stored_md5,))
+        if entries:
+            self.db_manager.update_local_index(entries)
+        return results
+
+    def md5(self, path: str) -> str:
+        """md5 of one file, served from the index when its stat is unchanged"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        previous = self.db_manager.get_local_index_entry(path)
+        if previous is not None and tuple(previous[:3]) == signature and previous[3]:
+            return previous[3]
+
+        md5 = md5_file(path)
+        stored_md5 = md5 if time.time_ns() - st.st_mtime_ns > RACY_WINDOW_NS else None
+        self.db_manager.update_local_index([(path,) + signature + (stored_md5,)])
+        return md5
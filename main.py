@@ -4,15 +4,24 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QListWidget, QPushButton, QLabel, QMessageBox, QFileDialog,
     QListWidgetItem, QStatusBar, QMenuBar, QAction, QProgressBar,
+    QTableView, QLineEdit, QAbstractItemView, QHeaderView, QInputDialog,
+    QSplitter, QTreeView,
 )
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QObject, QTimer, pyqtSignal
 from authenticate import AuthManager
 from database import DatabaseManager
 from drive_manager import DriveManager
+from transfer_manager import TransferManager, DONE, FAILED, PAUSED, RUNNING, QUEUED
+from watcher import WatchService
+from file_model import FileTableModel, FileFilterProxyModel, FolderTreeModel, NAME
+from metrics import get_metrics, set_metrics_enabled
 
 
 basedir = os.path.dirname(__file__)
+# most rows the filter box shows, and how long typing must pause before it searches
+SEARCH_LIMIT = 1000
+SEARCH_DELAY_MS = 150
 
 
 #Base Class
@@ -21,27 +30,99 @@ class FileOperationThread(QThread):
     progress = pyqtSignal(str)
     finished = pyqtSignal(bool, str)
 
-    def __init__(self, operation, *args, **kwargs):
-        super().__init__()
+    def __init__(self, operation, *args, parent=None, **kwargs):
+        # parented so replacing the attribute holding it can't destroy it mid-run
+        super().__init__(parent)
         self.operation = operation
         self.args = args
         self.kwargs = kwargs
+        self.result = None
 
     def run(self):
         try:
             result = self.operation(*self.args, **self.kwargs)
+            self.result = result
             self.finished.emit(True, str(result))
         except Exception as e:
             self.finished.emit(False, str(e))
 
+class FileListingThread(QThread):
+    ''' Stream listing pages to the UI as they arrive '''
+    page_loaded = pyqtSignal(list)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, drive_manager, use_cache=True, parent=None, cached_user=None):
+        super().__init__(parent)
+        self.drive_manager = drive_manager
+        self.use_cache = use_cache
+        # read straight from the cache for this user, before any session exists
+        self.cached_user = cached_user
+        self.folder_tree = None
+
+    def run(self):
+        total = 0
+        try:
+            if self.cached_user:
+                pages = self.drive_manager.iter_cached_pages(self.cached_user)
+            else:
+                pages = self.drive_manager.iter_file_pages(use_cache=self.use_cache)
+            for page in pages:
+                total += len(page)
+                self.page_loaded.emit(page)
+            # index the new pages here, not on the first keystroke in the filter box
+            self.drive_manager.db_manager.refresh_file_search()
+            self.folder_tree = self.drive_manager.get_folder_tree(self.cached_user)
+            self.finished.emit(True, str(total))
+        except Exception as e:
+            self.finished.emit(False, str(e))
+
+class ChangesSyncThread(QThread):
+    ''' Pull the Drive changes feed and hand each applied batch to the UI '''
+    changes = pyqtSignal(list, list)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, drive_manager, parent=None):
+        super().__init__(parent)
+        self.drive_manager = drive_manager
+        self.stats = {}
+
+    def run(self):
+        try:
+            self.stats = self.drive_manager.sync_changes(on_changes=self.changes.emit)
+            self.finished.emit(True, str(self.stats))
+        except Exception as e:
+            self.finished.emit(False, str(e))
+
+class TransferSignals(QObject):
+    ''' Re-emit transfer manager updates as a Qt signal '''
+    transfer_updated = pyqtSignal(object)
+
+    def __init__(self, transfer_manager, parent=None):
+        super().__init__(parent)
+        # emitted from worker threads, delivered queued on the GUI thread
+        transfer_manager.add_listener(self.transfer_updated.emit)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
         # managers
         self.db_manager = DatabaseManager()
+        set_metrics_enabled(self.db_manager.get_setting('metrics_enabled', '0') == '1')
+        self.metrics_export_path = self.db_manager.get_setting('metrics_export_path')
         self.auth_manager = AuthManager(self.db_manager)
         self.drive_manager = DriveManager(self.auth_manager, self.db_manager)
+        self.transfer_manager = TransferManager(
+            self.drive_manager,
+            max_workers=int(self.db_manager.get_setting('transfer_workers', '4')))
+        self.transfer_signals = TransferSignals(self.transfer_manager, self)
+        self.transfer_signals.transfer_updated.connect(self.on_transfer_updated)
+        self.transfer_items = {}
+        self.watch_service = WatchService(self.drive_manager, self.db_manager,
+                                          self.transfer_manager.submit_upload)
+        # one changes sync at a time; a refresh asked for meanwhile runs after it
+        self.sync_thread = None
+        self.refresh_pending = False
 
         self.init_ui()
         self.restore_session()
@@ -84,10 +165,22 @@ class MainWindow(QMainWindow):
         self.refresh_button.clicked.connect(self.refresh_files)
         self.refresh_button.setEnabled(False)
 
-        self.upload_button = QPushButton("Upload File")
+        self.upload_button = QPushButton("Upload Files")
         self.upload_button.clicked.connect(self.upload_file)
         self.upload_button.setEnabled(False)
 
+        self.upload_folder_button = QPushButton("Upload Folder")
+        self.upload_folder_button.clicked.connect(self.upload_folder)
+        self.upload_folder_button.setEnabled(False)
+
+        self.watch_button = QPushButton("Watch Folder")
+        self.watch_button.clicked.connect(self.watch_folder)
+        self.watch_button.setEnabled(False)
+
+        self.sync_button = QPushButton("Sync Folders")
+        self.sync_button.clicked.connect(self.sync_folders)
+        self.sync_button.setEnabled(False)
+
         self.download_button = QPushButton("Download Selected")
         self.download_button.clicked.connect(self.download_selected_file)
         self.download_button.setEnabled(False)
@@ -96,25 +189,103 @@ class MainWindow(QMainWindow):
         buttons_layout.addWidget(self.logout_button)
         buttons_layout.addWidget(self.refresh_button)
         buttons_layout.addWidget(self.upload_button)
+        buttons_layout.addWidget(self.upload_folder_button)
+        buttons_layout.addWidget(self.watch_button)
+        buttons_layout.addWidget(self.sync_button)
         buttons_layout.addWidget(self.download_button)
 
         main_layout.addLayout(buttons_layout)
 
+        # Actions on the selected files, sent as batched Drive requests
+        selection_layout = QHBoxLayout()
+        self.rename_button = QPushButton("Rename")
+        self.rename_button.clicked.connect(self.rename_selected_files)
+        self.move_button = QPushButton("Move")
+        self.move_button.clicked.connect(self.move_selected_files)
+        self.trash_button = QPushButton("Delete")
+        self.trash_button.clicked.connect(self.trash_selected_files)
+        for button in (self.rename_button, self.move_button, self.trash_button):
+            button.setEnabled(False)
+            selection_layout.addWidget(button)
+        selection_layout.addStretch()
+        main_layout.addLayout(selection_layout)
+
         # Files list
-        self.files_list = QListWidget()
-        self.files_list.setStyleSheet("QListWidget { font-size: 12px; }")
-        self.files_list.itemSelectionChanged.connect(self.on_file_selection_changed)
-        main_layout.addWidget(self.files_list)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Search files by name or type")
+        main_layout.addWidget(self.filter_edit)
+
+        self.files_model = FileTableModel(self)
+        self.files_proxy = FileFilterProxyModel(self)
+        self.files_proxy.setSourceModel(self.files_model)
+        self.files_user = None
+        self.current_folder_id = None
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search_files)
+        self.filter_edit.textChanged.connect(self.search_timer.start)
+
+        self.files_view = QTableView()
+        self.files_view.setModel(self.files_proxy)
+        self.files_view.setStyleSheet("QTableView { font-size: 12px; }")
+        self.files_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.files_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.files_view.setSortingEnabled(True)
+        self.files_view.sortByColumn(NAME, Qt.AscendingOrder)
+        self.files_view.verticalHeader().setVisible(False)
+        # fixed row heights let the view skip measuring rows it doesn't paint
+        self.files_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.files_view.verticalHeader().setDefaultSectionSize(22)
+        self.files_view.horizontalHeader().setSectionResizeMode(NAME, QHeaderView.Stretch)
+        self.files_view.selectionModel().selectionChanged.connect(self.on_file_selection_changed)
+
+        # folders expand lazily, one level at a time
+        self.folders_model = FolderTreeModel(self)
+        self.folders_view = QTreeView()
+        self.folders_view.setModel(self.folders_model)
+        self.folders_view.setHeaderHidden(True)
+        self.folders_view.setUniformRowHeights(True)
+        self.folders_view.selectionModel().currentChanged.connect(self.on_folder_selected)
+
+        files_splitter = QSplitter(Qt.Horizontal)
+        files_splitter.addWidget(self.folders_view)
+        files_splitter.addWidget(self.files_view)
+        files_splitter.setStretchFactor(1, 3)
+        main_layout.addWidget(files_splitter)
+
+        # Transfers list
+        transfers_header = QHBoxLayout()
+        transfers_header.addWidget(QLabel("Transfers:"))
+        transfers_header.addStretch()
+        self.pause_transfer_button = QPushButton("Pause/Resume")
+        self.pause_transfer_button.clicked.connect(self.toggle_selected_transfer)
+        self.cancel_transfer_button = QPushButton("Cancel")
+        self.cancel_transfer_button.clicked.connect(self.cancel_selected_transfer)
+        transfers_header.addWidget(self.pause_transfer_button)
+        transfers_header.addWidget(self.cancel_transfer_button)
+        main_layout.addLayout(transfers_header)
+
+        self.transfers_list = QListWidget()
+        self.transfers_list.setMaximumHeight(140)
+        main_layout.addWidget(self.transfers_list)
 
         # Progress bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
+        self.progress_bar.setRange(0, 100)
         main_layout.addWidget(self.progress_bar)
 
         # Status bar
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready")
+        self.metrics_label = QLabel()
+        self.status_bar.addPermanentWidget(self.metrics_label)
+        if get_metrics().enabled:
+            self.metrics_timer = QTimer(self)
+            self.metrics_timer.timeout.connect(self.update_metrics)
+            self.metrics_timer.start(2000)
 
     def create_menu_bar(self):
         """Create application menu bar"""
@@ -138,14 +309,36 @@ class MainWindow(QMainWindow):
         file_menu.addAction(exit_action)
 
     def restore_session(self):
-        """Try to restore previous user session"""
-        if self.auth_manager.initialize_session():
+        """Show the cached listing now and reconnect to Drive in the background"""
+        session = self.db_manager.get_active_user_session()
+        if not session:
+            self.update_ui_authenticated(False)
+            self.status_bar.showMessage("No previous session found")
+            return
+
+        self.auth_status_label.setText("Connecting.....")
+        self.auth_status_label.setStyleSheet("color: orange; font-weight:bold")
+        self.user_info_label.setText(f"User: {session['user_email']}")
+        self.load_files(cached_user=session['user_email'])
+
+        # token refresh and service construction hit the network
+        self.session_thread = FileOperationThread(self.auth_manager.initialize_session)
+        self.session_thread.finished.connect(self.on_session_restored)
+        self.session_thread.start()
+
+    def on_session_restored(self, success: bool, message: str):
+        if success and self.session_thread.result:
             self.update_ui_authenticated(True)
-            self.load_files()
             self.status_bar.showMessage("Session restored successfully")
+            self.refresh_files()
+            self.resume_downloads()
+            self.start_watching()
         else:
             self.update_ui_authenticated(False)
-            self.status_bar.showMessage("No previous session found")
+            self.files_model.clear()
+            self.files_user = None
+            self.folders_model.set_tree(None)
+            self.status_bar.showMessage("Could not restore previous session")
 
     def handle_authentication(self):
         self.status_bar.showMessage("Authenticating......")
@@ -177,6 +370,9 @@ class MainWindow(QMainWindow):
             self.logout_button.setEnabled(True)
             self.refresh_button.setEnabled(True)
             self.upload_button.setEnabled(True)
+            self.upload_folder_button.setEnabled(True)
+            self.watch_button.setEnabled(True)
+            self.sync_button.setEnabled(True)
         else:
             self.auth_status_label.setText("NOt Authenticated")
             self.auth_status_label.setStyleSheet("color: red; font-weight:bold")
@@ -185,42 +381,104 @@ class MainWindow(QMainWindow):
             self.logout_button.setEnabled(False)
             self.refresh_button.setEnabled(False)
             self.upload_button.setEnabled(False)
+            self.upload_folder_button.setEnabled(False)
+            self.watch_button.setEnabled(False)
+            self.sync_button.setEnabled(False)
 
-    def load_files(self, use_cache: bool = True):
-        if not self.auth_manager.is_authenticated():
+    def load_files(self, use_cache: bool = True, cached_user: str = None):
+        if not cached_user and not self.auth_manager.is_authenticated():
             return
 
-        try:
-            self.status_bar.showMessage("Loading files.....")
-            print("loading")
-            files = self.drive_manager.list_files(use_cache=use_cache)
-            print("listing")
-            self.populate_files_list(files)
-            self.status_bar.showMessage(f"Loaded {len(files)} files")
-        except Exception as e:
-            err_msg = f"Failed to load files: {str(e)}"
+        self.status_bar.showMessage("Loading files.....")
+        self.files_model.clear()
+        self.loaded_count = 0
+        self.files_user = cached_user or self.auth_manager.get_current_user()
+        self.current_folder_id = None
+        self.folders_model.set_tree(None)
+
+        self.listing_thread = FileListingThread(self.drive_manager, use_cache=use_cache,
+                                                parent=self, cached_user=cached_user)
+        self.listing_thread.page_loaded.connect(self.on_files_page_loaded)
+        self.listing_thread.finished.connect(self.on_listing_finished)
+        self.listing_thread.start()
+
+    def on_files_page_loaded(self, files):
+        if self.sender() is not self.listing_thread:
+            return  # page from a listing that was superseded
+        self.populate_files_list(files, append=True)
+        self.loaded_count += len(files)
+        self.status_bar.showMessage(f"Loading files..... {self.loaded_count} so far")
+
+    def on_listing_finished(self, success: bool, message: str):
+        if self.sender() is not self.listing_thread:
+            return
+        if success:
+            self.sort_files()
+            self.status_bar.showMessage(f"Loaded {message} files")
+            self.folders_model.set_tree(self.listing_thread.folder_tree)
+            if self.filter_edit.text():
+                self.search_files()
+        else:
+            err_msg = f"Failed to load files: {message}"
             QMessageBox.critical(self, "Error", err_msg)
             self.status_bar.showMessage(err_msg)
 
-    def populate_files_list(self, files):
-        '''Populate file list widget'''
-        print("about to populate")
-        self.files_list.clear()
-
-        for file_info in files:
-            file_name = file_info.get('name', 'Unknown')
-            file_size = file_info.get('size', 0)
-
-            if file_size:
-                size_mb = int(file_size) / (1024*1024)
-                size_str = f" {size_mb:.2f}MB" if size_mb > 1 else f" {int(file_size)/1000} KB"
-            else:
-                size_str = ""
+    def populate_files_list(self, files, append: bool = False):
+        '''Add files to the table model'''
+        if not append:
+            self.files_model.clear()
+        self.files_model.append_files(files)
+
+    def search_files(self):
+        '''Filter the view to cached files matching the filter box, via the search index'''
+        text = self.filter_edit.text()
+        if not text.strip():
+            self.show_folder(self.current_folder_id)
+            return
+        if not self.files_user:
+            self.files_proxy.setFilterFixedString(text)
+            return
+        try:
+            results = self.db_manager.search_files(self.files_user, text, SEARCH_LIMIT)
+        except Exception as e:
+            self.status_bar.showMessage(f"Search failed, filtering by name: {str(e)}")
+            self.files_proxy.setFilterFixedString(text)
+            return
+        # matches may not have streamed in from the listing yet
+        self.files_model.append_files(results)
+        self.files_proxy.set_matching_ids(f['id'] for f in results)
+        suffix = f" (first {SEARCH_LIMIT})" if len(results) == SEARCH_LIMIT else ""
+        self.status_bar.showMessage(f"{len(results)} matching files{suffix}")
+
+    def on_folder_selected(self, current, _previous):
+        self.current_folder_id = self.folders_model.data(current, Qt.UserRole) if current.isValid() else None
+        if self.filter_edit.text():
+            self.filter_edit.clear()  # shows the folder once the search timer fires
+        else:
+            self.show_folder(self.current_folder_id)
 
-            disp_text = f"{file_name}__{size_str}"
-            item = QListWidgetItem(disp_text)
-            item.setData(Qt.UserRole, file_info)
-            self.files_list.addItem(item)
+    def show_folder(self, folder_id):
+        '''Filter the view to one folder's contents; None shows every file'''
+        if folder_id is None or not self.files_user:
+            self.files_proxy.set_matching_ids(None)
+            return
+        tree = self.drive_manager.get_folder_tree(self.files_user)
+        child_ids = tree.children(folder_id)
+        # children still on their way from the listing come straight from the cache
+        missing = [file_id for file_id in child_ids if not self.files_model.has_id(file_id)]
+        if missing:
+            self.files_model.append_files(
+                self.db_manager.get_cached_files_by_id(self.files_user, missing).values())
+        self.files_proxy.set_matching_ids(child_ids)
+        # breadcrumb from the tree, relative to the top-level folder
+        path = tree.path_of(folder_id)
+        self.status_bar.showMessage(f"/{path} — {len(child_ids)} items" if path
+                                    else f"{len(child_ids)} items in folder")
+
+    def sort_files(self):
+        # once per listing rather than per page; rows show in arrival order until then
+        header = self.files_view.horizontalHeader()
+        self.files_model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
 
     def handle_logout(self):
         reply = QMessageBox.question(
@@ -229,84 +487,370 @@ class MainWindow(QMainWindow):
             QMessageBox.Yes | QMessageBox.No
         )
         if reply == QMessageBox.Yes:
+            self.watch_service.stop()
             if self.auth_manager.logout():
                 self.update_ui_authenticated(False)
-                self.files_list.clear()
+                self.files_model.clear()
+                self.files_user = None
+                self.folders_model.set_tree(None)
                 self.status_bar.showMessage("Logged out successfully")
                 QMessageBox.information(self, "Success", "Logged out success")
             else:
                 QMessageBox.critical(self, "Error", "Failed to logout")
 
     def upload_file(self):
-        ''' Upload file to google drive '''
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select File to Upload")
-
-        if file_path:
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setRange(0, 0)
-
-            self.upload_thread = FileOperationThread(
-                self.drive_manager.upload_file, file_path
-            )
-            self.upload_thread.finished.connect(self.on_upload_finished)
-            self.upload_thread.start()
+        ''' Queue files for upload to google drive '''
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Files to Upload")
 
-    def on_upload_finished(self, success: bool, message:str):
-        self.progress_bar.setVisible(False)
+        for file_path in file_paths:
+            self.transfer_manager.submit_upload(file_path)
 
-        if success:
-            QMessageBox.information(self, "Success", f"File uploaded successfully!\n File ID: {message}")
-            self.refresh_files()
-        else:
-            QMessageBox.critical(self, "Upload Failed", message)
+    def upload_folder(self):
+        ''' Upload new and changed files from a local folder '''
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Upload")
+        if not folder:
+            return
 
-        self.status_bar.showMessage("Upload completed" if success else "Upload failed")
+        self.status_bar.showMessage(f"Comparing {folder} with Google Drive.....")
+        self.upload_folder_button.setEnabled(False)
+        self.folder_plan_thread = FileOperationThread(self.drive_manager.plan_folder_upload, folder)
+        self.folder_plan_thread.finished.connect(self.on_folder_plan_finished)
+        self.folder_plan_thread.start()
+
+    def on_folder_plan_finished(self, success: bool, message: str):
+        self.upload_folder_button.setEnabled(self.auth_manager.is_authenticated())
+        if not success:
+            err_msg = f"Folder upload failed: {message}"
+            QMessageBox.critical(self, "Upload Failed", err_msg)
+            self.status_bar.showMessage(err_msg)
+            return
 
-    def download_selected_file(self):
-    
-        current_item = self.files_list.currentItem()
-        if not current_item:
+        plan = self.folder_plan_thread.result
+        if not plan:
+            self.status_bar.showMessage("Folder is already up to date")
             return
+        for entry in plan:
+            self.transfer_manager.submit_upload(
+                entry['path'], parent_id=entry['parent_id'], file_id=entry['file_id'])
+        self.status_bar.showMessage(f"Queued {len(plan)} changed files for upload")
 
-        file_info = current_item.data(Qt.UserRole)
-        file_id = file_info.get('id')
-        file_name = file_info.get('name')
+    def selected_files(self):
+        return [self.files_proxy.file_info(index)
+                for index in self.files_view.selectionModel().selectedRows()]
 
-        if not file_id or not file_name:
+    def download_selected_file(self):
+        file_ids = [file_info['id'] for file_info in self.selected_files()
+                    if file_info.get('id') and file_info.get('name')]
+        if not file_ids:
             QMessageBox.warning(self, "Error", "Invalid file selection")
             return
-        
+
         download_path = QFileDialog.getExistingDirectory(self, "Select Dowload Location")
         if not download_path:
             return
-        
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)
 
-        self.download_thread = FileOperationThread(
-            self.drive_manager.download_file, file_id, file_name, download_path
+        # revalidate stale cache entries in one batch before queueing
+        self.status_bar.showMessage(f"Checking {len(file_ids)} files.....")
+        thread = FileOperationThread(self.drive_manager.get_files_metadata, file_ids, parent=self)
+        thread.finished.connect(
+            lambda success, message: self.on_download_metadata(
+                success, message, file_ids, download_path, thread.result))
+        thread.start()
+
+    def on_download_metadata(self, success: bool, message: str, file_ids, download_path: str, metadata):
+        if not success:
+            QMessageBox.critical(self, "Error", f"Download failed: {message}")
+            self.status_bar.showMessage("Download failed")
+            return
+        # files deleted on Drive since the listing was loaded
+        self.files_model.remove_ids(file_id for file_id in file_ids if file_id not in metadata)
+        self.files_model.append_files(metadata.values())
+        for file_id in file_ids:
+            if file_id in metadata:
+                file_info = metadata[file_id]
+                self.transfer_manager.submit_download(file_id, file_info['name'], download_path,
+                                                      file_metadata=file_info)
+        self.status_bar.showMessage(f"Queued {len(metadata)} downloads")
+
+    def trash_selected_files(self):
+        files = self.selected_files()
+        if not files:
+            return
+        reply = QMessageBox.question(
+            self, 'Confirm Delete',
+            f'Move {len(files)} file(s) to the Drive trash?',
+            QMessageBox.Yes | QMessageBox.No
         )
-        self.download_thread.finished.connect(self.on_download_finished)
-        self.download_thread.start()
+        if reply != QMessageBox.Yes:
+            return
 
-    def on_download_finished(self, success:bool, message:str):
-        self.progress_bar.setVisible(False)
+        self.status_bar.showMessage(f"Deleting {len(files)} files.....")
+        thread = FileOperationThread(
+            self.drive_manager.trash_files, [file_info['id'] for file_info in files], parent=self)
+        # each batch reads its own thread's result, even if another batch was started since
+        thread.finished.connect(
+            lambda success, message: self.on_trash_finished(success, message, files, thread.result))
+        thread.start()
+
+    def on_trash_finished(self, success: bool, message: str, files, failed):
+        if not success:
+            QMessageBox.critical(self, "Error", f"Delete failed: {message}")
+            self.status_bar.showMessage("Delete failed")
+            return
+        self.files_model.remove_ids(file_info['id'] for file_info in files
+                                    if file_info['id'] not in failed)
+        self.folders_model.refresh()
+        self.report_batch_result("Deleted", len(files), failed)
+
+    def rename_selected_files(self):
+        files = self.selected_files()
+        if not files:
+            return
+        if len(files) == 1:
+            new_name, ok = QInputDialog.getText(self, "Rename", "New name:", text=files[0]['name'])
+            if not ok or not new_name or new_name == files[0]['name']:
+                return
+            moves = [(files[0]['id'], new_name, None, None)]
+        else:
+            find, ok = QInputDialog.getText(self, "Rename", f"Replace text in {len(files)} names:")
+            if not ok or not find:
+                return
+            replace, ok = QInputDialog.getText(self, "Rename", f"Replace '{find}' with:")
+            if not ok:
+                return
+            moves = [(file_info['id'], file_info['name'].replace(find, replace), None, None)
+                     for file_info in files if find in file_info['name']]
+        self.start_move(moves, "Renamed")
+
+    def move_selected_files(self):
+        files = self.selected_files()
+        if not files:
+            return
+        # 'root' is Drive's alias for the My Drive folder
+        folders = [("root", "My Drive")] + sorted(self.files_model.folders(), key=lambda f: f[1].lower())
+        labels = [name if folder_id == "root" else f"{name} ({folder_id})" for folder_id, name in folders]
+        label, ok = QInputDialog.getItem(self, "Move", f"Move {len(files)} file(s) to:", labels, 0, False)
+        if not ok:
+            return
+        target_id = folders[labels.index(label)][0]
+        moves = [(file_info['id'], None, target_id, (file_info.get('parents') or [None])[0])
+                 for file_info in files if file_info['id'] != target_id]
+        self.start_move(moves, "Moved")
 
+    def start_move(self, moves, verb: str):
+        if not moves:
+            return
+        self.status_bar.showMessage(f"Updating {len(moves)} files.....")
+        thread = FileOperationThread(self.drive_manager.move_files, moves, parent=self)
+        thread.finished.connect(
+            lambda success, message: self.on_move_finished(success, message, verb, len(moves), thread.result))
+        thread.start()
+
+    def on_move_finished(self, success: bool, message: str, verb: str, count: int, result):
+        if not success:
+            QMessageBox.critical(self, "Error", f"{verb} failed: {message}")
+            self.status_bar.showMessage(f"{verb} failed")
+            return
+        moved, failed = result
+        self.files_model.append_files(moved)
+        self.folders_model.refresh()
+        if self.filter_edit.text() or self.current_folder_id:
+            self.search_timer.start()
+        self.report_batch_result(verb, count, failed)
+
+    def report_batch_result(self, verb: str, count: int, failed):
+        if failed:
+            QMessageBox.warning(self, "Error", f"{len(failed)} of {count} files failed:\n" +
+                                "\n".join(f"{file_id}: {error}" for file_id, error in list(failed.items())[:10]))
+        self.status_bar.showMessage(f"{verb} {count - len(failed)} of {count} files")
+
+    def resume_downloads(self):
+        ''' Requeue downloads interrupted by a previous run '''
+        self.transfer_manager.submit_partial_downloads()
+
+    def start_watching(self):
+        ''' Watch monitored folders; the initial catch-up runs off the GUI thread '''
+        thread = FileOperationThread(self.watch_service.start, parent=self)
+        thread.start()
+
+    def watch_folder(self):
+        ''' Keep a local folder synced to google drive '''
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Watch")
+        if not folder:
+            return
 
-        if success:
-            QMessageBox.information(self, "Success", f"File downloaded successfully!\n Saved to: {message}")
-            self.refresh_files()
-        else:
-            QMessageBox.critical(self, "Downlaod Failed", message)
+        self.status_bar.showMessage(f"Watching {folder}.....")
+        thread = FileOperationThread(self.watch_service.add_folder, folder, parent=self)
+        thread.finished.connect(
+            lambda success, message: self.status_bar.showMessage(
+                f"Watching {folder}" if success else f"Could not watch folder: {message}"))
+        thread.start()
+
+    def sync_folders(self):
+        ''' Plan a two-way sync of every watched folder and confirm it '''
+        monitored = self.db_manager.get_monitored_paths(self.auth_manager.get_current_user())
+        if not monitored:
+            QMessageBox.information(self, "Sync", "No watched folders to sync")
+            return
+
+        self.status_bar.showMessage("Planning sync.....")
+        self.sync_button.setEnabled(False)
+        thread = FileOperationThread(
+            lambda: [self.drive_manager.plan_sync(m['local_path'], m['remote_folder_id'])
+                     for m in monitored], parent=self)
+        thread.finished.connect(
+            lambda success, message: self.on_sync_planned(success, message, thread.result))
+        thread.start()
+
+    def on_sync_planned(self, success: bool, message: str, plans):
+        self.sync_button.setEnabled(self.auth_manager.is_authenticated())
+        if not success:
+            err_msg = f"Sync planning failed: {message}"
+            QMessageBox.critical(self, "Sync Failed", err_msg)
+            self.status_bar.showMessage(err_msg)
+            return
+
+        plans = [plan for plan in plans if plan.work()]
+        if not plans:
+            self.status_bar.showMessage("Watched folders are up to date")
+            return
 
-        self.status_bar.showMessage("Download completed" if success else "Download failed")
+        box = QMessageBox(self)
+        box.setWindowTitle("Sync Folders")
+        box.setText(f"{sum(len(plan.work()) for plan in plans)} changes to sync. Apply them?")
+        box.setDetailedText("\n\n".join(plan.report() for plan in plans))
+        box.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        if box.exec_() != QMessageBox.Yes:
+            return
+
+        self.status_bar.showMessage("Syncing.....")
+        # no second sync until this one is applied; its plan would be stale
+        self.sync_button.setEnabled(False)
+        thread = FileOperationThread(
+            lambda: [self.drive_manager.apply_sync_plan(plan) for plan in plans], parent=self)
+        thread.finished.connect(self.on_sync_applied)
+        thread.start()
+
+    def on_sync_applied(self, success: bool, message: str):
+        self.sync_button.setEnabled(self.auth_manager.is_authenticated())
+        self.status_bar.showMessage("Sync completed" if success else f"Sync failed: {message}")
+        self.refresh_files()
+
+    def on_transfer_updated(self, transfer):
+        item = self.transfer_items.get(transfer.id)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, transfer.id)
+            self.transfers_list.addItem(item)
+            self.transfer_items[transfer.id] = item
+
+        arrow = "↑" if transfer.kind == "upload" else "↓"
+        text = f"{arrow} {transfer.name} — {transfer.state} {int(transfer.progress * 100)}%"
+        if transfer.error:
+            text += f" ({transfer.error})"
+        item.setText(text)
+
+        active = [t for t in self.transfer_manager.transfers() if t.state in (QUEUED, RUNNING)]
+        if active:
+            total = sum(t.total_bytes for t in active) or 1
+            done = sum(t.bytes_done for t in active)
+            self.progress_bar.setVisible(True)
+            self.progress_bar.setValue(int(done / total * 100))
+            self.status_bar.showMessage(f"{len(active)} transfers in progress")
+        else:
+            self.progress_bar.setVisible(False)
+
+        if transfer.state == FAILED:
+            self.status_bar.showMessage(f"{transfer.kind.capitalize()} of {transfer.name} failed")
+        elif transfer.state == DONE:
+            self.status_bar.showMessage(f"{transfer.kind.capitalize()} of {transfer.name} completed")
+            if transfer.kind == "upload":
+                # upload_file wrote Drive's metadata to the cache; show just that row
+                file_info = self.db_manager.get_cached_file(
+                    self.auth_manager.get_current_user(), transfer.result)
+                if file_info:
+                    self.files_model.append_files([file_info])
+
+    def _selected_transfer_id(self):
+        item = self.transfers_list.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def toggle_selected_transfer(self):
+        transfer = self.transfer_manager.get(self._selected_transfer_id())
+        if transfer is None:
+            return
+        if transfer.state == PAUSED:
+            self.transfer_manager.resume(transfer.id)
+        else:
+            self.transfer_manager.pause(transfer.id)
+
+    def cancel_selected_transfer(self):
+        transfer_id = self._selected_transfer_id()
+        if transfer_id is not None:
+            self.transfer_manager.cancel(transfer_id)
+
+    def update_metrics(self):
+        metrics = get_metrics()
+        self.metrics_label.setText(metrics.summary())
+        if self.metrics_export_path:
+            try:
+                metrics.export(self.metrics_export_path)
+            except OSError as e:
+                self.metrics_export_path = None
+                self.status_bar.showMessage(f"Could not export metrics: {str(e)}")
+
+    def closeEvent(self, event):
+        # running downloads keep their partial files and resume next launch
+        self.watch_service.stop()
+        self.transfer_manager.shutdown(wait=False)
+        super().closeEvent(event)
 
     def refresh_files(self):
-        self.load_files(use_cache=False)
-    
+        if not self.auth_manager.is_authenticated():
+            return
+        if self.sync_thread is not None:
+            # the running sync may have missed whatever prompted this one
+            self.refresh_pending = True
+            return
+
+        self.status_bar.showMessage("Checking for changes.....")
+        self.refresh_button.setEnabled(False)
+        thread = ChangesSyncThread(self.drive_manager, parent=self)
+        thread.changes.connect(self.on_remote_changes)
+        thread.finished.connect(
+            lambda success, message: self.on_sync_finished(success, message, thread.stats))
+        self.sync_thread = thread
+        thread.start()
+
+    def on_remote_changes(self, upserts, removed_ids):
+        # diff the delta into the view instead of reloading it
+        self.files_model.remove_ids(removed_ids)
+        self.files_model.append_files(upserts)
+        self.folders_model.refresh()
+        if self.filter_edit.text() or self.current_folder_id:
+            self.search_timer.start()
+
+    def on_sync_finished(self, success: bool, message: str, stats):
+        self.sync_thread = None
+        self.refresh_button.setEnabled(self.auth_manager.is_authenticated())
+        if success:
+            if stats.get("full_resync"):
+                self.load_files(use_cache=True)
+            else:
+                self.status_bar.showMessage(
+                    f"Up to date ({stats.get('changed', 0)} changed, {stats.get('removed', 0)} removed)")
+        else:
+            err_msg = f"Failed to refresh files: {message}"
+            QMessageBox.critical(self, "Error", err_msg)
+            self.status_bar.showMessage(err_msg)
+        if self.refresh_pending:
+            self.refresh_pending = False
+            self.refresh_files()
+
     def on_file_selection_changed(self):
-        current_item = self.files_list.currentItem()
-        self.download_button.setEnabled(current_item is  not None and self.auth_manager.is_authenticated())
+        has_selection = self.files_view.selectionModel().hasSelection()
+        for button in (self.download_button, self.rename_button, self.move_button, self.trash_button):
+            button.setEnabled(has_selection and self.auth_manager.is_authenticated())
 
     
 
@@ -0,0 +1,274 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+# seconds; covers a cached SQLite read up to a slow chunk upload
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MB = 1024 * 1024
+
+# metric names used across the app
+DRIVE_REQUEST_SECONDS = "drive_request_seconds"
+DRIVE_REQUESTS = "drive_requests_total"
+DRIVE_RETRIES = "drive_retries_total"
+SQLITE_OP_SECONDS = "sqlite_op_seconds"
+TRANSFER_BYTES = "transfer_bytes_total"
+TRANSFER_SECONDS = "transfer_seconds"
+CACHE_LOOKUPS = "cache_lookups_total"
+
+HELP = {
+    DRIVE_REQUEST_SECONDS: "Drive API call latency including retries, by API method",
+    DRIVE_REQUESTS: "Drive API calls by API method and final HTTP status",
+    DRIVE_RETRIES: "Drive API calls retried after throttling or a transient error",
+    SQLITE_OP_SECONDS: "DatabaseManager operation latency",
+    TRANSFER_BYTES: "Bytes moved by finished uploads and downloads",
+    TRANSFER_SECONDS: "Wall time of finished uploads and downloads",
+    CACHE_LOOKUPS: "file_cache lookups that were served locally (hit) or needed Drive (miss)",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    ''' Cumulative bucket counts, sum and count, like a Prometheus histogram '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return bound
+        return float('inf')
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    '''Process-wide counters and latency histograms.
+
+    Everything is kept in memory under one lock; export() writes a
+    Prometheus text file (for node_exporter's textfile collector) or a
+    JSON document, and summary() is a one-line view for the status bar.
+    '''
+    enabled = True
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.logger = logging.getLogger(__name__)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, name, labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """Total of a counter over every series matching labels"""
+        with self._lock:
+            return sum(value for key, value in self._counters.get(name, {}).items()
+                       if set(labels.items()) <= set(key))
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """Histograms of name matching labels, merged into one"""
+        merged = Histogram()
+        with self._lock:
+            for key, histogram in self._histograms.get(name, {}).items():
+                if set(labels.items()) <= set(key):
+                    merged.count += histogram.count
+                    merged.sum += histogram.sum
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+        return merged
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in self._counters.items()}
+            histograms = {
+                name: [{"labels": dict(key), "count": h.count, "sum": h.sum,
+                        "buckets": dict(zip(map(str, h.buckets), h.counts))}
+                       for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+        return {"started": self.started, "uptime": time.time() - self.started,
+                "counters": counters, "histograms": histograms}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += self._prometheus_header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"filesyncer_{name}{self._labels(key)} {value:.17g}")
+            for name, series in sorted(self._histograms.items()):
+                lines += self._prometheus_header(name, "histogram")
+                for key, h in series.items():
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"filesyncer_{name}_bucket{self._labels(key, le=f'{bound:g}')} {count}")
+                    lines.append(f"filesyncer_{name}_bucket{self._labels(key, le='+Inf')} {h.count}")
+                    lines.append(f"filesyncer_{name}_sum{self._labels(key)} {h.sum:.6f}")
+                    lines.append(f"filesyncer_{name}_count{self._labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def _prometheus_header(self, name: str, kind: str) -> list:
+        header = [f"# TYPE filesyncer_{name} {kind}"]
+        if name in HELP:
+            header.insert(0, f"# HELP filesyncer_{name} {HELP[name]}")
+        return header
+
+    def _labels(self, key: LabelKey, **extra) -> str:
+        pairs = list(key) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def export(self, path: str):
+        """Write metrics to path: JSON for a .json suffix, Prometheus text otherwise"""
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.prometheus_text()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # scrapers must never read a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def summary(self) -> str:
+        """Short live summary for a status line"""
+        drive = self.histogram(DRIVE_REQUEST_SECONDS)
+        sqlite = self.histogram(SQLITE_OP_SECONDS)
+        transfers = self.histogram(TRANSFER_SECONDS)
+        transferred = self.counter(TRANSFER_BYTES)
+        hits = self.counter(CACHE_LOOKUPS, result="hit")
+        lookups = hits + self.counter(CACHE_LOOKUPS, result="miss")
+        parts = [
+            f"API {drive.count} calls p95 {drive.quantile(0.95) * 1000:.0f} ms",
+            f"DB p95 {sqlite.quantile(0.95) * 1000:.1f} ms",
+            f"{transferred / MB:.1f} MB at {transferred / MB / transfers.sum if transfers.sum else 0:.1f} MB/s",
+            f"cache hits {hits / lookups * 100 if lookups else 0:.0f}%",
+        ]
+        return " | ".join(parts)
+
+
+class NullMetrics(Metrics):
+    ''' Metrics turned off: every call is a no-op '''
+    enabled = False
+
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    def timer(self, name: str, **labels):
+        return _NULL_TIMER
+
+    def summary(self) -> str:
+        return ""
+
+
+_metrics: Metrics = NullMetrics()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide metrics registry; a NullMetrics unless enabled"""
+    return _metrics
+
+
+def set_metrics_enabled(enabled: bool) -> Metrics:
+    """Turn collection on or off; turning it on keeps any data already collected"""
+    global _metrics
+    if enabled and not _metrics.enabled:
+        _metrics = Metrics()
+    elif not enabled and _metrics.enabled:
+        _metrics = NullMetrics()
+    return _metrics
+
+
+def timed_methods(metric: str, label: str):
+    """Class decorator timing every public method into metric, labelled by method name.
+
+    Generator methods are left alone, since a wrapper would only time
+    creating the generator. With metrics off the wrapper costs one
+    attribute check per call.
+    """
+    def wrap(method, name):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            metrics = _metrics
+            if not metrics.enabled:
+                return method(*args, **kwargs)
+            with metrics.timer(metric, **{label: name}):
+                return method(*args, **kwargs)
+        return timed
+
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.isfunction(method) or inspect.isgeneratorfunction(method):
+                continue
+            setattr(cls, name, wrap(method, name))
+        return cls
+    return decorate
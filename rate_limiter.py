@@ -0,0 +1,109 @@
+import json
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+# Drive's default per-user quota is 12,000 queries a minute
+DEFAULT_RATE = 200.0
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 64.0
+# several requests in flight see the same throttling episode; only
+# shrink the window once per interval
+DECREASE_INTERVAL = 1.0
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ("userRateLimitExceeded", "rateLimitExceeded")
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than a server Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+
+def is_retryable(status: int, content: bytes = b"") -> bool:
+    """True for responses that mean "slow down" rather than "this call is wrong"."""
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status != 403:
+        return False
+    # a 403 is only retryable when Drive says a rate limit was hit
+    try:
+        errors = json.loads(content).get("error", {}).get("errors", [])
+    except (ValueError, AttributeError):
+        return False
+    return any(error.get("reason") in RATE_LIMIT_REASONS for error in errors)
+
+
+class RateLimiter:
+    '''Central scheduler for Drive requests.
+
+    A token bucket caps the request rate at the configured quota, and an
+    AIMD window caps how many requests are in flight: it grows by roughly
+    one per window of successful requests and halves when Drive throttles.
+    Together they keep sustained throughput just under the quota instead
+    of bursting into 429s and backing off in lockstep.
+    '''
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, min_concurrency: int = 1):
+        self.rate = rate
+        # a small burst keeps a cold start from spending a whole second of quota at once
+        self.burst = burst or max(1.0, rate / 10)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.throttle_count = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.logger = logging.getLogger(__name__)
+
+    def acquire(self, cost: float = 1):
+        """Block until a concurrency slot and cost tokens are available"""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+            while True:
+                self._refill()
+                if self._tokens > 0:
+                    # large costs (batches) may overdraw; later callers wait it off
+                    self._tokens -= cost
+                    return
+                self._cond.wait((1 - self._tokens) / self.rate)
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._decrease()
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        """Record throttling seen outside acquire/release, e.g. inside a batch response"""
+        with self._cond:
+            self._decrease()
+
+    def _decrease(self):
+        self.throttle_count += 1
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        # drop any saved-up burst so the smaller window takes effect at once
+        self._tokens = min(self._tokens, 0)
+        self.logger.info(f"Drive throttled requests; concurrency window now {int(self.limit)}")
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
@@ -0,0 +1,250 @@
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from folder_tree import MIME
+from local_index import LocalIndex
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+DELETE_LOCAL = "delete_local"
+DELETE_REMOTE = "delete_remote"
+RENAME_LOCAL = "rename_local"
+RENAME_REMOTE = "rename_remote"
+CONFLICT = "conflict"
+RECORD = "record"
+FORGET = "forget"
+
+# actions that only touch sync_state, never files
+BOOKKEEPING = (RECORD, FORGET)
+GOOGLE_APPS_PREFIX = "application/vnd.google-apps."
+
+
+class SyncAction:
+    ''' One step of a sync plan for a path relative to the synced root '''
+
+    def __init__(self, kind: str, rel_path: str, local_md5: Optional[str] = None,
+                 remote: Optional[Dict[str, Any]] = None, file_id: Optional[str] = None,
+                 source_path: Optional[str] = None, reason: str = ""):
+        self.kind = kind
+        self.rel_path = rel_path
+        self.local_md5 = local_md5
+        self.remote = remote
+        self.file_id = file_id or (remote or {}).get('id')
+        # for renames: the path the entry is moving from
+        self.source_path = source_path
+        self.reason = reason
+
+    def __repr__(self):
+        return f"SyncAction({self.kind!r}, {self.rel_path!r})"
+
+
+class SyncPlan:
+    ''' Ordered actions for one local root / remote folder pair '''
+
+    def __init__(self, local_root: str, remote_folder_id: str):
+        self.local_root = local_root
+        self.remote_folder_id = remote_folder_id
+        self.actions: List[SyncAction] = []
+
+    def work(self) -> List[SyncAction]:
+        """Actions that move or change files"""
+        return [action for action in self.actions if action.kind not in BOOKKEEPING]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {}
+        for action in self.work():
+            counts[action.kind] = counts.get(action.kind, 0) + 1
+        return counts
+
+    def report(self) -> str:
+        """Human readable dry-run summary"""
+        work = self.work()
+        if not work:
+            return f"{self.local_root}: up to date"
+        lines = [f"{self.local_root}: {len(work)} actions"]
+        for action in work:
+            if action.source_path:
+                lines.append(f"  {action.kind:14} {action.source_path} -> {action.rel_path}")
+            else:
+                detail = f" ({action.reason})" if action.reason else ""
+                lines.append(f"  {action.kind:14} {action.rel_path}{detail}")
+        return "\n".join(lines)
+
+
+class SyncPlanner:
+    '''Three-way reconciliation of a local tree against its Drive folder.
+
+    The local scan (from the stat-cached LocalIndex), the remote entries
+    under the folder (from file_cache, through the FolderTree when there
+    is one) and the sync_state baseline are each loaded in bulk, sorted
+    by relative path and merged in a single pass, so planning is linear
+    in the number of entries.
+    '''
+
+    def __init__(self, db_manager, local_index: Optional[LocalIndex] = None, folder_tree=None):
+        self.db_manager = db_manager
+        self.local_index = local_index or LocalIndex(db_manager)
+        # a loaded FolderTree; without one the whole cache is read to find the folder's entries
+        self.folder_tree = folder_tree
+        self.logger = logging.getLogger(__name__)
+
+    def plan(self, user_email: str, local_root: str, remote_folder_id: str) -> SyncPlan:
+        local_root = os.path.abspath(local_root)
+        scan = self.local_index.scan(local_root)
+        local = sorted(
+            (self._rel_path(local_root, path), entry[3])
+            for path, entry in scan.files.items()
+        )
+        remote = sorted(self.remote_tree(user_email, remote_folder_id).items())
+        baseline = sorted(self.db_manager.get_sync_baseline(user_email, local_root).items())
+
+        plan = SyncPlan(local_root, remote_folder_id)
+        for rel_path, local_md5, remote_info, base in self._merge(local, remote, baseline):
+            action = self._decide(rel_path, local_md5, remote_info, base)
+            if action is not None:
+                plan.actions.append(action)
+        plan.actions = self._pair_renames(plan.actions)
+        self.logger.info(f"Planned {len(plan.work())} sync actions for {local_root}")
+        return plan
+
+    def remote_tree(self, user_email: str, folder_id: str) -> Dict[str, Dict[str, Any]]:
+        """Map relative path -> cached metadata for every file below folder_id"""
+        if self.folder_tree is not None and self.folder_tree.user_email == user_email:
+            return self._remote_tree_indexed(user_email, folder_id)
+        children: Dict[str, List[Dict[str, Any]]] = {}
+        for file_info in self.db_manager.get_cached_files(user_email):
+            for parent in file_info.get('parents') or []:
+                children.setdefault(parent, []).append(file_info)
+
+        tree = {}
+        stack = [(folder_id, "")]
+        while stack:
+            parent, prefix = stack.pop()
+            # newest first, so the newest of same-named siblings wins
+            entries = sorted(children.get(parent, []),
+                             key=lambda f: f.get('modifiedTime') or "", reverse=True)
+            for file_info in entries:
+                rel_path = prefix + file_info['name']
+                mime_type = file_info.get('mimeType') or ""
+                if mime_type == GOOGLE_APPS_PREFIX + "folder":
+                    stack.append((file_info['id'], rel_path + "/"))
+                elif not mime_type.startswith(GOOGLE_APPS_PREFIX) and rel_path not in tree:
+                    # native Docs/Sheets have no binary content to sync
+                    tree[rel_path] = file_info
+        return tree
+
+    def _remote_tree_indexed(self, user_email: str, folder_id: str) -> Dict[str, Dict[str, Any]]:
+        # the tree gives the paths below folder_id; only those rows are read back
+        paths = {}
+        for rel_path, file_id, entry in self.folder_tree.walk(folder_id):
+            mime_type = entry[MIME]
+            if not mime_type.startswith(GOOGLE_APPS_PREFIX) and rel_path not in paths:
+                paths[rel_path] = file_id
+        cached = self.db_manager.get_cached_files_by_id(user_email, paths.values())
+        return {rel_path: cached[file_id] for rel_path, file_id in paths.items() if file_id in cached}
+
+    def _rel_path(self, root: str, path: str) -> str:
+        return os.path.relpath(path, root).replace(os.sep, "/")
+
+    def _merge(self, local: List[Tuple[str, Any]], remote: List[Tuple[str, Any]],
+               baseline: List[Tuple[str, Any]]) -> Iterator[tuple]:
+        """Yield (rel_path, local_md5, remote_info, baseline) over three sorted lists"""
+        i = j = k = 0
+        while i < len(local) or j < len(remote) or k < len(baseline):
+            heads = []
+            if i < len(local):
+                heads.append(local[i][0])
+            if j < len(remote):
+                heads.append(remote[j][0])
+            if k < len(baseline):
+                heads.append(baseline[k][0])
+            key = min(heads)
+
+            local_md5 = remote_info = base = None
+            if i < len(local) and local[i][0] == key:
+                local_md5 = local[i][1]
+                i += 1
+            if j < len(remote) and remote[j][0] == key:
+                remote_info = remote[j][1]
+                j += 1
+            if k < len(baseline) and baseline[k][0] == key:
+                base = baseline[k][1]
+                k += 1
+            yield key, local_md5, remote_info, base
+
+    def _decide(self, rel_path: str, local_md5: Optional[str], remote: Optional[Dict[str, Any]],
+                base: Optional[Dict[str, Any]]) -> Optional[SyncAction]:
+        remote_md5 = remote.get('md5Checksum') if remote else None
+        has_local = local_md5 is not None
+        has_remote = remote is not None
+
+        if has_local and has_remote:
+            if local_md5 == remote_md5:
+                if base and base['local_md5'] == local_md5 and base['remote_md5'] == remote_md5:
+                    return None
+                return SyncAction(RECORD, rel_path, local_md5, remote)
+            if base is None:
+                return SyncAction(CONFLICT, rel_path, local_md5, remote,
+                                  reason="differs on both sides, never synced")
+            local_changed = local_md5 != base['local_md5']
+            remote_changed = remote_md5 != base['remote_md5']
+            if local_changed and not remote_changed:
+                return SyncAction(UPLOAD, rel_path, local_md5, remote)
+            if remote_changed and not local_changed:
+                return SyncAction(DOWNLOAD, rel_path, local_md5, remote)
+            return SyncAction(CONFLICT, rel_path, local_md5, remote, reason="changed on both sides")
+
+        if has_local:
+            if base is None:
+                return SyncAction(UPLOAD, rel_path, local_md5)
+            if local_md5 == base['local_md5']:
+                return SyncAction(DELETE_LOCAL, rel_path, local_md5, file_id=base['file_id'],
+                                  reason="deleted on Drive")
+            return SyncAction(CONFLICT, rel_path, local_md5, file_id=base['file_id'],
+                              reason="deleted on Drive, changed locally")
+
+        if has_remote:
+            if base is None:
+                return SyncAction(DOWNLOAD, rel_path, remote=remote)
+            if remote_md5 == base['remote_md5']:
+                return SyncAction(DELETE_REMOTE, rel_path, remote=remote, reason="deleted locally")
+            return SyncAction(CONFLICT, rel_path, remote=remote,
+                              reason="deleted locally, changed on Drive")
+
+        # gone on both sides
+        return SyncAction(FORGET, rel_path)
+
+    def _pair_renames(self, actions: List[SyncAction]) -> List[SyncAction]:
+        """Turn a delete plus a create of the same content into a rename"""
+        by_md5: Dict[Tuple[str, str], List[SyncAction]] = {}
+        for action in actions:
+            if action.kind == DELETE_REMOTE and action.remote.get('md5Checksum'):
+                # moved locally: old path gone here, still on Drive
+                by_md5.setdefault((UPLOAD, action.remote['md5Checksum']), []).append(action)
+            elif action.kind == DELETE_LOCAL and action.local_md5:
+                # moved on Drive: old path still here, gone from Drive
+                by_md5.setdefault((DOWNLOAD, action.local_md5), []).append(action)
+
+        result = []
+        consumed = set()
+        for action in actions:
+            md5 = None
+            # only brand new paths can be the far end of a rename
+            if action.kind == UPLOAD and action.remote is None:
+                md5 = action.local_md5
+            elif action.kind == DOWNLOAD and action.local_md5 is None:
+                md5 = action.remote.get('md5Checksum')
+            candidates = by_md5.get((action.kind, md5)) if md5 else None
+            if candidates:
+                source = candidates.pop()
+                consumed.add(id(source))
+                if action.kind == UPLOAD:
+                    result.append(SyncAction(RENAME_REMOTE, action.rel_path, action.local_md5,
+                                             source.remote, source_path=source.rel_path))
+                else:
+                    result.append(SyncAction(RENAME_LOCAL, action.rel_path, source.local_md5,
+                                             action.remote, source_path=source.rel_path))
+            else:
+                result.append(action)
+        return [action for action in result if id(action) not in consumed]
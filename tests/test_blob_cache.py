@@ -0,0 +1,91 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from blob_cache import BlobCache
+from database import DatabaseManager
+
+
+class BlobCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp.name) / "test.db")
+        self.downloads = os.path.join(self.tmp.name, "downloads")
+        os.mkdir(self.downloads)
+        self.cache = BlobCache(self.db, max_bytes=250)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def download(self, name: str, content: bytes) -> str:
+        """Write a 'downloaded' file and keep it in the cache, as download_file does"""
+        path = os.path.join(self.downloads, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        md5 = hashlib.md5(content).hexdigest()
+        self.cache.store(md5, path)
+        # LRU order comes from wall-clock timestamps
+        time.sleep(0.01)
+        return md5
+
+    def materialize(self, md5: str, name: str, size=None) -> bool:
+        return self.cache.materialize(md5, size, os.path.join(self.downloads, name))
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.downloads, name), "rb") as f:
+            return f.read()
+
+    def test_hit_copies_content_under_any_name(self):
+        md5 = self.download("a.bin", b"a" * 100)
+        self.assertTrue(self.materialize(md5, "copy.bin", size=100))
+        self.assertEqual(self.read("copy.bin"), b"a" * 100)
+        self.assertEqual(sorted(os.listdir(self.downloads)), ["a.bin", "copy.bin"])
+
+    def test_misses(self):
+        md5 = self.download("a.bin", b"a" * 100)
+        self.assertFalse(self.materialize(hashlib.md5(b"other").hexdigest(), "other.bin"))
+        self.assertFalse(self.materialize(None, "none.bin"))
+        self.assertFalse(self.materialize(md5, "wrong-size.bin", size=99))
+        self.assertFalse(os.path.exists(os.path.join(self.downloads, "wrong-size.bin")))
+
+    def test_changed_blob_is_dropped_not_served(self):
+        md5 = self.download("a.bin", b"a" * 100)
+        blob = self.cache.blob_path(md5)
+        os.utime(blob, ns=(0, 0))
+        self.assertFalse(self.materialize(md5, "copy.bin"))
+        self.assertIsNone(self.db.get_blob(md5))
+        self.assertFalse(blob.exists())
+
+    def test_least_recently_used_blob_is_evicted(self):
+        a = self.download("a.bin", b"a" * 100)
+        b = self.download("b.bin", b"b" * 100)
+        # using a makes b the least recently used
+        self.assertTrue(self.materialize(a, "a2.bin"))
+        time.sleep(0.01)
+        c = self.download("c.bin", b"c" * 100)
+        self.assertIsNone(self.db.get_blob(b))
+        self.assertFalse(self.cache.blob_path(b).exists())
+        self.assertLessEqual(self.db.get_blob_cache_size(), 250)
+        self.assertTrue(self.materialize(a, "a3.bin"))
+        self.assertTrue(self.materialize(c, "c2.bin"))
+        self.assertFalse(self.materialize(b, "b2.bin"))
+
+    def test_files_larger_than_the_cache_are_not_kept(self):
+        md5 = self.download("big.bin", b"x" * 300)
+        self.assertIsNone(self.db.get_blob(md5))
+        self.assertFalse(self.materialize(md5, "big2.bin"))
+
+    def test_disabled_cache_keeps_nothing(self):
+        self.cache = BlobCache(self.db, max_bytes=0)
+        md5 = self.download("a.bin", b"a" * 10)
+        self.assertIsNone(self.db.get_blob(md5))
+        self.assertFalse(self.materialize(md5, "copy.bin"))
+
+
+if __name__ == "__main__":
+    unittest.main()
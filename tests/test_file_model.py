@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QItemSelectionModel, Qt
+from PyQt5.QtWidgets import QApplication, QTableView
+
+from file_model import FileFilterProxyModel, FileTableModel
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+
+class FileTableModelSelectionTest(unittest.TestCase):
+    ''' The view's selection has to stay on the same files, since Delete, Move and Download act on it '''
+
+    def setUp(self):
+        self.model = FileTableModel()
+        self.proxy = FileFilterProxyModel()
+        self.proxy.setSourceModel(self.model)
+        self.view = QTableView()
+        self.view.setModel(self.proxy)
+        self.model.append_files([{'id': name, 'name': name} for name in "cadbefg"])
+
+    def select(self, *names):
+        selection = self.view.selectionModel()
+        selection.clear()
+        for row in range(self.proxy.rowCount()):
+            index = self.proxy.index(row, 0)
+            if self.proxy.file_info(index)['name'] in names:
+                selection.select(index, QItemSelectionModel.Select | QItemSelectionModel.Rows)
+
+    def selected(self):
+        return sorted(self.proxy.file_info(index)['name']
+                      for index in self.view.selectionModel().selectedRows())
+
+    def names(self):
+        return [self.model.row_name(row) for row in range(self.model.rowCount())]
+
+    def test_sort_keeps_selection_on_the_same_files(self):
+        self.select('a', 'f')
+        self.proxy.sort(0, Qt.DescendingOrder)
+        self.assertEqual(self.names(), list("gfedcba"))
+        self.assertEqual(self.selected(), ['a', 'f'])
+        self.model.sort(0, Qt.AscendingOrder)
+        self.assertEqual(self.selected(), ['a', 'f'])
+
+    def test_remove_keeps_selection_on_surviving_files(self):
+        self.select('a', 'd', 'g')
+        self.model.remove_ids(['c', 'b', 'e', 'f', 'missing'])
+        self.assertEqual(self.names(), list("adg"))
+        self.assertEqual(self.selected(), ['a', 'd', 'g'])
+        self.model.remove_ids(['g'])
+        self.assertEqual(self.selected(), ['a', 'd'])
+        self.assertTrue(self.model.has_id('d'))
+        self.assertFalse(self.model.has_id('g'))
+
+
+if __name__ == '__main__':
+    unittest.main()
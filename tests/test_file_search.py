@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from database import DatabaseManager
+
+USER = "user@example.com"
+
+
+def file_info(file_id, name, mime_type="text/plain"):
+    return {"id": file_id, "name": name, "mimeType": mime_type, "size": "1",
+            "modifiedTime": "2024-01-01T00:00:00.000Z", "parents": ["root"], "version": "1"}
+
+
+class FileSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp.name) / "test.db")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def search(self, query):
+        return sorted(f["name"] for f in self.db.search_files(USER, query))
+
+    def test_finds_files_by_word_prefix(self):
+        self.db.cache_files(USER, [file_info("a", "Quarterly report.pdf"), file_info("b", "notes.txt")])
+        self.db.refresh_file_search()
+        self.assertEqual(self.search("quart"), ["Quarterly report.pdf"])
+        self.assertEqual(self.search("rep quar"), ["Quarterly report.pdf"])
+        self.assertEqual(self.search("missing"), [])
+
+    def test_same_file_updated_twice_between_searches(self):
+        self.db.cache_files(USER, [file_info("a", "draft.txt")])
+        self.db.refresh_file_search()
+        self.db.cache_files(USER, [file_info("a", "second.txt")])
+        self.db.cache_files(USER, [file_info("a", "final.txt")])
+        self.assertEqual(self.search("final"), ["final.txt"])
+        self.assertEqual(self.search("draft"), [])
+        self.assertEqual(self.search("second"), [])
+        self.assertEqual(self.db.refresh_file_search(), 1)
+        self.assertEqual(self.search("final"), ["final.txt"])
+        self.assertEqual(self.search("draft"), [])
+
+    def test_search_is_read_only(self):
+        self.db.cache_files(USER, [file_info("a", "budget.xlsx")])
+        self.assertEqual(self.search("budget"), ["budget.xlsx"])
+        # pending changes are matched without being indexed by the search
+        self.assertEqual(self.db.refresh_file_search(), 1)
+
+    def test_removed_files_are_not_found(self):
+        self.db.cache_files(USER, [file_info("a", "old.txt"), file_info("b", "older.txt")])
+        self.db.refresh_file_search()
+        self.db.apply_file_changes(USER, [], ["a"])
+        self.assertEqual(self.search("old"), ["older.txt"])
+        self.db.refresh_file_search()
+        self.assertEqual(self.search("old"), ["older.txt"])
+
+    def test_other_users_files_are_not_found(self):
+        self.db.cache_files(USER, [file_info("a", "mine.txt")])
+        self.db.cache_files("other@example.com", [file_info("b", "mine too.txt")])
+        self.assertEqual(self.search("mine"), ["mine.txt"])
+        self.db.refresh_file_search()
+        self.assertEqual(self.search("mine"), ["mine.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from database import DatabaseManager
+from folder_tree import FOLDER_MIME_TYPE, MIME, PARENT, FolderTree
+
+USER = "user@example.com"
+
+
+def folder(file_id, name, parent):
+    return {"id": file_id, "name": name, "mimeType": FOLDER_MIME_TYPE, "parents": [parent]}
+
+
+def document(file_id, name, parent):
+    return {"id": file_id, "name": name, "mimeType": "text/plain", "parents": [parent]}
+
+
+class FolderTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp.name) / "test.db")
+        self.db.cache_files(USER, [folder("p", "projects", "root"), folder("a", "alpha", "p"),
+                                   document("r", "report.txt", "a"), folder("s", "shared", "elsewhere")])
+        self.tree = FolderTree()
+        self.tree.load(self.db, USER)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def brute_force_top(self):
+        entries = self.tree._entries
+        return {file_id for file_id, entry in entries.items()
+                if entry[MIME] == FOLDER_MIME_TYPE and entry[PARENT] not in entries}
+
+    def test_paths(self):
+        self.assertEqual(self.tree.resolve("root", "projects/alpha/report.txt"), "r")
+        self.assertEqual(self.tree.path_of("r", "root"), "projects/alpha/report.txt")
+        self.assertEqual(self.tree.path_of("r"), "projects/alpha/report.txt")
+        self.assertIsNone(self.tree.resolve("root", "projects/missing"))
+
+    def test_top_folders_follow_changes(self):
+        self.assertEqual(set(self.tree.top_folders()), {"p", "s"})
+        # the parent arriving after its child takes the child off the top level
+        self.tree.apply_changes(USER, [folder("elsewhere", "team", "root")])
+        self.assertEqual(set(self.tree.top_folders()), {"p", "elsewhere"})
+        # removing a folder brings its subfolders up
+        self.tree.apply_changes(USER, [], ["p"])
+        self.assertEqual(set(self.tree.top_folders()), {"a", "elsewhere"})
+        # and moving one under another takes it off again
+        self.tree.apply_changes(USER, [folder("a", "alpha", "s")])
+        self.assertEqual(set(self.tree.top_folders()), {"elsewhere"})
+
+    def test_top_folders_match_a_full_scan(self):
+        rng = random.Random(7)
+        ids = [f"f{i}" for i in range(60)]
+        for _ in range(500):
+            file_id = rng.choice(ids)
+            if rng.random() < 0.3:
+                self.tree.apply_changes(USER, [], [file_id])
+            else:
+                make = folder if rng.random() < 0.7 else document
+                parent = rng.choice(ids + ["root", "gone"])
+                self.tree.apply_changes(USER, [make(file_id, file_id, parent)])
+            self.assertEqual(set(self.tree.top_folders()), self.brute_force_top())
+
+    def test_changes_for_another_account_are_ignored(self):
+        self.assertFalse(self.tree.apply_changes("other@example.com", [folder("x", "x", "root")], ["p"]))
+        self.assertNotIn("x", self.tree)
+        self.assertIn("p", self.tree)
+        self.tree.clear("other@example.com")
+        self.assertEqual(len(self.tree), 4)
+        self.tree.clear(USER)
+        self.assertEqual(len(self.tree), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / 'benchmarks'
+sys.path.insert(0, str(BENCH_DIR))
+
+import authenticate
+from authenticate import AuthManager
+from database import DatabaseManager
+from drive_manager import DriveManager
+from fake_drive import FakeDrive, FakeDriveServer
+
+
+class SyncChangesTest(unittest.TestCase):
+    ''' DriveManager.sync_changes against benchmarks/fake_drive.py '''
+
+    def setUp(self):
+        self.drive = FakeDrive()
+        self.drive.seed_files(20, per_folder=10)
+        self.server = FakeDriveServer(self.drive).start()
+        self.api_root = os.environ.get(authenticate.API_ROOT_ENV)
+        os.environ[authenticate.API_ROOT_ENV] = self.server.url
+        # the discovery document is rewritten for the API root once per process
+        authenticate._discovery_document = None
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(Path(self.tmp.name) / 'test.db')
+        self.auth_manager = AuthManager(self.db_manager)
+        self.assertTrue(self.auth_manager.login_with_token(self.server.token_json()))
+        self.user_email = self.auth_manager.current_user_email
+        self.drive_manager = DriveManager(self.auth_manager, self.db_manager)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.tmp.cleanup()
+        self.server.stop()
+        if self.api_root is None:
+            os.environ.pop(authenticate.API_ROOT_ENV, None)
+        else:
+            os.environ[authenticate.API_ROOT_ENV] = self.api_root
+        authenticate._discovery_document = None
+
+    def cached(self) -> dict:
+        return {f['id']: f for page in self.db_manager.iter_cached_files(self.user_email) for f in page}
+
+    def live_ids(self) -> set:
+        return {file_id for file_id, meta in self.drive.files.items() if not meta['trashed']}
+
+    def test_first_sync_lists_everything(self):
+        stats = self.drive_manager.sync_changes()
+        self.assertEqual(stats['full_resync'], 1)
+        self.assertEqual(set(self.cached()), self.live_ids())
+
+    def test_incremental_changes(self):
+        self.drive_manager.sync_changes()
+        folder_id = next(iter(self.drive_manager.get_folder_tree().top_folders()))
+        added = self.drive.add_file('added.txt', b'new', parent=folder_id)
+        renamed = next(file_id for file_id in self.drive.files if file_id != folder_id
+                       and self.drive.files[file_id]['parents'] == [folder_id])
+        self.drive.edit_file(renamed, name='renamed.txt')
+
+        batches = []
+        stats = self.drive_manager.sync_changes(lambda upserts, removed: batches.append((upserts, removed)))
+        self.assertEqual(stats, {'changed': 2, 'removed': 0, 'full_resync': 0})
+        self.assertEqual(sorted(f['id'] for f in batches[0][0]), sorted([added['id'], renamed]))
+
+        cached = self.cached()
+        self.assertEqual(set(cached), self.live_ids())
+        self.assertEqual(cached[renamed]['name'], 'renamed.txt')
+        self.assertEqual(int(cached[added['id']]['size']), 3)
+        tree = self.drive_manager.get_folder_tree()
+        self.assertEqual(tree.child(folder_id, 'renamed.txt'), renamed)
+        self.assertEqual(self.db_manager.search_files(self.user_email, 'added')[0]['id'], added['id'])
+
+        # nothing new: the saved token is already current
+        self.assertEqual(self.drive_manager.sync_changes(), {'changed': 0, 'removed': 0, 'full_resync': 0})
+
+    def test_trashed_and_deleted_files_are_removed(self):
+        self.drive_manager.sync_changes()
+        trashed, deleted = [file_id for file_id, meta in self.drive.files.items()
+                            if meta['mimeType'] == 'text/plain'][:2]
+        self.drive.edit_file(trashed, trashed=True)
+        self.drive.delete_file(deleted)
+
+        stats = self.drive_manager.sync_changes()
+        self.assertEqual(stats, {'changed': 0, 'removed': 2, 'full_resync': 0})
+        cached = self.cached()
+        self.assertNotIn(trashed, cached)
+        self.assertNotIn(deleted, cached)
+        self.assertEqual(set(cached), self.live_ids())
+        tree = self.drive_manager.get_folder_tree()
+        self.assertNotIn(trashed, tree)
+        self.assertNotIn(deleted, tree)
+
+    def test_invalid_token_falls_back_to_full_resync(self):
+        self.drive_manager.sync_changes()
+        # entries the feed would never mention again have to go too
+        self.db_manager.cache_files(self.user_email, [{'id': 'gone', 'name': 'gone.txt'}])
+        self.drive.add_file('after.txt')
+        self.db_manager.save_setting(self.drive_manager._changes_token_key(self.user_email),
+                                     str(len(self.drive.changes) + 100))
+
+        stats = self.drive_manager.sync_changes()
+        self.assertEqual(stats['full_resync'], 1)
+        self.assertEqual(set(self.cached()), self.live_ids())
+        self.assertEqual(self.drive_manager.get_changes_token(self.user_email), str(len(self.drive.changes)))
+        self.assertEqual(self.drive_manager.sync_changes()['full_resync'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
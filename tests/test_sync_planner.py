@@ -0,0 +1,114 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from database import DatabaseManager
+from sync_planner import (CONFLICT, DELETE_REMOTE, DOWNLOAD, RECORD, RENAME_LOCAL, RENAME_REMOTE,
+                          UPLOAD, SyncPlanner)
+
+USER = "user@example.com"
+FOLDER = "remote-folder"
+
+
+def md5(content: bytes) -> str:
+    return hashlib.md5(content).hexdigest()
+
+
+class SyncPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp.name) / "test.db")
+        self.root = os.path.join(self.tmp.name, "local")
+        os.mkdir(self.root)
+        self.planner = SyncPlanner(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def write_local(self, rel_path: str, content: bytes):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def add_remote(self, file_id: str, name: str, content: bytes):
+        self.db.cache_files(USER, [{"id": file_id, "name": name, "mimeType": "text/plain",
+                                    "parents": [FOLDER], "size": str(len(content)),
+                                    "md5Checksum": md5(content),
+                                    "modifiedTime": "2024-01-01T00:00:00.000Z"}])
+
+    def synced(self, rel_path: str, file_id: str, local: bytes, remote: bytes = None):
+        self.db.save_sync_baseline(USER, self.root, [(rel_path, file_id, md5(local),
+                                                      md5(local if remote is None else remote))])
+
+    def plan(self):
+        plan = self.planner.plan(USER, self.root, FOLDER)
+        return sorted((action.kind, action.rel_path, action.source_path) for action in plan.actions)
+
+    def test_own_temp_files_are_not_uploaded(self):
+        self.write_local("notes.txt", b"notes")
+        self.write_local(".big.bin.f000000007.part", b"partial download")
+        self.write_local("sub/.photo.jpg.blob", b"blob cache copy")
+        self.write_local(".notes.txt.swp", b"swap")
+        self.write_local(".#notes.txt", b"lock")
+        self.assertEqual(self.plan(), [(UPLOAD, "notes.txt", None)])
+
+    def test_identical_files_are_only_recorded(self):
+        self.write_local("same.txt", b"same")
+        self.add_remote("f1", "same.txt", b"same")
+        self.assertEqual(self.plan(), [(RECORD, "same.txt", None)])
+        self.synced("same.txt", "f1", b"same")
+        self.assertEqual(self.plan(), [])
+
+    def test_one_sided_changes(self):
+        self.write_local("local.txt", b"edited")
+        self.add_remote("f1", "local.txt", b"v1")
+        self.synced("local.txt", "f1", b"v1")
+        self.write_local("remote.txt", b"v1")
+        self.add_remote("f2", "remote.txt", b"edited on drive")
+        self.synced("remote.txt", "f2", b"v1")
+        self.add_remote("f3", "gone.txt", b"deleted here")
+        self.synced("gone.txt", "f3", b"deleted here")
+        self.assertEqual(self.plan(), [(DELETE_REMOTE, "gone.txt", None),
+                                       (DOWNLOAD, "remote.txt", None),
+                                       (UPLOAD, "local.txt", None)])
+
+    def test_renames_are_detected(self):
+        # moved locally: still at the old path on Drive
+        self.write_local("moved/new.txt", b"moved here")
+        self.add_remote("f1", "old.txt", b"moved here")
+        self.synced("old.txt", "f1", b"moved here")
+        # renamed on Drive: still at the old path here
+        self.write_local("before.txt", b"renamed there")
+        self.add_remote("f2", "after.txt", b"renamed there")
+        self.synced("before.txt", "f2", b"renamed there")
+        self.assertEqual(self.plan(), [(RENAME_LOCAL, "after.txt", "before.txt"),
+                                       (RENAME_REMOTE, "moved/new.txt", "old.txt")])
+
+    def test_conflicts(self):
+        self.write_local("both.txt", b"local edit")
+        self.add_remote("f1", "both.txt", b"remote edit")
+        self.synced("both.txt", "f1", b"original")
+        self.write_local("never.txt", b"local")
+        self.add_remote("f2", "never.txt", b"remote")
+        self.write_local("trashed.txt", b"local edit")
+        self.synced("trashed.txt", "f3", b"original")
+        self.add_remote("f4", "deleted.txt", b"remote edit")
+        self.synced("deleted.txt", "f4", b"original")
+        plan = self.planner.plan(USER, self.root, FOLDER)
+        conflicts = {action.rel_path: action.reason for action in plan.actions}
+        self.assertEqual({action.kind for action in plan.actions}, {CONFLICT})
+        self.assertEqual(conflicts, {
+            "both.txt": "changed on both sides",
+            "never.txt": "differs on both sides, never synced",
+            "trashed.txt": "deleted on Drive, changed locally",
+            "deleted.txt": "deleted locally, changed on Drive",
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
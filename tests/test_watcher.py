@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from watcher import FolderWatcher, WatchService
+
+
+class BatchRecorder:
+
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, root, paths):
+        self.batches.append((root, set(paths)))
+        self.event.set()
+
+    def wait(self, timeout=10.0) -> bool:
+        return self.event.wait(timeout)
+
+
+class FolderWatcherTest(unittest.TestCase):
+    ''' Debounced batches of changed files, from both backends '''
+
+    use_inotify = True
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tmp.name)
+        self.recorder = BatchRecorder()
+        self.watcher = FolderWatcher(self.recorder, debounce=0.3, max_delay=5.0, poll_interval=0.2,
+                                     use_inotify=self.use_inotify)
+        self.watcher.add_path(self.root)
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.tmp.cleanup()
+
+    def write(self, rel_path, content=b"x"):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_burst_of_writes_is_one_batch(self):
+        paths = {self.write(f"file{i}.txt") for i in range(5)}
+        paths.add(self.write("sub/nested.txt"))
+        self.assertTrue(self.recorder.wait())
+        # nothing else arrives once the burst has been flushed
+        time.sleep(0.8)
+        self.assertEqual(len(self.recorder.batches), 1)
+        root, batch = self.recorder.batches[0]
+        self.assertEqual(root, self.root)
+        self.assertTrue(paths <= batch)
+
+    def test_temp_and_swap_files_are_ignored(self):
+        self.write(".big.bin.f1.part")
+        self.write(".notes.txt.swp")
+        self.write(".#notes.txt")
+        kept = self.write("notes.txt")
+        self.assertTrue(self.recorder.wait())
+        changed = set().union(*(batch for _, batch in self.recorder.batches))
+        self.assertIn(kept, changed)
+        self.assertEqual(changed, {kept})
+
+
+class PollingFolderWatcherTest(FolderWatcherTest):
+    use_inotify = False
+
+
+class RecordingDriveManager:
+    ''' Stands in for DriveManager.plan_paths_upload, planning one upload per path '''
+
+    def __init__(self):
+        self.planned = []
+
+    def plan_paths_upload(self, root, remote_folder_id, paths):
+        self.planned.extend(paths)
+        return [{'path': path, 'parent_id': remote_folder_id, 'file_id': None} for path in paths]
+
+
+class WatchServiceTest(unittest.TestCase):
+
+    def test_catch_up_skips_ignored_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("notes.txt", ".big.bin.f1.part", ".notes.txt.swp", ".photo.jpg.blob"):
+                with open(os.path.join(tmp, name), "wb") as f:
+                    f.write(b"x")
+            drive_manager = RecordingDriveManager()
+            submitted = []
+            service = WatchService(drive_manager, None, lambda path, **kwargs: submitted.append(path))
+            service.watcher = FolderWatcher(lambda root, paths: None, use_inotify=False)
+            service._watch(tmp, "remote-folder")
+            self.assertEqual([os.path.basename(path) for path in submitted], ["notes.txt"])
+            service.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
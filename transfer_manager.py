@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+FAILED = "failed"
+
+
+class TransferInterrupted(Exception):
+    """Raised from a progress callback to stop a running transfer"""
+
+
+class Transfer:
+    ''' One queued upload or download and its progress '''
+
+    def __init__(self, transfer_id: int, kind: str, name: str, priority: int,
+                 operation: Callable[..., Any], args: tuple, kwargs: dict):
+        self.id = transfer_id
+        self.kind = kind
+        self.name = name
+        self.priority = priority
+        self.operation = operation
+        self.args = args
+        self.kwargs = kwargs
+        self.state = QUEUED
+        self.bytes_done = 0
+        self.total_bytes = 0
+        self.result = None
+        self.error = None
+        self.target_path = None
+        self._stop_state = None
+
+    @property
+    def progress(self) -> float:
+        if not self.total_bytes:
+            return 1.0 if self.state == DONE else 0.0
+        return min(self.bytes_done / self.total_bytes, 1.0)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+
+class TransferManager:
+    '''Runs uploads and downloads on a bounded pool of worker threads.
+
+    Transfers are taken highest priority first, then in submission order.
+    Each worker thread gets its own Drive client through
+    auth_manager.get_service(), so workers never share an httplib2
+    connection.
+    '''
+
+    def __init__(self, drive_manager, max_workers: int = 4):
+        self.drive_manager = drive_manager
+        self.max_workers = max(1, max_workers)
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = []
+        self._transfers: Dict[int, Transfer] = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._listeners: List[Callable[[Transfer], None]] = []
+        self._shutdown = False
+
+    def add_listener(self, callback: Callable[[Transfer], None]):
+        """Call back on every state or progress change (from worker threads)"""
+        self._listeners.append(callback)
+
+    def submit_upload(self, file_path: str, remote_name: str = None, priority: int = 0,
+                      **kwargs) -> Transfer:
+        name = remote_name or os.path.basename(file_path)
+        return self._submit("upload", name, priority, self.drive_manager.upload_file,
+                            (file_path, remote_name), kwargs)
+
+    def submit_download(self, file_id: str, file_name: str, download_path: str,
+                        file_metadata: Optional[Dict[str, Any]] = None,
+                        priority: int = 0) -> Transfer:
+        transfer = self._submit("download", file_name, priority, self.drive_manager.download_file,
+                                (file_id, file_name, download_path),
+                                {"file_metadata": file_metadata}, start=False)
+        name = (file_metadata or {}).get("name") or file_name
+        transfer.target_path = os.path.abspath(os.path.join(download_path, name))
+        size = (file_metadata or {}).get("size")
+        transfer.total_bytes = int(size) if size else 0
+        self._enqueue(transfer)
+        return transfer
+
+    def submit_partial_downloads(self) -> List[Transfer]:
+        """Requeue downloads interrupted by a previous run"""
+        user_email = self.drive_manager.auth_manager.current_user_email
+        if not user_email:
+            return []
+
+        transfers = []
+        for partial in self.drive_manager.db_manager.get_partial_downloads(user_email):
+            target_path = partial['target_path']
+            file_metadata = {
+                'id': partial['file_id'],
+                'name': os.path.basename(target_path),
+                'size': partial['expected_size'],
+                'md5Checksum': partial['md5_checksum'],
+            }
+            transfers.append(self.submit_download(
+                partial['file_id'], file_metadata['name'], os.path.dirname(target_path),
+                file_metadata=file_metadata))
+        return transfers
+
+    def transfers(self) -> List[Transfer]:
+        with self._cond:
+            return list(self._transfers.values())
+
+    def get(self, transfer_id: int) -> Optional[Transfer]:
+        return self._transfers.get(transfer_id)
+
+    def cancel(self, transfer_id: int):
+        self._stop(transfer_id, CANCELLED)
+
+    def pause(self, transfer_id: int):
+        self._stop(transfer_id, PAUSED)
+
+    def resume(self, transfer_id: int):
+        with self._cond:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None or transfer.state != PAUSED:
+                return
+        self._enqueue(transfer)
+
+    def forget_finished(self) -> int:
+        """Drop finished transfers so long-running processes don't accumulate them"""
+        with self._cond:
+            finished = [transfer_id for transfer_id, transfer in self._transfers.items()
+                        if transfer.finished]
+            for transfer_id in finished:
+                del self._transfers[transfer_id]
+            return len(finished)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every transfer has finished or is paused"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: all(t.finished or t.state == PAUSED for t in self._transfers.values()),
+                timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._shutdown = True
+            for transfer in self._transfers.values():
+                if transfer.state == RUNNING:
+                    transfer._stop_state = PAUSED
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _submit(self, kind: str, name: str, priority: int, operation: Callable[..., Any],
+                args: tuple, kwargs: dict, start: bool = True) -> Transfer:
+        transfer = Transfer(next(self._ids), kind, name, priority, operation, args, kwargs)
+        with self._cond:
+            self._transfers[transfer.id] = transfer
+        if start:
+            self._enqueue(transfer)
+        return transfer
+
+    def _enqueue(self, transfer: Transfer):
+        with self._cond:
+            if self._shutdown:
+                raise Exception("Transfer manager has been shut down")
+            transfer.state = QUEUED
+            transfer._stop_state = None
+            heapq.heappush(self._queue, (-transfer.priority, next(self._order), transfer))
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, daemon=True,
+                                          name=f"transfer-worker-{len(self._workers) + 1}")
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify()
+        self._notify(transfer)
+
+    def _stop(self, transfer_id: int, state: str):
+        with self._cond:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None or transfer.finished:
+                return
+            if transfer.state == RUNNING:
+                # picked up by the progress callback on the next chunk
+                transfer._stop_state = state
+                return
+            transfer.state = state
+        if state == CANCELLED:
+            self._discard_partial(transfer)
+        self._notify(transfer)
+
+    def _next(self) -> Optional[Transfer]:
+        with self._cond:
+            while True:
+                while self._queue:
+                    _, _, transfer = heapq.heappop(self._queue)
+                    # paused or cancelled while waiting in the queue
+                    if transfer.state == QUEUED:
+                        transfer.state = RUNNING
+                        return transfer
+                if self._shutdown:
+                    return None
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            transfer = self._next()
+            if transfer is None:
+                return
+            self._notify(transfer)
+            self._run(transfer)
+            with self._cond:
+                self._cond.notify_all()
+            self._notify(transfer)
+
+    def _run(self, transfer: Transfer):
+        def on_progress(bytes_done: int, total_bytes: int):
+            transfer.bytes_done = bytes_done
+            if total_bytes:
+                transfer.total_bytes = total_bytes
+            self._notify(transfer)
+            if transfer._stop_state is not None:
+                raise TransferInterrupted(transfer._stop_state)
+
+        try:
+            transfer.result = transfer.operation(*transfer.args, progress_callback=on_progress,
+                                                 **transfer.kwargs)
+            transfer.state = DONE
+            transfer.bytes_done = transfer.total_bytes or transfer.bytes_done
+        except TransferInterrupted as interrupted:
+            transfer.state = str(interrupted)
+            if transfer.state == CANCELLED:
+                self._discard_partial(transfer)
+        except Exception as e:
+            transfer.state = FAILED
+            transfer.error = str(e)
+            self.logger.error(f"Transfer of {transfer.name} failed: {str(e)}")
+
+    def _discard_partial(self, transfer: Transfer):
+        if transfer.kind == "download" and transfer.target_path:
+            self.drive_manager.discard_partial_download(transfer.args[0], transfer.target_path)
+
+    def _notify(self, transfer: Transfer):
+        for listener in self._listeners:
+            try:
+                listener(transfer)
+            except Exception as e:
+                self.logger.error(f"Transfer listener failed: {str(e)}")
@@ -0,0 +1,191 @@
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import DRIVE_REQUEST_SECONDS, DRIVE_REQUESTS, DRIVE_RETRIES, get_metrics
+from rate_limiter import RateLimiter, DEFAULT_MAX_RETRIES, backoff_delay, is_retryable
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+BOUNDARY_RE = re.compile(r'boundary="?([^";]+)')
+DRIVE_PATH_RE = re.compile(r'^https?://[^/]+/(upload/|batch/)?drive/v3(?:/(\w+)(/[^/?]+)?(/\w+)?)?')
+
+
+def drive_operation(method: str, uri: str) -> str:
+    """Name a request after the API method it calls, e.g. files.list or files.get_media"""
+    match = DRIVE_PATH_RE.match(uri)
+    if not match:
+        return "other"
+    prefix, resource, item, action = match.groups()
+    if prefix == "batch/":
+        return "batch"
+    if not resource:
+        return "other"
+    if prefix == "upload/":
+        # the session-opening call and every chunk PUT
+        return "files.upload"
+    if action:
+        return f"{resource}.{action[1:]}"
+    if item:
+        if resource == "changes":
+            return f"changes.{item[1:]}"
+        if method == "GET":
+            return f"{resource}.get_media" if "alt=media" in uri else f"{resource}.get"
+        return {"PATCH": f"{resource}.update", "DELETE": f"{resource}.delete"}.get(method, resource)
+    return {"GET": f"{resource}.list" if resource != "about" else "about.get",
+            "POST": f"{resource}.create"}.get(method, resource)
+
+
+class PooledHttp:
+    ''' httplib2.Http stand-in handed to googleapiclient, one per thread '''
+
+    def __init__(self, transport: 'DriveTransport', session):
+        self.transport = transport
+        self.session = session
+
+    def request(self, uri: str, method: str = "GET", body=None, headers: Optional[Dict[str, str]] = None,
+                redirections: int = 5, connection_type=None) -> Tuple[Any, bytes]:
+        return self.transport.request(self.session, uri, method, body, headers)
+
+    def close(self):
+        self.session.close()
+
+
+class DriveTransport:
+    '''Keep-alive connection pool shared by every Drive call.
+
+    All threads send through one urllib3 pool, so connections and their
+    TLS sessions are reused across workers instead of each thread holding
+    its own httplib2 connection. Each thread still gets its own requests
+    session and PooledHttp, so no client state is shared between threads.
+    The credentials are shared: an expired token is refreshed once under
+    a lock, and a 401 refreshes at most once before the request is retried.
+    Every request is scheduled through the RateLimiter, and throttled or
+    transient failures are retried here with jittered backoff, so listing,
+    transfers and batches all share one quota budget.
+    '''
+
+    def __init__(self, credentials, pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 on_refresh: Optional[Callable[[Any], None]] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        from requests.adapters import HTTPAdapter
+        from google.auth.transport.requests import Request
+
+        self.credentials = credentials
+        self.timeout = (connect_timeout, read_timeout)
+        self.on_refresh = on_refresh
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        # retries happen in request(), not in urllib3
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self._refresh_session = self._new_session()
+        self._auth_request = Request(self._refresh_session)
+        self._refresh_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _new_session(self):
+        import requests
+        session = requests.Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def http(self) -> PooledHttp:
+        """A client for the calling thread over the shared pool"""
+        return PooledHttp(self, self._new_session())
+
+    def request(self, session, uri: str, method: str = "GET", body=None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[Any, bytes]:
+        import httplib2
+
+        headers = dict(headers or {})
+        if hasattr(body, 'read'):
+            # upload chunks arrive as stream slices; a retry has to resend the same bytes
+            body = body.read()
+        cost = self._cost(body, headers)
+        metrics = get_metrics()
+        operation = drive_operation(method, uri) if metrics.enabled else None
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(cost)
+            retryable = False
+            try:
+                token = self._authorize(headers)
+                resp = self._send(session, uri, method, body, headers)
+                if resp.status_code == 401:
+                    self._refresh(stale_token=token)
+                    self._authorize(headers)
+                    resp = self._send(session, uri, method, body, headers)
+                retryable = is_retryable(resp.status_code, resp.content)
+            finally:
+                self.rate_limiter.release(throttled=retryable)
+            if not retryable or attempt >= self.max_retries:
+                break
+            attempt += 1
+            metrics.inc(DRIVE_RETRIES, method=operation)
+            delay = backoff_delay(attempt, self._retry_after(resp))
+            self.logger.info(f"{method} {uri.split('?')[0]} got {resp.status_code}, "
+                             f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+        metrics.observe(DRIVE_REQUEST_SECONDS, time.perf_counter() - started, method=operation)
+        metrics.inc(DRIVE_REQUESTS, method=operation, status=str(resp.status_code))
+        info = {key.lower(): value for key, value in resp.headers.items()}
+        info['status'] = str(resp.status_code)
+        response = httplib2.Response(info)
+        response.reason = resp.reason
+        return response, resp.content
+
+    def _cost(self, body, headers: Dict[str, str]) -> int:
+        # a batch counts against the quota once per call it carries
+        content_type = headers.get('content-type', '')
+        match = BOUNDARY_RE.search(content_type)
+        if not body or not match or not content_type.startswith('multipart/mixed'):
+            return 1
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return max(1, body.count(b'--' + match.group(1).encode()) - 1)
+
+    def _retry_after(self, resp) -> Optional[float]:
+        try:
+            return float(resp.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            return None
+
+    def _send(self, session, uri: str, method: str, body, headers: Dict[str, str]):
+        # resumable uploads answer 308 and expect to see it, not follow it
+        return session.request(method, uri, data=body, headers=headers, timeout=self.timeout,
+                               allow_redirects=method in ("GET", "HEAD"))
+
+    def _authorize(self, headers: Dict[str, str]) -> Optional[str]:
+        with self._refresh_lock:
+            if not self.credentials.valid:
+                self._refresh_locked()
+            self.credentials.apply(headers)
+            return self.credentials.token
+
+    def _refresh(self, stale_token: Optional[str]):
+        with self._refresh_lock:
+            # another thread may already have replaced the token that failed
+            if self.credentials.token == stale_token:
+                self._refresh_locked()
+
+    def _refresh_locked(self):
+        self.credentials.refresh(self._auth_request)
+        self.logger.info("Refreshed Drive access token")
+        if self.on_refresh:
+            try:
+                self.on_refresh(self.credentials)
+            except Exception as e:
+                self.logger.error(f"Failed to store refreshed credentials: {str(e)}")
+
+    def close(self):
+        self._refresh_session.close()
+        self.adapter.close()
@@ -0,0 +1,410 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from local_index import is_ignored
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyBackend:
+    ''' Recursive directory watches over a single inotify fd '''
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths: Dict[int, str] = {}
+        # add_tree runs on the caller's thread as well as the watcher's
+        self._lock = threading.RLock()
+        self._poller = select.poll()
+        self._poller.register(self.fd, select.POLLIN)
+
+    def add_tree(self, root: str) -> List[str]:
+        """Watch root and every directory below it; return the files found"""
+        with self._lock:
+            return self._add_tree(root)
+
+    def _add_tree(self, root: str) -> List[str]:
+        found = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                continue
+            self._paths[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            found.append(entry.path)
+            except OSError:
+                continue
+        return found
+
+    def remove_tree(self, root: str):
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock:
+            for wd, path in list(self._paths.items()):
+                if path == root or path.startswith(prefix):
+                    self._rm_watch(self.fd, wd)
+                    del self._paths[wd]
+
+    def read_events(self, timeout: float) -> List[str]:
+        """Block up to timeout seconds and return the paths that changed"""
+        if not self._poller.poll(max(0, int(timeout * 1000))):
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        with self._lock:
+            return self._parse_events(data)
+
+    def _parse_events(self, data: bytes) -> List[str]:
+        changed = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped: rescan every watched tree and report all of
+                # its files; the upload plan leaves out those that didn't change
+                changed.extend(self._rescan())
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._paths[wd]
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # new or moved-in directory: watch it and pick up what's already inside
+                changed.extend(self._add_tree(path))
+            changed.append(path)
+        return changed
+
+    def _rescan(self) -> List[str]:
+        directories = set(self._paths.values())
+        roots = [d for d in directories if os.path.dirname(d) not in directories]
+        found = []
+        for root in roots:
+            # re-adding a watch is harmless, and picks up directories created meanwhile
+            found.extend(self._add_tree(root))
+        return found
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    ''' Fallback for platforms without inotify: compare stat snapshots '''
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._snapshots: Dict[str, Dict[str, tuple]] = {}
+        self._lock = threading.Lock()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self, root: str) -> Dict[str, tuple]:
+        snapshot = {}
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        return snapshot
+
+    def add_tree(self, root: str) -> List[str]:
+        snapshot = self._scan(root)
+        with self._lock:
+            self._snapshots[root] = snapshot
+        return list(snapshot)
+
+    def remove_tree(self, root: str):
+        with self._lock:
+            self._snapshots.pop(root, None)
+
+    def read_events(self, timeout: float) -> List[str]:
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(0, timeout))
+            return []
+        time.sleep(max(0, wait))
+        self._next_scan = time.monotonic() + self.interval
+
+        changed = []
+        with self._lock:
+            roots = list(self._snapshots.items())
+        for root, old in roots:
+            new = self._scan(root)
+            changed.extend(path for path, sig in new.items() if old.get(path) != sig)
+            changed.extend(path for path in old if path not in new)
+            with self._lock:
+                if root in self._snapshots:
+                    self._snapshots[root] = new
+        return changed
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    '''Watch local folders and report debounced batches of changed paths.
+
+    Events are grouped per watched root. A batch is flushed once the root
+    has been quiet for `debounce` seconds, or `max_delay` seconds after its
+    first event so a continuous stream still makes progress. Uses inotify
+    on Linux and falls back to periodic stat polling elsewhere.
+    '''
+
+    def __init__(self, on_batch: Callable[[str, Set[str]], None], debounce: float = 2.0,
+                 max_delay: float = 10.0, poll_interval: float = 5.0,
+                 use_inotify: Optional[bool] = None):
+        self.on_batch = on_batch
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.logger = logging.getLogger(__name__)
+
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        self._backend = None
+        if use_inotify:
+            try:
+                self._backend = _InotifyBackend()
+            except (OSError, AttributeError) as e:
+                self.logger.info(f"inotify unavailable, polling instead: {str(e)}")
+        if self._backend is None:
+            self._backend = _PollingBackend(poll_interval)
+
+        self._roots: Set[str] = set()
+        self._pending: Dict[str, Set[str]] = {}
+        self._first_seen: Dict[str, float] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def backend_name(self) -> str:
+        return "inotify" if isinstance(self._backend, _InotifyBackend) else "polling"
+
+    def add_path(self, root: str) -> List[str]:
+        """Start watching root; returns the files currently under it"""
+        root = os.path.abspath(root)
+        with self._lock:
+            self._roots.add(root)
+        return self._backend.add_tree(root)
+
+    def remove_path(self, root: str):
+        root = os.path.abspath(root)
+        with self._lock:
+            self._roots.discard(root)
+            self._pending.pop(root, None)
+            self._first_seen.pop(root, None)
+            self._last_seen.pop(root, None)
+        self._backend.remove_tree(root)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._backend.close()
+
+    def _root_for(self, path: str) -> Optional[str]:
+        best = None
+        for root in self._roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                if best is None or len(root) > len(best):
+                    best = root
+        return best
+
+    def _run(self):
+        while not self._stop.is_set():
+            timeout = self._next_flush_in()
+            try:
+                paths = self._backend.read_events(timeout)
+            except OSError as e:
+                self.logger.error(f"Watcher read failed: {str(e)}")
+                paths = []
+
+            now = time.monotonic()
+            with self._lock:
+                for path in paths:
+                    root = self._root_for(path)
+                    if root is None or is_ignored(path):
+                        continue
+                    self._pending.setdefault(root, set()).add(path)
+                    self._first_seen.setdefault(root, now)
+                    self._last_seen[root] = now
+            self._flush_due(now)
+
+    def _next_flush_in(self) -> float:
+        # sleep until the earliest pending batch is due, or 1s when idle
+        with self._lock:
+            if not self._pending:
+                return 1.0
+            now = time.monotonic()
+            due = min(min(self._last_seen[r] + self.debounce, self._first_seen[r] + self.max_delay)
+                      for r in self._pending)
+            return max(0.05, due - now)
+
+    def _flush_due(self, now: float):
+        batches = []
+        with self._lock:
+            for root in list(self._pending):
+                quiet = now - self._last_seen[root] >= self.debounce
+                overdue = now - self._first_seen[root] >= self.max_delay
+                if quiet or overdue:
+                    batches.append((root, self._pending.pop(root)))
+                    del self._first_seen[root]
+                    del self._last_seen[root]
+        for root, paths in batches:
+            try:
+                self.on_batch(root, paths)
+            except Exception as e:
+                self.logger.error(f"Handling changes in {root} failed: {str(e)}")
+
+
+class WatchService:
+    '''Connects monitored folders to the upload pipeline.
+
+    Folders are registered in the monitored_paths table. Each debounced
+    batch from the FolderWatcher is turned into an upload plan and handed
+    to `submit`, e.g. TransferManager.submit_upload.
+    '''
+
+    def __init__(self, drive_manager, db_manager, submit: Callable[..., object],
+                 debounce: float = 2.0, max_delay: float = 10.0):
+        self.drive_manager = drive_manager
+        self.db_manager = db_manager
+        self.submit = submit
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.logger = logging.getLogger(__name__)
+        self.watcher = None
+        self._remote_folders: Dict[str, str] = {}
+
+    def start(self):
+        """Watch every monitored folder of the current user"""
+        user_email = self.drive_manager.auth_manager.current_user_email
+        if not user_email or self.watcher is not None:
+            return
+        self.watcher = FolderWatcher(self._on_batch, debounce=self.debounce,
+                                     max_delay=self.max_delay)
+        for monitored in self.db_manager.get_monitored_paths(user_email):
+            self._watch(monitored['local_path'], monitored['remote_folder_id'])
+        self.watcher.start()
+        self.logger.info(f"Watching {len(self._remote_folders)} folders with {self.watcher.backend_name}")
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self._remote_folders.clear()
+
+    def register_folder(self, local_path: str, parent_id: Optional[str] = None) -> str:
+        """Mirror a local folder on Drive and record it as monitored, without watching it yet"""
+        user_email = self.drive_manager.auth_manager.current_user_email
+        if not user_email:
+            raise Exception("Not authenticated with Google drive")
+        local_path = os.path.abspath(local_path)
+        if not os.path.isdir(local_path):
+            raise Exception(f"Folder not found: {local_path}")
+
+        remote_folder_id = self.drive_manager.ensure_folder(
+            os.path.basename(local_path), parent_id or self.drive_manager.get_root_folder_id())
+        self.db_manager.add_monitored_path(user_email, local_path, remote_folder_id)
+        return remote_folder_id
+
+    def add_folder(self, local_path: str, parent_id: Optional[str] = None) -> str:
+        """Register a folder for syncing and upload its current contents"""
+        remote_folder_id = self.register_folder(local_path, parent_id)
+        local_path = os.path.abspath(local_path)
+        if self.watcher is None:
+            self.start()
+        else:
+            self._watch(local_path, remote_folder_id)
+        return remote_folder_id
+
+    def remove_folder(self, local_path: str):
+        local_path = os.path.abspath(local_path)
+        user_email = self.drive_manager.auth_manager.current_user_email
+        self.db_manager.remove_monitored_path(user_email, local_path)
+        self._remote_folders.pop(local_path, None)
+        if self.watcher is not None:
+            self.watcher.remove_path(local_path)
+
+    def _watch(self, local_path: str, remote_folder_id: str):
+        if not os.path.isdir(local_path):
+            self.logger.info(f"Monitored folder is missing, skipping: {local_path}")
+            return
+        self._remote_folders[local_path] = remote_folder_id
+        existing = self.watcher.add_path(local_path)
+        # catch up on anything that changed while we weren't watching
+        self._on_batch(local_path, set(existing))
+
+    def _on_batch(self, root: str, paths: Set[str]):
+        remote_folder_id = self._remote_folders.get(root)
+        if remote_folder_id is None:
+            return
+        # also reached from the catch-up in _watch, which the watcher's own filter never sees
+        paths = {path for path in paths if not is_ignored(path)}
+        plan = self.drive_manager.plan_paths_upload(root, remote_folder_id, paths)
+        for entry in plan:
+            self.submit(entry['path'], parent_id=entry['parent_id'],
+                        file_id=entry['file_id'])
+        if plan:
+            self.logger.info(f"Queued {len(plan)} changed files from {root}")